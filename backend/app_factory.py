@@ -1,16 +1,26 @@
 from __future__ import annotations
 
+import asyncio
 from contextlib import asynccontextmanager
+import mimetypes
+import os
 from pathlib import Path
 import shutil
 
-from fastapi import FastAPI
+import anyio
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
+import config
 from config import DATA_IMAGE_DIR, SCRIPT_UPLOADER_WATCH_DIR
+from database import dispose_engines
 from routers import data_monitor_router, detect_router
+from services.image_recompression import image_recompressor
+from services.incidents import incident_tracker
+from services.record_partitions import record_partition_maintainer
 from services.script_uploader import ScriptUploaderProcessManager
+from services.segment_store import segment_image_store
 
 
 def _clear_directory_files(directory: Path) -> None:
@@ -27,6 +37,155 @@ def _clear_directory_files(directory: Path) -> None:
                 pass
 
 
+_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class ImmutableStaticFiles(StaticFiles):
+    # Stored monitor images get a fresh uuid name on every write and are never
+    # rewritten in place, so clients may cache them forever. FileResponse
+    # already answers Range requests and uses zero-copy pathsend when the
+    # ASGI server supports it.
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = _IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+def _byte_range(header: str, length: int) -> tuple[int, int] | None:
+    # A single "bytes=start-end", "bytes=start-" or "bytes=-suffix" range as
+    # inclusive (start, end). None means serve the whole image (no header,
+    # several ranges or another unit); ValueError means unsatisfiable.
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError("empty suffix range")
+            return max(0, length - suffix), length - 1
+        start = int(first)
+        end = min(int(last), length - 1) if last else length - 1
+    except ValueError:
+        raise ValueError(f"invalid range {header!r}") from None
+    if start < 0 or start > end:
+        raise ValueError(f"unsatisfiable range {header!r}")
+    return start, end
+
+
+class SegmentImageResponse(Response):
+    # One image, or one byte range of it (206), out of a segment file. The
+    # ASGI zero-copy extension (sendfile) is used only when the server offers
+    # "http.response.zerocopy"; uvicorn does not, so there the body is a
+    # single pread in a worker thread.
+    def __init__(
+        self,
+        fd: int,
+        offset: int,
+        length: int,
+        *,
+        name: str,
+        send_body: bool = True,
+        byte_range: tuple[int, int] | None = None,
+    ) -> None:
+        super().__init__(
+            status_code=206 if byte_range else 200,
+            media_type=mimetypes.guess_type(name)[0] or "application/octet-stream",
+            headers={
+                "Cache-Control": _IMMUTABLE_CACHE_CONTROL,
+                "ETag": f'"{name}"',
+                "Accept-Ranges": "bytes",
+            },
+        )
+        if byte_range:
+            start, end = byte_range
+            self.headers["content-range"] = f"bytes {start}-{end}/{length}"
+            offset, length = offset + start, end - start + 1
+        self.headers["content-length"] = str(length)
+        self._fd = fd
+        self._offset = offset
+        self._length = length
+        self._send_body = send_body
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if not self._send_body:
+                await send({"type": "http.response.body", "body": b""})
+            elif "http.response.zerocopy" in scope.get("extensions", {}):
+                with open(self._fd, "rb", closefd=False) as file:
+                    await send(
+                        {
+                            "type": "http.response.zerocopy",
+                            "file": file,
+                            "offset": self._offset,
+                            "count": self._length,
+                        }
+                    )
+            else:
+                body = await anyio.to_thread.run_sync(os.pread, self._fd, self._length, self._offset)
+                await send({"type": "http.response.body", "body": body})
+        finally:
+            os.close(self._fd)
+
+
+class DataImageFiles(ImmutableStaticFiles):
+    # /static/data-image/<name>: images in the segment store are served from
+    # their segment, everything else from its own file as before.
+    async def get_response(self, path: str, scope) -> Response:
+        if path.split("/", 1)[0] == "segments":
+            raise HTTPException(status_code=404)
+        if scope["method"] in ("GET", "HEAD") and "/" not in path:
+            opened = await anyio.to_thread.run_sync(segment_image_store.open, path)
+            if opened is not None:
+                fd, offset, length = opened
+                etag = f'"{path}"'
+                request_headers = dict(scope.get("headers") or [])
+                if request_headers.get(b"if-none-match", b"").decode("latin-1").strip() == etag:
+                    os.close(fd)
+                    return Response(
+                        status_code=304,
+                        headers={"Cache-Control": _IMMUTABLE_CACHE_CONTROL, "ETag": etag},
+                    )
+                byte_range = None
+                range_header = request_headers.get(b"range", b"").decode("latin-1")
+                if_range = request_headers.get(b"if-range", b"").decode("latin-1").strip()
+                if range_header and (not if_range or if_range == etag):
+                    try:
+                        byte_range = _byte_range(range_header, length)
+                    except ValueError:
+                        os.close(fd)
+                        return Response(
+                            status_code=416,
+                            headers={"Content-Range": f"bytes */{length}", "Accept-Ranges": "bytes"},
+                        )
+                return SegmentImageResponse(
+                    fd,
+                    offset,
+                    length,
+                    name=path,
+                    send_body=scope["method"] == "GET",
+                    byte_range=byte_range,
+                )
+        return await super().get_response(path, scope)
+
+
+async def _compact_segments_forever() -> None:
+    while True:
+        await asyncio.sleep(max(1.0, config.IMAGE_SEGMENT_COMPACT_INTERVAL_SECONDS))
+        try:
+            stats = await anyio.to_thread.run_sync(
+                segment_image_store.compact, config.IMAGE_SEGMENT_COMPACT_GARBAGE_RATIO
+            )
+            if stats["segments"]:
+                print(f"Image segments compacted: {stats}")
+        except Exception as exc:
+            print(f"Image segment compaction failed: {exc}")
+
+
 def create_app() -> FastAPI:
     uploader_manager = ScriptUploaderProcessManager()
     detected_frames_dir = (Path(__file__).resolve().parent / SCRIPT_UPLOADER_WATCH_DIR).resolve()
@@ -36,10 +195,25 @@ def create_app() -> FastAPI:
     async def lifespan(app: FastAPI):
         _clear_directory_files(detected_frames_dir)
         uploader_manager.start()
+        incident_tracker.start()
+        image_recompressor.start()
+        record_partition_maintainer.start()
+        compactor = (
+            asyncio.create_task(_compact_segments_forever()) if config.IMAGE_SEGMENT_STORE_ENABLED else None
+        )
         try:
             yield
         finally:
             uploader_manager.stop()
+            await incident_tracker.stop()
+            await image_recompressor.stop()
+            await record_partition_maintainer.stop()
+            if compactor is not None:
+                compactor.cancel()
+            # Cancelling the task leaves its compaction running in the worker
+            # thread; close() stops and waits for it, off the event loop.
+            await anyio.to_thread.run_sync(segment_image_store.close)
+            await dispose_engines()
             _clear_directory_files(detected_frames_dir)
 
     app = FastAPI(title="AI Fire Detection API", lifespan=lifespan)
@@ -52,6 +226,7 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Changes-Cursor", "X-Next-Cursor"],
     )
     app.mount(
         "/static/detected-frames",
@@ -60,7 +235,7 @@ def create_app() -> FastAPI:
     )
     app.mount(
         "/static/data-image",
-        StaticFiles(directory=str(data_image_dir)),
+        DataImageFiles(directory=str(data_image_dir)),
         name="data_image",
     )
     app.include_router(detect_router)
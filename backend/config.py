@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 import os
 
 from dotenv import load_dotenv
@@ -39,6 +40,150 @@ def _to_int(value: str | None, default: int) -> int:
         return default
 
 
+def _load_qwen_endpoints(raw: str) -> list[dict]:
+    default_endpoint = {
+        "name": "default",
+        "api_url": QWEN_API_URL,
+        "api_key": QWEN_API_KEY,
+        "model": QWEN_MODEL,
+        "weight": 1.0,
+    }
+    if not raw:
+        return [default_endpoint]
+
+    try:
+        items = json.loads(raw)
+    except json.JSONDecodeError:
+        return [default_endpoint]
+    if not isinstance(items, list):
+        return [default_endpoint]
+
+    endpoints: list[dict] = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        base_url = str(item.get("base_url") or QWEN_BASE_URL).rstrip("/")
+        endpoints.append(
+            {
+                "name": str(item.get("name") or f"endpoint-{index}"),
+                "api_url": str(item.get("api_url") or f"{base_url}/chat/completions"),
+                "api_key": str(item.get("api_key") or QWEN_API_KEY),
+                "model": str(item.get("model") or QWEN_MODEL),
+                "weight": max(0.01, _to_float(str(item.get("weight", 1.0)), 1.0)),
+            }
+        )
+    return endpoints or [default_endpoint]
+
+
+def _load_source_weights(raw: str) -> dict[str, float]:
+    if not raw:
+        return {}
+    try:
+        items = json.loads(raw)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(items, dict):
+        return {}
+
+    weights: dict[str, float] = {}
+    for source, value in items.items():
+        weight = _to_float(str(value), 0.0)
+        if weight > 0:
+            weights[str(source)] = weight
+    return weights
+
+
+def _load_recompress_tiers(raw: str) -> list[dict]:
+    default_tiers = [
+        {"after_days": 7.0, "quality": 70, "max_side": 0},
+        {"after_days": 30.0, "quality": 50, "max_side": 1280},
+    ]
+    if not raw:
+        return default_tiers
+    try:
+        items = json.loads(raw)
+    except json.JSONDecodeError:
+        return default_tiers
+    if not isinstance(items, list):
+        return default_tiers
+
+    tiers: list[dict] = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        tiers.append(
+            {
+                "after_days": max(0.0, _to_float(str(item.get("after_days", 7)), 7.0)),
+                "quality": min(95, max(10, _to_int(str(item.get("quality", 70)), 70))),
+                "max_side": max(0, _to_int(str(item.get("max_side", 0)), 0)),
+            }
+        )
+    # Tier numbers follow age, so a record only ever moves to a higher tier.
+    return sorted(tiers, key=lambda tier: tier["after_days"]) or default_tiers
+
+
+# JSON list of {"name", "base_url" | "api_url", "api_key", "model", "weight"}.
+# Falls back to the single QWEN_* endpoint above when unset.
+QWEN_ENDPOINTS = _load_qwen_endpoints(os.getenv("QWEN_ENDPOINTS", "").strip())
+QWEN_ROUTING_STRATEGY = os.getenv("QWEN_ROUTING_STRATEGY", "latency").strip().lower()
+QWEN_EJECT_SECONDS = _to_float(os.getenv("QWEN_EJECT_SECONDS"), 30.0)
+QWEN_EJECT_FAILURE_THRESHOLD = _to_int(os.getenv("QWEN_EJECT_FAILURE_THRESHOLD"), 3)
+QWEN_TIMEOUT = _to_float(os.getenv("QWEN_TIMEOUT"), 30.0)
+QWEN_STREAM = _to_bool(os.getenv("QWEN_STREAM"), True)
+
+# Upper bound on concurrent model calls across all detection endpoints.
+DETECTION_MAX_CONCURRENCY = _to_int(os.getenv("DETECTION_MAX_CONCURRENCY"), 8)
+# Fair share of those slots per uploader source, as JSON: {"cam0": 2, "cam1": 1}.
+# Unlisted sources weigh 1. Manual detection always goes first.
+DETECTION_SOURCE_WEIGHTS = _load_source_weights(os.getenv("DETECTION_SOURCE_WEIGHTS", "").strip())
+# Uploads beyond this many queued frames of one source get 429 (0 = no limit).
+DETECTION_MAX_QUEUE_PER_SOURCE = _to_int(os.getenv("DETECTION_MAX_QUEUE_PER_SOURCE"), 32)
+SCRIPT_BATCH_MAX_FILES = _to_int(os.getenv("SCRIPT_BATCH_MAX_FILES"), 100)
+
+# What the vision model sees when the detector sends boxes with the frame:
+# "mosaic" tiles padded crops into one image, "crops" sends them as separate
+# images in one request, "full" always sends the whole frame.
+DETECT_REGION_MODE = os.getenv("DETECT_REGION_MODE", "mosaic").strip().lower()
+DETECT_REGION_PADDING = _to_float(os.getenv("DETECT_REGION_PADDING"), 0.25)
+DETECT_REGION_MIN_PADDING_PX = _to_int(os.getenv("DETECT_REGION_MIN_PADDING_PX"), 32)
+DETECT_REGION_MAX_COUNT = _to_int(os.getenv("DETECT_REGION_MAX_COUNT"), 6)
+DETECT_REGION_MAX_SIDE = _to_int(os.getenv("DETECT_REGION_MAX_SIDE"), 512)
+# Send the full frame instead when the padded crops cover this much of it anyway.
+DETECT_REGION_MAX_AREA_RATIO = _to_float(os.getenv("DETECT_REGION_MAX_AREA_RATIO"), 0.6)
+
+# Delta API change log: rows older than this are pruned; clients holding an
+# older cursor are told to reload the full list.
+MONITOR_CHANGE_RETENTION_HOURS = _to_float(os.getenv("MONITOR_CHANGE_RETENTION_HOURS"), 24.0)
+MONITOR_CHANGES_MAX_LIMIT = _to_int(os.getenv("MONITOR_CHANGES_MAX_LIMIT"), 5000)
+# Page size cap for GET /api/data-monitor/records?limit=.
+MONITOR_LIST_MAX_LIMIT = _to_int(os.getenv("MONITOR_LIST_MAX_LIMIT"), 1000)
+# Rows per UPDATE/DELETE statement (and per commit) in the bulk endpoints.
+MONITOR_BULK_CHUNK_SIZE = _to_int(os.getenv("MONITOR_BULK_CHUNK_SIZE"), 1000)
+# Monthly RANGE partitions of monitor_records on created_at (MySQL only; set up
+# with scripts/rebuild_monitor_records.py --partitioned or --partition-in-place).
+# The backend keeps MONITOR_PARTITION_MONTHS_AHEAD empty future partitions and,
+# with MONITOR_RECORD_RETENTION_DAYS > 0, drops months that are entirely older
+# than the retention. Partitioned tables cannot carry the FULLTEXT remark index,
+# so remark search falls back to LIKE.
+MONITOR_RECORDS_PARTITIONED = _to_bool(os.getenv("MONITOR_RECORDS_PARTITIONED"), False)
+MONITOR_PARTITION_MONTHS_AHEAD = _to_int(os.getenv("MONITOR_PARTITION_MONTHS_AHEAD"), 3)
+MONITOR_RECORD_RETENTION_DAYS = _to_int(os.getenv("MONITOR_RECORD_RETENTION_DAYS"), 0)
+MONITOR_PARTITION_MAINTENANCE_INTERVAL_SECONDS = _to_float(
+    os.getenv("MONITOR_PARTITION_MAINTENANCE_INTERVAL_SECONDS"), 86400.0
+)
+
+# Incident aggregation for uploader frames: fire frames from one source less
+# than INCIDENT_GAP_SECONDS apart belong to one incident. Counter-only updates
+# are written and broadcast at most every INCIDENT_FLUSH_SECONDS; "latest"
+# sample frames are kept at most every INCIDENT_FRAME_INTERVAL_SECONDS.
+INCIDENT_AGGREGATION_ENABLED = _to_bool(os.getenv("INCIDENT_AGGREGATION_ENABLED"), True)
+INCIDENT_GAP_SECONDS = _to_float(os.getenv("INCIDENT_GAP_SECONDS"), 60.0)
+INCIDENT_MAX_FRAMES = _to_int(os.getenv("INCIDENT_MAX_FRAMES"), 6)
+INCIDENT_FRAME_INTERVAL_SECONDS = _to_float(os.getenv("INCIDENT_FRAME_INTERVAL_SECONDS"), 10.0)
+INCIDENT_FLUSH_SECONDS = _to_float(os.getenv("INCIDENT_FLUSH_SECONDS"), 5.0)
+# One MonitorRecord per uploaded frame as before; false keeps only incidents.
+MONITOR_PER_FRAME_RECORDS = _to_bool(os.getenv("MONITOR_PER_FRAME_RECORDS"), True)
+
 SCRIPT_UPLOADER_ENABLED = _to_bool(os.getenv("SCRIPT_UPLOADER_ENABLED"), True)
 SCRIPT_UPLOADER_WATCH_DIR = os.getenv("SCRIPT_UPLOADER_WATCH_DIR", "detected_frames")
 DATA_IMAGE_DIR = os.getenv("DATA_IMAGE_DIR", "data_image")
@@ -51,6 +196,37 @@ SCRIPT_UPLOADER_MIN_UPLOAD_INTERVAL = _to_float(
     os.getenv("SCRIPT_UPLOADER_MIN_UPLOAD_INTERVAL"), 1.0
 )
 SCRIPT_UPLOADER_TIMEOUT = _to_float(os.getenv("SCRIPT_UPLOADER_TIMEOUT"), 30.0)
+SCRIPT_UPLOADER_WORKERS = _to_int(os.getenv("SCRIPT_UPLOADER_WORKERS"), 2)
+SCRIPT_UPLOADER_QUEUE_SIZE = _to_int(os.getenv("SCRIPT_UPLOADER_QUEUE_SIZE"), 100)
+SCRIPT_UPLOADER_LATEST_ONLY = _to_bool(os.getenv("SCRIPT_UPLOADER_LATEST_ONLY"), False)
+# e.g. unix:/tmp/fire_frames.sock or tcp:127.0.0.1:8765; empty disables the socket hand-off.
+SCRIPT_UPLOADER_FRAME_SOCKET = os.getenv("SCRIPT_UPLOADER_FRAME_SOCKET", "").strip()
+
+# Append new monitor images to large segment files under DATA_IMAGE_DIR/segments
+# instead of one file each. Names, paths and URLs stay the same, and images
+# already stored as files keep working. The compactor rewrites sealed segments
+# with at least IMAGE_SEGMENT_COMPACT_GARBAGE_RATIO deleted bytes.
+IMAGE_SEGMENT_STORE_ENABLED = _to_bool(os.getenv("IMAGE_SEGMENT_STORE_ENABLED"), False)
+IMAGE_SEGMENT_MAX_BYTES = _to_int(os.getenv("IMAGE_SEGMENT_MAX_BYTES"), 256 * 1024 * 1024)
+IMAGE_SEGMENT_COMPACT_GARBAGE_RATIO = _to_float(os.getenv("IMAGE_SEGMENT_COMPACT_GARBAGE_RATIO"), 0.5)
+IMAGE_SEGMENT_COMPACT_INTERVAL_SECONDS = _to_float(os.getenv("IMAGE_SEGMENT_COMPACT_INTERVAL_SECONDS"), 600.0)
+# fsync the segment and index.log on every put/delete, so an image whose record
+# is committed survives a power loss. Costs a disk flush per frame.
+IMAGE_SEGMENT_FSYNC = _to_bool(os.getenv("IMAGE_SEGMENT_FSYNC"), False)
+# Background re-encoding of aging monitor images. Each tier ({"after_days",
+# "quality", "max_side"}, JSON list) applies once an image is that old; an
+# image goes straight to the highest tier it qualifies for. Runs every
+# IMAGE_RECOMPRESS_INTERVAL_SECONDS on a pool of IMAGE_RECOMPRESS_WORKERS
+# processes at nice IMAGE_RECOMPRESS_NICE.
+IMAGE_RECOMPRESS_ENABLED = _to_bool(os.getenv("IMAGE_RECOMPRESS_ENABLED"), False)
+IMAGE_RECOMPRESS_TIERS = _load_recompress_tiers(os.getenv("IMAGE_RECOMPRESS_TIERS", "").strip())
+# webp | jpeg
+IMAGE_RECOMPRESS_FORMAT = os.getenv("IMAGE_RECOMPRESS_FORMAT", "webp").strip().lower()
+IMAGE_RECOMPRESS_KEEP_FIRE_ORIGINALS = _to_bool(os.getenv("IMAGE_RECOMPRESS_KEEP_FIRE_ORIGINALS"), True)
+IMAGE_RECOMPRESS_WORKERS = _to_int(os.getenv("IMAGE_RECOMPRESS_WORKERS"), 1)
+IMAGE_RECOMPRESS_NICE = _to_int(os.getenv("IMAGE_RECOMPRESS_NICE"), 19)
+IMAGE_RECOMPRESS_BATCH_SIZE = _to_int(os.getenv("IMAGE_RECOMPRESS_BATCH_SIZE"), 50)
+IMAGE_RECOMPRESS_INTERVAL_SECONDS = _to_float(os.getenv("IMAGE_RECOMPRESS_INTERVAL_SECONDS"), 3600.0)
 
 MYSQL_URL = os.getenv("MYSQL_URL", "").strip()
 MYSQL_HOST = os.getenv("MYSQL_HOST", "127.0.0.1")
@@ -59,3 +235,18 @@ MYSQL_USER = os.getenv("MYSQL_USER", "root")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "fire_detection")
 MYSQL_CHARSET = os.getenv("MYSQL_CHARSET", "utf8mb4")
+# Read replica for the list, export and incident reads; empty uses the primary.
+# After a failed connect, reads go to the primary for DB_READ_FALLBACK_SECONDS.
+MYSQL_READ_URL = os.getenv("MYSQL_READ_URL", "").strip()
+DB_READ_FALLBACK_SECONDS = _to_float(os.getenv("DB_READ_FALLBACK_SECONDS"), 30.0)
+# Connection pool of each engine (write and read). Pre-ping costs a round trip
+# per checkout; with it off, keep DB_POOL_RECYCLE below the server's
+# wait_timeout so idle connections are replaced before MySQL drops them.
+DB_POOL_SIZE = _to_int(os.getenv("DB_POOL_SIZE"), 5)
+DB_MAX_OVERFLOW = _to_int(os.getenv("DB_MAX_OVERFLOW"), 10)
+DB_POOL_TIMEOUT = _to_float(os.getenv("DB_POOL_TIMEOUT"), 30.0)
+DB_POOL_RECYCLE = _to_int(os.getenv("DB_POOL_RECYCLE"), 1800)
+DB_POOL_PRE_PING = _to_bool(os.getenv("DB_POOL_PRE_PING"), True)
+# Unset = same as the write pool.
+DB_READ_POOL_SIZE = _to_int(os.getenv("DB_READ_POOL_SIZE"), DB_POOL_SIZE)
+DB_READ_MAX_OVERFLOW = _to_int(os.getenv("DB_READ_MAX_OVERFLOW"), DB_MAX_OVERFLOW)
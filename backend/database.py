@@ -1,17 +1,30 @@
 from __future__ import annotations
 
-from collections.abc import AsyncGenerator
+import time
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
 from urllib.parse import quote_plus
 
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
 from config import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_READ_FALLBACK_SECONDS,
+    DB_READ_MAX_OVERFLOW,
+    DB_READ_POOL_SIZE,
     MYSQL_CHARSET,
     MYSQL_DATABASE,
     MYSQL_HOST,
     MYSQL_PASSWORD,
     MYSQL_PORT,
+    MYSQL_READ_URL,
     MYSQL_URL,
     MYSQL_USER,
 )
@@ -23,15 +36,38 @@ class Base(DeclarativeBase):
 
 _engine: AsyncEngine | None = None
 _session_factory = None
+_read_engine: AsyncEngine | None = None
+_read_session_factory = None
+# Replica circuit: reads use the primary until this monotonic time.
+_read_down_until = 0.0
+_read_fallbacks = 0
+_read_last_error: str | None = None
+
+
+class _PoolStats:
+    # Counters from pool events; sizes come from the pool itself.
+    def __init__(self, max_overflow: int) -> None:
+        self.max_overflow = max_overflow
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.peak_checked_out = 0
+
+
+_pool_stats: dict[str, _PoolStats] = {}
+
+
+def _to_async_url(url: str) -> str:
+    if url.startswith("mysql+pymysql://"):
+        return url.replace("mysql+pymysql://", "mysql+aiomysql://", 1)
+    if url.startswith("mysql://"):
+        return url.replace("mysql://", "mysql+aiomysql://", 1)
+    return url
 
 
 def _build_mysql_url() -> str:
     if MYSQL_URL:
-        if MYSQL_URL.startswith("mysql+pymysql://"):
-            return MYSQL_URL.replace("mysql+pymysql://", "mysql+aiomysql://", 1)
-        if MYSQL_URL.startswith("mysql://"):
-            return MYSQL_URL.replace("mysql://", "mysql+aiomysql://", 1)
-        return MYSQL_URL
+        return _to_async_url(MYSQL_URL)
 
     user = quote_plus(MYSQL_USER)
     password = quote_plus(MYSQL_PASSWORD)
@@ -42,10 +78,41 @@ def _build_mysql_url() -> str:
     return f"mysql+aiomysql://{user}:{password}@{host}:{port}/{database}?charset={charset}"
 
 
+def _create_engine(name: str, url: str, *, pool_size: int, max_overflow: int) -> AsyncEngine:
+    engine = create_async_engine(
+        url,
+        pool_size=max(1, pool_size),
+        max_overflow=max(0, max_overflow),
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    stats = _pool_stats[name] = _PoolStats(max(0, max_overflow))
+    pool = engine.sync_engine.pool
+
+    @event.listens_for(pool, "connect")
+    def _on_connect(dbapi_connection, connection_record) -> None:
+        stats.connects += 1
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+        stats.checkouts += 1
+        stats.peak_checked_out = max(stats.peak_checked_out, pool.checkedout())
+
+    @event.listens_for(pool, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception) -> None:
+        stats.invalidations += 1
+
+    return engine
+
+
 def get_engine() -> AsyncEngine:
+    # The primary: all writes, and reads that must see them.
     global _engine
     if _engine is None:
-        _engine = create_async_engine(_build_mysql_url(), pool_pre_ping=True)
+        _engine = _create_engine(
+            "write", _build_mysql_url(), pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW
+        )
     return _engine
 
 
@@ -61,6 +128,49 @@ def get_session_factory() -> async_sessionmaker[AsyncSession]:
     return _session_factory
 
 
+def _get_read_session_factory() -> async_sessionmaker[AsyncSession]:
+    global _read_engine, _read_session_factory
+    if _read_session_factory is None:
+        _read_engine = _create_engine(
+            "read",
+            _to_async_url(MYSQL_READ_URL),
+            pool_size=DB_READ_POOL_SIZE,
+            max_overflow=DB_READ_MAX_OVERFLOW,
+        )
+        _read_session_factory = async_sessionmaker(
+            bind=_read_engine,
+            autocommit=False,
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return _read_session_factory
+
+
+@asynccontextmanager
+async def read_session() -> AsyncIterator[AsyncSession]:
+    # For read-only work that tolerates replica lag. Uses MYSQL_READ_URL when
+    # set and reachable, else the primary. Only the connect is retried on the
+    # primary; errors from the caller's own queries propagate.
+    global _read_down_until, _read_fallbacks, _read_last_error
+
+    if MYSQL_READ_URL and time.monotonic() >= _read_down_until:
+        db = _get_read_session_factory()()
+        try:
+            await db.connection()
+        except (SQLAlchemyError, OSError) as exc:
+            await db.close()
+            _read_down_until = time.monotonic() + DB_READ_FALLBACK_SECONDS
+            _read_fallbacks += 1
+            _read_last_error = str(exc)
+        else:
+            async with db:
+                yield db
+            return
+
+    async with get_session_factory()() as db:
+        yield db
+
+
 async def init_database() -> None:
     from models import data_monitor  # noqa: F401
 
@@ -73,3 +183,53 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
     session_factory = get_session_factory()
     async with session_factory() as db:
         yield db
+
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    # get_db for read-only endpoints; see read_session.
+    async with read_session() as db:
+        yield db
+
+
+async def dispose_engines() -> None:
+    for engine in (_engine, _read_engine):
+        if engine is not None:
+            await engine.dispose()
+
+
+def _pool_snapshot(name: str, engine: AsyncEngine | None) -> dict | None:
+    if engine is None:
+        return None
+    pool = engine.sync_engine.pool
+    stats = _pool_stats[name]
+    capacity = pool.size() + stats.max_overflow
+    checked_out = pool.checkedout()
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": stats.max_overflow,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "utilization": round(checked_out / capacity, 3) if capacity else None,
+        "peak_checked_out": stats.peak_checked_out,
+        "connects": stats.connects,
+        "checkouts": stats.checkouts,
+        "invalidations": stats.invalidations,
+    }
+
+
+def pool_snapshot() -> dict:
+    now = time.monotonic()
+    return {
+        "pre_ping": DB_POOL_PRE_PING,
+        "recycle_seconds": DB_POOL_RECYCLE,
+        "timeout_seconds": DB_POOL_TIMEOUT,
+        "write": _pool_snapshot("write", _engine),
+        "read": _pool_snapshot("read", _read_engine),
+        "read_replica": {
+            "configured": bool(MYSQL_READ_URL),
+            "using_primary_for_seconds": round(max(0.0, _read_down_until - now), 3),
+            "fallbacks": _read_fallbacks,
+            "last_error": _read_last_error,
+        },
+    }
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from sqlalchemy import DateTime, Integer, String
+from sqlalchemy import JSON, DateTime, Float, Index, Integer, SmallInteger, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from database import Base
@@ -10,11 +10,34 @@ from database import Base
 
 class MonitorRecord(Base):
     __tablename__ = "monitor_records"
+    # Every list filter leads an index whose trailing column is the default
+    # sort (InnoDB appends the primary key, so "created_at, id" needs no
+    # filesort). Keep scripts/rebuild_monitor_records.py in sync.
+    __table_args__ = (
+        Index("ix_monitor_records_created_at", "created_at"),
+        Index("ix_monitor_records_updated_at", "updated_at"),
+        Index("ix_monitor_records_status_created_at", "status", "created_at"),
+        Index("ix_monitor_records_source_created_at", "source", "created_at"),
+        # Finds images due for the next recompression tier.
+        Index("ix_monitor_records_image_tier_created_at", "image_tier", "created_at"),
+        Index("ix_monitor_records_remark", "remark"),
+        # Remarks are mostly Chinese, which the default parser cannot split.
+        Index(
+            "ft_monitor_records_remark",
+            "remark",
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram",
+        ).ddl_if(dialect="mysql"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True, autoincrement=True)
     scene_image_path: Mapped[str] = mapped_column(String(255), nullable=False)
     status: Mapped[str] = mapped_column(String(32), nullable=False)
     remark: Mapped[str] = mapped_column(String(255), nullable=False, default="")
+    # Camera source_id from the uploader, else the endpoint that created the record.
+    source: Mapped[str] = mapped_column(String(64), nullable=False, default="")
+    # Highest IMAGE_RECOMPRESS_TIERS entry applied to the image (0 = original).
+    image_tier: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=0)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime,
@@ -22,3 +45,44 @@ class MonitorRecord(Base):
         onupdate=datetime.utcnow,
         nullable=False,
     )
+
+
+class MonitorRecordChange(Base):
+    # Append-only change log behind the delta API: one row per insert, update
+    # or delete of a monitor record; the autoincrement id is the client cursor.
+    __tablename__ = "monitor_record_changes"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    record_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    op: Mapped[str] = mapped_column(String(16), nullable=False)
+    changed_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, nullable=False, index=True
+    )
+
+
+class MonitorIncident(Base):
+    # One row per fire event: consecutive positive frames from a source, with
+    # counters and a bounded list of representative frames instead of a row
+    # per frame. See services/incidents.py.
+    __tablename__ = "monitor_incidents"
+    __table_args__ = (
+        Index("ix_monitor_incidents_last_seen_at", "last_seen_at"),
+        Index("ix_monitor_incidents_status_last_seen_at", "status", "last_seen_at"),
+        Index("ix_monitor_incidents_source_last_seen_at", "source", "last_seen_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    source: Mapped[str] = mapped_column(String(64), nullable=False)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="open")
+    first_seen_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_seen_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    frame_count: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
+    max_confidence: Mapped[float | None] = mapped_column(Float, nullable=True)
+    # [{"kind": "first" | "peak" | "latest", "image_path", "seen_at", "confidence"}]
+    frames: Mapped[list] = mapped_column(JSON, nullable=False, default=list)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        nullable=False,
+    )
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
+from typing import Any, Literal
 
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -9,7 +10,13 @@ class DetectResponse(BaseModel):
     fire_detected: bool
     result_text: str
     raw_model_output: str | None = None
+    # What the vision model was sent: "full", "crops" or "mosaic".
+    model_input: str | None = None
+    # Detector boxes uploaded with the frame (boxes, confidences, image_size, ...).
+    detections: dict[str, Any] | None = None
     monitor_record: "MonitorRecordRead | None" = None
+    # Set for positive uploader frames when incident aggregation is on.
+    incident: "MonitorIncidentRead | None" = None
 
 
 class MonitorRecordBase(BaseModel):
@@ -23,5 +30,63 @@ class MonitorRecordRead(MonitorRecordBase):
     id: int
     scene_image_path: str
     scene_image_url: str
+    source: str = ""
     created_at: datetime
     updated_at: datetime
+
+
+class MonitorRecordFilters(BaseModel):
+    # Shared by the list endpoint and anything else that selects records by
+    # filter. Datetimes are UTC; ranges are [from, to).
+    status: Literal["fire", "normal"] | None = None
+    source: str | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    updated_from: datetime | None = None
+    updated_to: datetime | None = None
+    # Remark text search.
+    q: str | None = None
+
+
+class MonitorRecordSelection(BaseModel):
+    # Bulk operations target either explicit ids or everything matching filters.
+    ids: list[int] | None = None
+    filters: MonitorRecordFilters | None = None
+
+
+class MonitorRecordBulkUpdate(MonitorRecordSelection):
+    status: Literal["fire", "normal"] | None = None
+    remark: str | None = Field(default=None, max_length=255)
+
+
+class MonitorRecordChange(BaseModel):
+    seq: int
+    op: Literal["upsert", "delete"]
+    id: int
+    record: MonitorRecordRead | None = None
+
+
+class MonitorRecordChanges(BaseModel):
+    cursor: int
+    reset: bool = False
+    has_more: bool = False
+    changes: list[MonitorRecordChange]
+
+
+class MonitorIncidentFrame(BaseModel):
+    kind: Literal["first", "peak", "latest"]
+    image_path: str
+    image_url: str
+    seen_at: datetime
+    confidence: float | None = None
+
+
+class MonitorIncidentRead(BaseModel):
+    id: int
+    source: str
+    status: Literal["open", "closed"]
+    first_seen_at: datetime
+    last_seen_at: datetime
+    frame_count: int
+    max_confidence: float | None = None
+    frames: list[MonitorIncidentFrame]
@@ -3,20 +3,52 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Literal
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
-from sqlalchemy import select
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+import config
+from database import get_db, get_read_db, get_session_factory, read_session
 from models.data_monitor import MonitorRecord
-from models.schemas import MonitorRecordRead
+from models.schemas import (
+    MonitorIncidentRead,
+    MonitorRecordBulkUpdate,
+    MonitorRecordChanges,
+    MonitorRecordFilters,
+    MonitorRecordRead,
+    MonitorRecordSelection,
+)
+from services.detection_scheduler import PRIORITY_MANUAL, detection_scheduler
 from services.monitor_records import (
+    CHANGE_DELETE,
+    CHANGE_UPSERT,
     create_monitor_record,
     delete_stored_image,
     ensure_database_initialized,
+    list_record_changes,
+    log_record_changes,
+    publish_record_changes,
+    query_monitor_records,
+    record_list_validator,
     save_image_to_data_image,
     to_read_model,
 )
+from services.incidents import list_incidents
+from services.record_bulk import selection_error, stream_bulk_delete, stream_bulk_update
+from services.record_changes import incident_change_hub, record_change_hub
+from services.record_export import export_filename, export_media_type, stream_records_export
 from services.qwen_client import call_qwen
 from utils import parse_fire_result
 
@@ -36,34 +68,152 @@ async def _read_and_validate_jpg(file: UploadFile) -> bytes:
     return image_bytes
 
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    # Weak comparison (RFC 9110 13.1.2): W/ prefixes are ignored.
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def record_filters(
+    status: Literal["fire", "normal"] | None = Query(default=None),
+    source: str | None = Query(default=None, max_length=64),
+    created_from: datetime | None = Query(default=None),
+    created_to: datetime | None = Query(default=None),
+    updated_from: datetime | None = Query(default=None),
+    updated_to: datetime | None = Query(default=None),
+    q: str | None = Query(default=None, max_length=255),
+) -> MonitorRecordFilters:
+    return MonitorRecordFilters(
+        status=status,
+        source=source,
+        created_from=created_from,
+        created_to=created_to,
+        updated_from=updated_from,
+        updated_to=updated_to,
+        q=q,
+    )
+
+
 async def _auto_detect_status(image_bytes: bytes) -> str:
-    model_text = await call_qwen(image_bytes=image_bytes, mime_type="image/jpeg")
+    # Same admission as /api/manual/detect-fire: counts toward
+    # DETECTION_MAX_CONCURRENCY and goes ahead of queued uploader frames.
+    # Manual work is never rejected, it waits for a slot.
+    async with detection_scheduler.slot("data_monitor", PRIORITY_MANUAL):
+        model_text = await call_qwen(image_bytes=image_bytes, mime_type="image/jpeg")
     return "fire" if parse_fire_result(model_text) else "normal"
 
 
 @router.get("/api/data-monitor/records", response_model=list[MonitorRecordRead])
 async def list_monitor_records(
+    response: Response,
     sort_by: Literal["id", "status", "remark", "created_at", "updated_at", "time"] = Query(
         default="created_at"
     ),
     sort_order: Literal["asc", "desc"] = Query(default="desc"),
-    db: AsyncSession = Depends(get_db),
-) -> list[MonitorRecordRead]:
+    filters: MonitorRecordFilters = Depends(record_filters),
+    limit: int | None = Query(default=None, ge=1),
+    after: str | None = Query(default=None, max_length=1024),
+    if_none_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_read_db),
+) -> list[MonitorRecordRead] | Response:
+    # Without `limit` every matching record is returned. With it, pass the
+    # X-Next-Cursor header back as `after` for the next page.
     try:
         await ensure_database_initialized()
-        sort_column_map = {
-            "id": MonitorRecord.id,
-            "status": MonitorRecord.status,
-            "remark": MonitorRecord.remark,
-            "created_at": MonitorRecord.created_at,
-            "updated_at": MonitorRecord.updated_at,
-            "time": MonitorRecord.created_at,
+        # Read before the list: resuming the delta API from here may repeat a
+        # change already in the list, but never misses one.
+        cursor, change_count = await record_list_validator(db)
+        headers = {
+            "X-Changes-Cursor": str(cursor),
+            "ETag": f'W/"records-{cursor}-{change_count}"',
+            # Browsers keep the list but revalidate it on every load.
+            "Cache-Control": "no-cache",
         }
-        sort_column = sort_column_map[sort_by]
-        order_expr = sort_column.asc() if sort_order == "asc" else sort_column.desc()
-        result = await db.execute(select(MonitorRecord).order_by(order_expr, MonitorRecord.id.desc()))
-        rows = list(result.scalars().all())
-        return [to_read_model(row) for row in rows]
+        if _etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+        rows, next_cursor = await query_monitor_records(
+            db,
+            filters,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            limit=None if limit is None else min(limit, config.MONITOR_LIST_MAX_LIMIT),
+            after=after,
+        )
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return rows
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except Exception as exc:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Data monitor database is unavailable. Please check MySQL config. {exc}",
+        ) from exc
+
+
+@router.get("/api/data-monitor/records/export")
+async def export_monitor_records(
+    format: Literal["csv", "ndjson"] = Query(default="csv"),
+    images: bool = Query(default=False),
+    filters: MonitorRecordFilters = Depends(record_filters),
+) -> StreamingResponse:
+    # Streams every matching record (id order) from a server-side cursor;
+    # images=true wraps the rows and their image files in a ZIP built on the fly.
+    try:
+        await ensure_database_initialized()
+    except Exception as exc:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Data monitor database is unavailable. Please check MySQL config. {exc}",
+        ) from exc
+
+    filename = export_filename(format, images)
+    return StreamingResponse(
+        stream_records_export(filters, format, images),
+        media_type=export_media_type(format, images),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/api/data-monitor/records/bulk-update")
+async def bulk_update_monitor_records(payload: MonitorRecordBulkUpdate) -> StreamingResponse:
+    # {"ids": [...]} or {"filters": {...}} plus "status" and/or "remark".
+    # Streams NDJSON progress, one line per committed chunk.
+    error = selection_error(payload)
+    if error is None and payload.status is None and payload.remark is None:
+        error = "Nothing to update; pass status and/or remark"
+    if error is not None:
+        raise HTTPException(status_code=400, detail=error)
+
+    return StreamingResponse(
+        stream_bulk_update(payload, status=payload.status, remark=payload.remark),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.post("/api/data-monitor/records/bulk-delete")
+async def bulk_delete_monitor_records(payload: MonitorRecordSelection) -> StreamingResponse:
+    # {"ids": [...]} or {"filters": {...}}. Images are removed after each
+    # chunk commits, off the request path.
+    error = selection_error(payload)
+    if error is not None:
+        raise HTTPException(status_code=400, detail=error)
+
+    return StreamingResponse(stream_bulk_delete(payload), media_type="application/x-ndjson")
+
+
+@router.get("/api/data-monitor/records/changes", response_model=MonitorRecordChanges)
+async def list_monitor_record_changes(
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=500, ge=1),
+    db: AsyncSession = Depends(get_db),
+) -> dict:
+    try:
+        return await list_record_changes(db, since, min(limit, config.MONITOR_CHANGES_MAX_LIMIT))
     except Exception as exc:
         raise HTTPException(
             status_code=500,
@@ -71,6 +221,71 @@ async def list_monitor_records(
         ) from exc
 
 
+@router.websocket("/ws/data-monitor/changes")
+async def monitor_record_changes_ws(websocket: WebSocket, since: int | None = None) -> None:
+    # Subscribe first, then replay the delta since the client's cursor, so
+    # nothing committed in between is lost (a repeat is harmless).
+    await record_change_hub.connect(websocket)
+    try:
+        if since is not None:
+            async with get_session_factory()() as db:
+                delta = await list_record_changes(db, max(0, since), config.MONITOR_CHANGES_MAX_LIMIT)
+            # Too far behind for one message: have the client reload instead.
+            reset = delta["reset"] or delta["has_more"]
+            await websocket.send_text(
+                record_change_hub.build_message(
+                    delta["cursor"], [] if reset else delta["changes"], reset=reset
+                )
+            )
+
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await record_change_hub.disconnect(websocket)
+
+
+@router.get("/api/data-monitor/incidents", response_model=list[MonitorIncidentRead])
+async def list_monitor_incidents(
+    status: Literal["open", "closed"] | None = Query(default=None),
+    source: str | None = Query(default=None, max_length=64),
+    limit: int = Query(default=100, ge=1),
+    db: AsyncSession = Depends(get_read_db),
+) -> list[MonitorIncidentRead]:
+    try:
+        return await list_incidents(
+            db, status=status, source=source, limit=min(limit, config.MONITOR_LIST_MAX_LIMIT)
+        )
+    except Exception as exc:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Data monitor database is unavailable. Please check MySQL config. {exc}",
+        ) from exc
+
+
+@router.websocket("/ws/data-monitor/incidents")
+async def monitor_incidents_ws(websocket: WebSocket) -> None:
+    # Each message carries whole incidents (keyed by id) in their new state.
+    # The first one lists the incidents open at connect time.
+    await incident_change_hub.connect(websocket)
+    try:
+        async with read_session() as db:
+            open_incidents = await list_incidents(db, status="open", limit=config.MONITOR_LIST_MAX_LIMIT)
+        await websocket.send_text(
+            incident_change_hub.build_message(
+                0, [incident.model_dump(mode="json") for incident in open_incidents], reset=True
+            )
+        )
+
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await incident_change_hub.disconnect(websocket)
+
+
 @router.post("/api/data-monitor/records", response_model=MonitorRecordRead, status_code=201)
 async def create_monitor_record_api(
     scene_image: UploadFile = File(...),
@@ -86,6 +301,7 @@ async def create_monitor_record_api(
             mime_type="image/jpeg",
             status=status,
             remark=remark,
+            source="data_monitor",
         )
     except HTTPException:
         raise
@@ -116,22 +332,28 @@ async def update_monitor_record(
 
         if scene_image is not None:
             image_bytes = await _read_and_validate_jpg(scene_image)
+            # Detect first: a model error (an HTTPException, re-raised below
+            # without cleanup) must not leave the new image behind.
+            status = await _auto_detect_status(image_bytes)
             old_scene_image_path = record.scene_image_path
             new_scene_image_path = save_image_to_data_image(
                 image_bytes=image_bytes,
                 mime_type="image/jpeg",
             )
             record.scene_image_path = new_scene_image_path
-            record.status = await _auto_detect_status(image_bytes)
+            record.status = status
 
         record.updated_at = datetime.utcnow()
+        changes = log_record_changes(db, [record.id], CHANGE_UPSERT)
         await db.commit()
         await db.refresh(record)
 
         if old_scene_image_path and new_scene_image_path:
             delete_stored_image(old_scene_image_path)
 
-        return to_read_model(record)
+        read_model = to_read_model(record)
+        await publish_record_changes(changes, [read_model])
+        return read_model
     except HTTPException:
         raise
     except Exception as exc:
@@ -154,8 +376,10 @@ async def delete_monitor_record(record_id: int, db: AsyncSession = Depends(get_d
 
         scene_image_path = record.scene_image_path
         await db.delete(record)
+        changes = log_record_changes(db, [record_id], CHANGE_DELETE)
         await db.commit()
         delete_stored_image(scene_image_path)
+        await publish_record_changes(changes, [None])
         return {"success": True}
     except HTTPException:
         raise
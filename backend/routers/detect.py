@@ -3,15 +3,29 @@ from __future__ import annotations
 import asyncio
 import base64
 import json
+from collections.abc import AsyncIterator
 from threading import Lock
 
-from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
-from models.schemas import DetectResponse
-from services.monitor_records import create_monitor_record
-from services.qwen_client import call_qwen
+import config
+from database import get_db, get_session_factory, pool_snapshot
+from models.schemas import DetectResponse, MonitorIncidentRead, MonitorRecordRead
+from services.detection_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_MANUAL,
+    DetectionQueueFull,
+    detection_scheduler,
+)
+from services.image_recompression import image_recompressor
+from services.incidents import incident_tracker
+from services.monitor_records import create_monitor_record, create_monitor_records
+from services.qwen_client import call_qwen_images
+from services.qwen_pool import qwen_endpoint_pool
+from services.record_partitions import record_partition_maintainer
+from services.region_crops import build_model_images, parse_detection_metadata
 from utils import parse_fire_result
 
 
@@ -58,6 +72,7 @@ class _ScriptUploadSocketHub:
             "image_data_url": f"data:{mime_type};base64,{encoded}",
             "fire_detected": result.fire_detected,
             "result_text": result.result_text,
+            "detections": result.detections,
             "monitor_record": result.monitor_record.model_dump(mode="json")
             if result.monitor_record is not None
             else None,
@@ -108,53 +123,273 @@ async def _read_and_validate_image(file: UploadFile) -> tuple[bytes, str]:
     return image_bytes, file.content_type
 
 
-async def _run_detection(image_bytes: bytes, mime_type: str) -> tuple[bool, str]:
-    model_text = await call_qwen(image_bytes=image_bytes, mime_type=mime_type)
-    fire_detected = parse_fire_result(model_text)
-    return fire_detected, model_text
+def _parse_metadata_field(metadata: str | None) -> dict | None:
+    try:
+        return parse_detection_metadata(metadata)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
-async def _detect_and_create_record(
-    *,
+async def _run_detection(
     image_bytes: bytes,
     mime_type: str,
+    detections: dict | None = None,
+    *,
     source: str,
-    db: AsyncSession,
-) -> DetectResponse:
-    fire_detected, model_text = await _run_detection(image_bytes=image_bytes, mime_type=mime_type)
-    status = "发生火灾" if fire_detected else "无火灾"
-    remark = "自动上传"
+    priority: int = PRIORITY_BACKGROUND,
+    reject_when_full: bool = True,
+) -> tuple[bool, str, str]:
+    if detections and detections.get("boxes"):
+        # Decode/crop/encode is CPU work: keep it off the event loop.
+        model_images, model_input, frame_size = await asyncio.to_thread(
+            build_model_images, image_bytes, mime_type, detections
+        )
+        if frame_size is not None:
+            detections["image_size"] = list(frame_size)
+    else:
+        model_images, model_input = [(image_bytes, mime_type)], "full"
 
     try:
-        monitor_record = await create_monitor_record(
-            db=db,
-            image_bytes=image_bytes,
-            mime_type=mime_type,
-            status=status,
-            remark=remark,
-        )
-    except Exception as exc:
+        async with detection_scheduler.slot(source, priority, reject_when_full=reject_when_full):
+            model_text = await call_qwen_images(model_images, region_mode=model_input)
+    except DetectionQueueFull as exc:
         raise HTTPException(
-            status_code=500,
-            detail=f"检测已完成但未能创建监控结果: {exc}",
+            status_code=429,
+            detail=f"来源 {exc.source} 的待检测图像过多，请稍后重试",
+            headers={"Retry-After": str(max(1, round(exc.retry_after)))},
         ) from exc
+    fire_detected = parse_fire_result(model_text)
+    return fire_detected, model_text, model_input
 
+
+def _record_status(fire_detected: bool) -> str:
+    return "发生火灾" if fire_detected else "无火灾"
+
+
+def _build_detect_response(
+    fire_detected: bool,
+    model_text: str,
+    monitor_record: MonitorRecordRead | None,
+    model_input: str | None = None,
+    detections: dict | None = None,
+    incident: MonitorIncidentRead | None = None,
+) -> DetectResponse:
     if fire_detected:
         return DetectResponse(
             fire_detected=True,
             result_text="发现火灾！请立即处理！",
             raw_model_output=model_text,
+            model_input=model_input,
+            detections=detections,
             monitor_record=monitor_record,
+            incident=incident,
         )
 
     return DetectResponse(
         fire_detected=False,
         result_text="未发现火灾。",
         raw_model_output=model_text,
+        model_input=model_input,
+        detections=detections,
         monitor_record=monitor_record,
     )
 
 
+def _record_source(detections: dict | None, default: str) -> str:
+    # The uploader's per-camera source_id, if it sent one.
+    return str((detections or {}).get("source_id") or default)[:64]
+
+
+def _max_confidence(detections: dict | None) -> float | None:
+    confidences = [value for value in (detections or {}).get("confidences") or [] if value is not None]
+    return max(confidences) if confidences else None
+
+
+async def _detect_and_create_record(
+    *,
+    image_bytes: bytes,
+    mime_type: str,
+    source: str,
+    db: AsyncSession,
+    detections: dict | None = None,
+    aggregate: bool = False,
+    priority: int = PRIORITY_BACKGROUND,
+) -> DetectResponse:
+    # aggregate: fire frames feed the source's open incident; the per-frame
+    # record is then only written when MONITOR_PER_FRAME_RECORDS is on.
+    record_source = _record_source(detections, source)
+    fire_detected, model_text, model_input = await _run_detection(
+        image_bytes=image_bytes,
+        mime_type=mime_type,
+        detections=detections,
+        source=record_source,
+        priority=priority,
+    )
+    remark = "自动上传"
+    aggregate = aggregate and config.INCIDENT_AGGREGATION_ENABLED
+    monitor_record: MonitorRecordRead | None = None
+    incident: MonitorIncidentRead | None = None
+
+    try:
+        if aggregate and fire_detected:
+            incident = await incident_tracker.record_fire_frame(
+                source=record_source,
+                image_bytes=image_bytes,
+                mime_type=mime_type,
+                confidence=_max_confidence(detections),
+            )
+        if not aggregate or config.MONITOR_PER_FRAME_RECORDS:
+            monitor_record = await create_monitor_record(
+                db=db,
+                image_bytes=image_bytes,
+                mime_type=mime_type,
+                status=_record_status(fire_detected),
+                remark=remark,
+                source=record_source,
+            )
+    except Exception as exc:
+        raise HTTPException(
+            status_code=500,
+            detail=f"检测已完成但未能创建监控结果: {exc}",
+        ) from exc
+
+    return _build_detect_response(
+        fire_detected, model_text, monitor_record, model_input, detections, incident
+    )
+
+
+def _batch_line(payload: dict) -> str:
+    return json.dumps(payload, ensure_ascii=False) + "\n"
+
+
+def _batch_error_line(item: dict, error: str) -> str:
+    return _batch_line(
+        {"type": "error", "index": item["index"], "filename": item["filename"], "error": error}
+    )
+
+
+async def _stream_batch_detection(items: list[dict]) -> AsyncIterator[str]:
+    # Detections run concurrently, queued by detection_scheduler under each
+    # image's source (exempt from the per-source cap: SCRIPT_BATCH_MAX_FILES
+    # bounds them).
+    # Whatever has finished by the time the previous group was written is inserted as one
+    # bulk commit, then streamed back one NDJSON line per image.
+    finished: asyncio.Queue[dict] = asyncio.Queue()
+
+    async def detect(item: dict) -> None:
+        try:
+            fire_detected, model_text, model_input = await _run_detection(
+                image_bytes=item["image_bytes"],
+                mime_type=item["mime_type"],
+                detections=item["detections"],
+                source=item["source"],
+                reject_when_full=False,
+            )
+            item.update(fire_detected=fire_detected, model_text=model_text, model_input=model_input)
+        except HTTPException as exc:
+            item["error"] = str(exc.detail)
+        except Exception as exc:
+            item["error"] = str(exc)
+        await finished.put(item)
+
+    valid_items = [item for item in items if item.get("error") is None]
+    tasks = [asyncio.create_task(detect(item)) for item in valid_items]
+    counts = {"total": len(items), "succeeded": 0, "failed": 0, "fire_detected": 0}
+    session_factory = get_session_factory()
+
+    try:
+        for item in items:
+            if item.get("error") is not None:
+                counts["failed"] += 1
+                yield _batch_error_line(item, item["error"])
+
+        remaining = len(tasks)
+        while remaining:
+            group = [await finished.get()]
+            while not finished.empty():
+                group.append(finished.get_nowait())
+            remaining -= len(group)
+
+            detected = [item for item in group if item.get("error") is None]
+            for item in group:
+                if item.get("error") is not None:
+                    counts["failed"] += 1
+                    yield _batch_error_line(item, item["error"])
+            if not detected:
+                continue
+
+            try:
+                incidents: list[MonitorIncidentRead | None] = [None] * len(detected)
+                if config.INCIDENT_AGGREGATION_ENABLED:
+                    for position, item in enumerate(detected):
+                        if item["fire_detected"]:
+                            incidents[position] = await incident_tracker.record_fire_frame(
+                                source=item["source"],
+                                image_bytes=item["image_bytes"],
+                                mime_type=item["mime_type"],
+                                confidence=_max_confidence(item["detections"]),
+                            )
+                records: list[MonitorRecordRead | None] = [None] * len(detected)
+                if not config.INCIDENT_AGGREGATION_ENABLED or config.MONITOR_PER_FRAME_RECORDS:
+                    async with session_factory() as db:
+                        records = await create_monitor_records(
+                            db,
+                            [
+                                {
+                                    "image_bytes": item["image_bytes"],
+                                    "mime_type": item["mime_type"],
+                                    "status": _record_status(item["fire_detected"]),
+                                    "remark": "自动上传",
+                                    "source": item["source"],
+                                }
+                                for item in detected
+                            ],
+                        )
+            except Exception as exc:
+                for item in detected:
+                    counts["failed"] += 1
+                    yield _batch_error_line(item, f"检测已完成但未能创建监控结果: {exc}")
+                continue
+
+            result: DetectResponse | None = None
+            for item, record, incident in zip(detected, records, incidents):
+                result = _build_detect_response(
+                    item["fire_detected"],
+                    item["model_text"],
+                    record,
+                    item["model_input"],
+                    item["detections"],
+                    incident,
+                )
+                counts["succeeded"] += 1
+                counts["fire_detected"] += int(result.fire_detected)
+                yield _batch_line(
+                    {
+                        "type": "result",
+                        "index": item["index"],
+                        "filename": item["filename"],
+                        **result.model_dump(mode="json"),
+                    }
+                )
+
+            # Only the newest frame of each group is pushed to live viewers.
+            last_item = detected[-1]
+            if result is not None:
+                image_bytes, mime_type = last_item["image_bytes"], last_item["mime_type"]
+                latest_script_upload_store.save(
+                    image_bytes=image_bytes, mime_type=mime_type, result=result
+                )
+                await script_upload_socket_hub.broadcast_snapshot(
+                    image_bytes=image_bytes, mime_type=mime_type, result=result
+                )
+
+        yield _batch_line({"type": "summary", **counts})
+    finally:
+        # Client went away mid-stream: stop paying for detections nobody reads.
+        for task in tasks:
+            task.cancel()
+
+
 @router.websocket("/ws/script/latest-upload-image")
 async def latest_script_upload_image_ws(websocket: WebSocket) -> None:
     await script_upload_socket_hub.connect(websocket)
@@ -182,20 +417,27 @@ async def manual_detect_fire(
         mime_type=mime_type,
         source="manual_detect_fire",
         db=db,
+        priority=PRIORITY_MANUAL,
     )
 
 
 @router.post("/api/script/detect-fire", response_model=DetectResponse)
 async def script_detect_fire(
     file: UploadFile = File(...),
+    metadata: str | None = Form(None),
     db: AsyncSession = Depends(get_db),
 ) -> DetectResponse:
+    # metadata: optional detector JSON ({"boxes": [[x1, y1, x2, y2], ...], "confidences": [...]});
+    # with boxes only padded crops go to the model while the full frame is stored.
+    detections = _parse_metadata_field(metadata)
     image_bytes, mime_type = await _read_and_validate_image(file)
     result = await _detect_and_create_record(
         image_bytes=image_bytes,
         mime_type=mime_type,
         source="script_detect_fire",
         db=db,
+        detections=detections,
+        aggregate=True,
     )
 
     latest_script_upload_store.save(image_bytes=image_bytes, mime_type=mime_type, result=result)
@@ -205,6 +447,37 @@ async def script_detect_fire(
     return result
 
 
+@router.post("/api/script/detect-fire/batch")
+async def script_detect_fire_batch(
+    files: list[UploadFile] = File(...),
+    metadata: list[str] | None = Form(None),
+) -> StreamingResponse:
+    # metadata: optional, parallel to files; entry i is file i's detector JSON
+    # as for /api/script/detect-fire ("" for none). Its source_id, if any,
+    # replaces "script_detect_fire" as that image's source.
+    if len(files) > config.SCRIPT_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多上传 {config.SCRIPT_BATCH_MAX_FILES} 张图像",
+        )
+    metadata = metadata or []
+    if len(metadata) > len(files):
+        raise HTTPException(status_code=400, detail="metadata 的数量不能多于图像数量")
+
+    items: list[dict] = []
+    for index, file in enumerate(files):
+        item = {"index": index, "filename": file.filename or "", "error": None, "detections": None}
+        try:
+            item["detections"] = _parse_metadata_field(metadata[index] if index < len(metadata) else None)
+            item["image_bytes"], item["mime_type"] = await _read_and_validate_image(file)
+        except HTTPException as exc:
+            item["error"] = str(exc.detail)
+        item["source"] = _record_source(item["detections"], "script_detect_fire")
+        items.append(item)
+
+    return StreamingResponse(_stream_batch_detection(items), media_type="application/x-ndjson")
+
+
 @router.get("/api/health/script-uploader")
 async def script_uploader_health(request: Request) -> dict:
     manager = getattr(request.app.state, "script_uploader_manager", None)
@@ -212,3 +485,28 @@ async def script_uploader_health(request: Request) -> dict:
         return {"running": False, "pid": None, "detail": "script_uploader_manager not initialized"}
     status = manager.status()
     return {"running": status["running"], "pid": status["pid"]}
+
+
+@router.get("/api/health/detection-queue")
+async def detection_queue_health() -> dict:
+    return detection_scheduler.snapshot()
+
+
+@router.get("/api/health/image-recompression")
+async def image_recompression_health() -> dict:
+    return image_recompressor.snapshot()
+
+
+@router.get("/api/health/record-partitions")
+async def record_partitions_health() -> dict:
+    return record_partition_maintainer.snapshot()
+
+
+@router.get("/api/health/database")
+async def database_health() -> dict:
+    return pool_snapshot()
+
+
+@router.get("/api/health/qwen-endpoints")
+async def qwen_endpoints_health() -> dict:
+    return qwen_endpoint_pool.snapshot()
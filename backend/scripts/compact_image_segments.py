@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+_backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Maintain the monitor image segment store (IMAGE_SEGMENT_STORE_ENABLED). "
+            "The store has a single writer: stop the backend before --import-files "
+            "or --compact."
+        )
+    )
+    parser.add_argument(
+        "--env-file",
+        default=os.path.join(_backend_dir, ".env"),
+        help="Path to .env file (default: backend/.env).",
+    )
+    parser.add_argument(
+        "--import-files",
+        action="store_true",
+        help=(
+            "Move images stored as separate files in DATA_IMAGE_DIR into segments. "
+            "Names, scene_image_path values and URLs do not change."
+        ),
+    )
+    parser.add_argument("--compact", action="store_true", help="Compact sealed segments now.")
+    parser.add_argument(
+        "--garbage-ratio",
+        type=float,
+        help="Compact segments with at least this share of deleted bytes (default: IMAGE_SEGMENT_COMPACT_GARBAGE_RATIO).",
+    )
+    return parser.parse_args()
+
+
+def _import_files(store, data_image_dir) -> int:
+    imported = 0
+    for path in sorted(data_image_dir.iterdir()):
+        if not path.is_file():
+            continue
+        store.put(path.name, path.read_bytes())
+        # Only removed once its bytes are in a segment and indexed.
+        path.unlink()
+        imported += 1
+    return imported
+
+
+def main() -> None:
+    args = _parse_args()
+    load_dotenv(args.env_file)
+    sys.path.insert(0, _backend_dir)
+
+    from pathlib import Path
+
+    import config
+    from services.segment_store import segment_image_store
+
+    try:
+        if args.import_files:
+            data_image_dir = Path(_backend_dir) / config.DATA_IMAGE_DIR
+            print(f"Imported {_import_files(segment_image_store, data_image_dir)} image files")
+        if args.compact:
+            ratio = (
+                args.garbage_ratio
+                if args.garbage_ratio is not None
+                else config.IMAGE_SEGMENT_COMPACT_GARBAGE_RATIO
+            )
+            print(f"Compacted: {segment_image_store.compact(ratio)}")
+        print(json.dumps(segment_image_store.snapshot(), indent=2))
+    finally:
+        segment_image_store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+_backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Run EXPLAIN on the data monitor list queries and fail when one stops "
+            "using its index (full scan, wrong key or filesort). With "
+            "MONITOR_RECORDS_PARTITIONED, created_at ranges must also prune partitions."
+        )
+    )
+    parser.add_argument(
+        "--env-file",
+        default=os.path.join(_backend_dir, ".env"),
+        help="Path to .env file (default: backend/.env).",
+    )
+    parser.add_argument(
+        "--min-rows",
+        type=int,
+        default=10000,
+        help=(
+            "Below this many rows MySQL may rightly prefer a full scan, so only "
+            "possible_keys is checked (default: 10000)."
+        ),
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Insert this many synthetic records first. Only use against a scratch database.",
+    )
+    return parser.parse_args()
+
+
+# name -> (filters, sort_by, expected key, filesort allowed)
+_CASES = {
+    "default list": ({}, "created_at", "ix_monitor_records_created_at", False),
+    "status=fire": ({"status": "fire"}, "created_at", "ix_monitor_records_status_created_at", False),
+    "source": ({"source": "cam0"}, "created_at", "ix_monitor_records_source_created_at", False),
+    "created range": ({"created_from": -1}, "created_at", "ix_monitor_records_created_at", False),
+    "updated range": ({"updated_from": -1}, "updated_at", "ix_monitor_records_updated_at", False),
+    "status + created range": (
+        {"status": "fire", "created_from": -7},
+        "created_at",
+        "ix_monitor_records_status_created_at",
+        False,
+    ),
+    "remark search": ({"q": "火灾"}, "created_at", "ft_monitor_records_remark", True),
+    "sort by remark": ({}, "remark", "ix_monitor_records_remark", False),
+}
+
+
+def _build_filters(spec: dict, now: datetime):
+    from models.schemas import MonitorRecordFilters
+
+    values = dict(spec)
+    for key in ("created_from", "updated_from"):
+        if key in values:
+            values[key] = now + timedelta(days=values[key])
+    return MonitorRecordFilters(**values)
+
+
+async def _seed(conn, rows: int) -> None:
+    from models.data_monitor import MonitorRecord
+
+    statuses = ["发生火灾", "无火灾", "无火灾", "无火灾"]
+    sources = [f"cam{index}" for index in range(8)] + ["manual_detect_fire"]
+    remarks = ["自动上传", "自动上传", "", "仓库东侧疑似烟雾", "误报：灯光反射"]
+    now = datetime.utcnow()
+    batch: list[dict] = []
+    for index in range(rows):
+        created_at = now - timedelta(seconds=random.randint(0, 90 * 86400))
+        batch.append(
+            {
+                "scene_image_path": f"data_image/seed_{index}.jpg",
+                "status": random.choice(statuses),
+                "remark": random.choice(remarks),
+                "source": random.choice(sources),
+                "created_at": created_at,
+                "updated_at": created_at,
+            }
+        )
+        if len(batch) == 5000:
+            await conn.execute(MonitorRecord.__table__.insert(), batch)
+            batch = []
+    if batch:
+        await conn.execute(MonitorRecord.__table__.insert(), batch)
+
+
+async def _run(args: argparse.Namespace) -> int:
+    from sqlalchemy import func, select, text
+
+    import config
+    from database import get_engine, init_database
+    from models.data_monitor import MonitorRecord
+    from services.monitor_records import build_records_query
+    from sqlalchemy.ext.compiler import compiles
+    from sqlalchemy.sql.expression import ClauseElement, Executable
+
+    class Explain(Executable, ClauseElement):
+        inherit_cache = False
+
+        def __init__(self, statement) -> None:
+            self.statement = statement
+
+    @compiles(Explain)
+    def _compile_explain(element, compiler, **kw):
+        return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+    engine = get_engine()
+    if engine.dialect.name != "mysql":
+        print(f"EXPLAIN checks need MySQL; configured dialect is {engine.dialect.name}.")
+        return 2
+
+    await init_database()
+    async with engine.begin() as conn:
+        if args.seed > 0:
+            await _seed(conn, args.seed)
+            await conn.execute(text("ANALYZE TABLE monitor_records"))
+        total = int(await conn.scalar(select(func.count(MonitorRecord.id))) or 0)
+
+        partitions = 0
+        if config.MONITOR_RECORDS_PARTITIONED:
+            partitions = int(
+                await conn.scalar(
+                    text(
+                        "SELECT COUNT(*) FROM information_schema.PARTITIONS WHERE TABLE_SCHEMA = DATABASE() "
+                        "AND TABLE_NAME = 'monitor_records' AND PARTITION_NAME IS NOT NULL"
+                    )
+                )
+                or 0
+            )
+
+    strict = total >= args.min_rows
+    print(f"monitor_records: {total} rows ({'strict' if strict else 'possible_keys only'})")
+    now = datetime.utcnow()
+    failures = 0
+    async with engine.connect() as conn:
+        for name, (spec, sort_by, expected, filesort_ok) in _CASES.items():
+            if partitions and expected == "ft_monitor_records_remark":
+                # No FULLTEXT on partitioned tables; remark search is a LIKE scan.
+                print(f"  {name:<24} skipped (partitioned table)")
+                continue
+            stmt = build_records_query(
+                _build_filters(spec, now),
+                sort_by=sort_by,
+                sort_order="desc",
+                dialect_name="mysql",
+                limit=50,
+            )
+            plan = (await conn.execute(Explain(stmt))).mappings().first()
+            possible = set((plan["possible_keys"] or "").split(","))
+            extra = plan["Extra"] or ""
+            problems = []
+            if expected not in possible and plan["key"] != expected:
+                problems.append(f"{expected} not in possible_keys")
+            if strict:
+                if plan["type"] == "ALL":
+                    problems.append("full table scan")
+                if plan["key"] != expected:
+                    problems.append(f"uses {plan['key']}")
+                if "Using filesort" in extra and not filesort_ok:
+                    problems.append("filesort")
+            if partitions and "created_from" in spec:
+                used = [item for item in (plan["partitions"] or "").split(",") if item]
+                if len(used) >= partitions:
+                    problems.append("no partition pruning")
+            failures += bool(problems)
+            verdict = "ok" if not problems else "FAIL: " + "; ".join(problems)
+            print(
+                f"  {name:<24} type={plan['type']:<8} key={plan['key']} "
+                f"rows={plan['rows']} extra={extra!r} -> {verdict}"
+            )
+
+    await engine.dispose()
+    return 1 if failures else 0
+
+
+def main() -> None:
+    args = _parse_args()
+    load_dotenv(args.env_file)
+    sys.path.insert(0, _backend_dir)
+    raise SystemExit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+_backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Export monitor records straight from the database as CSV or NDJSON, "
+            "optionally zipped together with their images. Memory use does not "
+            "grow with the number of rows."
+        )
+    )
+    parser.add_argument(
+        "--env-file",
+        default=os.path.join(_backend_dir, ".env"),
+        help="Path to .env file (default: backend/.env).",
+    )
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv", help="Row format (default: csv).")
+    parser.add_argument(
+        "--images",
+        action="store_true",
+        help="Write a ZIP with records.<format>, images/<file> and summary.json.",
+    )
+    parser.add_argument("-o", "--output", help="Output file (default: monitor_records_<time>.<ext>; '-' for stdout).")
+    parser.add_argument("--status", choices=["fire", "normal"], help="Only records with this status.")
+    parser.add_argument("--source", help="Only records from this source (camera source_id or endpoint).")
+    parser.add_argument("--created-from", type=datetime.fromisoformat, help="created_at >= this (ISO 8601, UTC).")
+    parser.add_argument("--created-to", type=datetime.fromisoformat, help="created_at < this (ISO 8601, UTC).")
+    parser.add_argument("--updated-from", type=datetime.fromisoformat, help="updated_at >= this (ISO 8601, UTC).")
+    parser.add_argument("--updated-to", type=datetime.fromisoformat, help="updated_at < this (ISO 8601, UTC).")
+    parser.add_argument("-q", "--query", help="Remark text search.")
+    return parser.parse_args()
+
+
+async def _export(args: argparse.Namespace) -> None:
+    from database import dispose_engines
+    from models.schemas import MonitorRecordFilters
+    from services.record_export import export_filename, stream_records_export
+
+    filters = MonitorRecordFilters(
+        status=args.status,
+        source=args.source,
+        created_from=args.created_from,
+        created_to=args.created_to,
+        updated_from=args.updated_from,
+        updated_to=args.updated_to,
+        q=args.query,
+    )
+    output = args.output or export_filename(args.format, args.images)
+    written = 0
+    handle = sys.stdout.buffer if output == "-" else open(output, "wb")
+    try:
+        async for chunk in stream_records_export(filters, args.format, args.images):
+            handle.write(chunk)
+            written += len(chunk)
+    finally:
+        if handle is not sys.stdout.buffer:
+            handle.close()
+        await dispose_engines()
+
+    if output != "-":
+        print(f"Exported {written} bytes to {output}", file=sys.stderr)
+
+
+def main() -> None:
+    args = _parse_args()
+    load_dotenv(args.env_file)
+    sys.path.insert(0, _backend_dir)
+    asyncio.run(_export(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import pymysql
+from dotenv import load_dotenv
+
+from rebuild_monitor_records import build_db_config, is_partitioned, table_exists
+
+_backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+_TABLE = "monitor_records"
+# Applied versions, plus the copy position of the one in progress.
+_STATE_TABLE = "monitor_record_migrations"
+_TRIGGERS = {
+    "insert": f"{_TABLE}_migrate_ins",
+    "update": f"{_TABLE}_migrate_upd",
+    "delete": f"{_TABLE}_migrate_del",
+}
+
+_APPLY = "apply"
+_SATISFIED = "satisfied"
+_SKIP = "skip"
+
+
+def _column_exists(cursor, table_name: str, column: str) -> bool:
+    cursor.execute(f"SHOW COLUMNS FROM `{table_name}` LIKE %s", (column,))
+    return cursor.fetchone() is not None
+
+
+def _index_exists(cursor, table_name: str, index: str) -> bool:
+    cursor.execute(f"SHOW INDEX FROM `{table_name}` WHERE Key_name = %s", (index,))
+    return cursor.fetchone() is not None
+
+
+def _source_check(cursor) -> str:
+    return _SATISFIED if _column_exists(cursor, _TABLE, "source") else _APPLY
+
+
+def _source_alters(cursor) -> list[str]:
+    return [
+        "ADD COLUMN `source` VARCHAR(64) NOT NULL DEFAULT '' AFTER `remark`, "
+        "ADD KEY `ix_monitor_records_source_created_at` (`source`, `created_at`)"
+    ]
+
+
+def _image_tier_check(cursor) -> str:
+    return _SATISFIED if _column_exists(cursor, _TABLE, "image_tier") else _APPLY
+
+
+def _image_tier_alters(cursor) -> list[str]:
+    return [
+        "ADD COLUMN `image_tier` SMALLINT NOT NULL DEFAULT 0 AFTER `source`, "
+        "ADD KEY `ix_monitor_records_image_tier_created_at` (`image_tier`, `created_at`)"
+    ]
+
+
+def _partition_check(cursor) -> str:
+    if is_partitioned(cursor, _TABLE):
+        return _SATISFIED
+    # Opt-in: stays pending until MONITOR_RECORDS_PARTITIONED is set.
+    import config
+
+    return _APPLY if config.MONITOR_RECORDS_PARTITIONED else _SKIP
+
+
+def _partition_alters(cursor) -> list[str]:
+    from services.record_partitions import partition_by_clause
+
+    cursor.execute(f"SELECT MIN(`created_at`) FROM `{_TABLE}`")
+    oldest = cursor.fetchone()[0] or datetime.utcnow()
+    alters = []
+    # InnoDB has no FULLTEXT on partitioned tables.
+    if _index_exists(cursor, _TABLE, "ft_monitor_records_remark"):
+        alters.append("DROP INDEX `ft_monitor_records_remark`")
+    alters.append(
+        "DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `created_at`) "
+        + partition_by_clause(oldest.date(), datetime.utcnow())
+    )
+    return alters
+
+
+# version -> (name, check, alters). check() looks at the live table and says
+# whether the migration must run, is already reflected in the schema (recorded
+# without copying), or is opt-in and not wanted yet. alters() returns ALTER
+# TABLE bodies for the empty shadow table. Append new versions; never edit
+# one that may have run.
+_MIGRATIONS = {
+    1: ("source column", _source_check, _source_alters),
+    2: ("image_tier column", _image_tier_check, _image_tier_alters),
+    3: ("monthly partitions", _partition_check, _partition_alters),
+}
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Apply pending monitor_records migrations online: build the new schema in "
+            "a shadow table, copy rows in throttled batches while triggers mirror "
+            "concurrent writes, then swap the tables with one atomic RENAME. An "
+            "interrupted run resumes where it stopped."
+        )
+    )
+    parser.add_argument(
+        "--env-file",
+        default=os.path.join(_backend_dir, ".env"),
+        help="Path to .env file (default: backend/.env).",
+    )
+    parser.add_argument("--status", action="store_true", help="List migrations and exit.")
+    parser.add_argument("--target", type=int, help="Stop after this version (default: latest).")
+    parser.add_argument(
+        "--abort",
+        action="store_true",
+        help="Drop the triggers and shadow table of the migration in progress.",
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per copy batch (default: 1000).")
+    parser.add_argument(
+        "--sleep",
+        type=float,
+        default=0.05,
+        help="Pause between batches in seconds (default: 0.05).",
+    )
+    parser.add_argument(
+        "--max-threads-running",
+        type=int,
+        default=25,
+        help="Wait while the server's Threads_running is above this (default: 25; 0 disables).",
+    )
+    parser.add_argument(
+        "--drop-old",
+        action="store_true",
+        help="Drop the old table after the swap instead of keeping it as a backup.",
+    )
+    return parser.parse_args()
+
+
+def _ensure_state_table(cursor) -> None:
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS `{_STATE_TABLE}` (
+          `version` INT NOT NULL,
+          `name` VARCHAR(128) NOT NULL,
+          `status` VARCHAR(16) NOT NULL,
+          `shadow_table` VARCHAR(64) NOT NULL DEFAULT '',
+          `last_id` BIGINT NOT NULL DEFAULT 0,
+          `copied_rows` BIGINT NOT NULL DEFAULT 0,
+          `started_at` DATETIME NOT NULL,
+          `finished_at` DATETIME NULL,
+          PRIMARY KEY (`version`)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """
+    )
+
+
+def _load_state(cursor) -> dict[int, dict]:
+    cursor.execute(
+        f"SELECT `version`, `status`, `shadow_table`, `last_id`, `copied_rows`, `finished_at` FROM `{_STATE_TABLE}`"
+    )
+    return {
+        row[0]: {
+            "status": row[1],
+            "shadow_table": row[2],
+            "last_id": row[3],
+            "copied_rows": row[4],
+            "finished_at": row[5],
+        }
+        for row in cursor.fetchall()
+    }
+
+
+def _record_done(conn, version: int, status: str) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO `{_STATE_TABLE}` (`version`, `name`, `status`, `started_at`, `finished_at`)
+            VALUES (%s, %s, %s, UTC_TIMESTAMP(), UTC_TIMESTAMP())
+            ON DUPLICATE KEY UPDATE `status` = VALUES(`status`), `finished_at` = VALUES(`finished_at`)
+            """,
+            (version, _MIGRATIONS[version][0], status),
+        )
+    conn.commit()
+
+
+def _columns(cursor, table_name: str) -> list[str]:
+    cursor.execute(f"SHOW COLUMNS FROM `{table_name}`")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _triggers_present(cursor) -> bool:
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME IN %s",
+        (tuple(_TRIGGERS.values()),),
+    )
+    return cursor.fetchone()[0] == len(_TRIGGERS)
+
+
+def _drop_triggers(cursor) -> None:
+    for trigger in _TRIGGERS.values():
+        cursor.execute(f"DROP TRIGGER IF EXISTS `{trigger}`")
+
+
+def _create_triggers(cursor, shadow: str, columns: list[str]) -> None:
+    # Every write to the live table is replayed on the shadow. The batch copy
+    # uses INSERT IGNORE, so a row a trigger already wrote is never
+    # overwritten with the older copy.
+    column_sql = ", ".join(f"`{column}`" for column in columns)
+    new_values = ", ".join(f"NEW.`{column}`" for column in columns)
+    cursor.execute(
+        f"CREATE TRIGGER `{_TRIGGERS['insert']}` AFTER INSERT ON `{_TABLE}` FOR EACH ROW "
+        f"REPLACE INTO `{shadow}` ({column_sql}) VALUES ({new_values})"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER `{_TRIGGERS['update']}` AFTER UPDATE ON `{_TABLE}` FOR EACH ROW BEGIN "
+        f"DELETE FROM `{shadow}` WHERE `id` = OLD.`id`; "
+        f"REPLACE INTO `{shadow}` ({column_sql}) VALUES ({new_values}); END"
+    )
+    cursor.execute(
+        f"CREATE TRIGGER `{_TRIGGERS['delete']}` AFTER DELETE ON `{_TABLE}` FOR EACH ROW "
+        f"DELETE FROM `{shadow}` WHERE `id` = OLD.`id`"
+    )
+
+
+def _start(conn, version: int) -> dict:
+    name, _, alters = _MIGRATIONS[version]
+    shadow = f"_{_TABLE}_v{version}"
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS `{shadow}`")
+        cursor.execute(f"CREATE TABLE `{shadow}` LIKE `{_TABLE}`")
+        # Cheap on the empty shadow, whatever the change is.
+        for alter in alters(cursor):
+            cursor.execute(f"ALTER TABLE `{shadow}` {alter}")
+        columns = [column for column in _columns(cursor, _TABLE) if column in set(_columns(cursor, shadow))]
+        _create_triggers(cursor, shadow, columns)
+        cursor.execute(
+            f"""
+            REPLACE INTO `{_STATE_TABLE}` (`version`, `name`, `status`, `shadow_table`, `started_at`)
+            VALUES (%s, %s, 'copying', %s, UTC_TIMESTAMP())
+            """,
+            (version, name, shadow),
+        )
+    conn.commit()
+    return {"status": "copying", "shadow_table": shadow, "last_id": 0, "copied_rows": 0}
+
+
+def _wait_for_load(cursor, max_threads_running: int) -> None:
+    if max_threads_running <= 0:
+        return
+    while True:
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Threads_running'")
+        running = int(cursor.fetchone()[1])
+        if running <= max_threads_running:
+            return
+        print(f"  throttled: Threads_running={running} > {max_threads_running}", flush=True)
+        time.sleep(1.0)
+
+
+def _copy(conn, version: int, state: dict, args: argparse.Namespace) -> None:
+    shadow = state["shadow_table"]
+    with conn.cursor() as cursor:
+        columns = [column for column in _columns(cursor, _TABLE) if column in set(_columns(cursor, shadow))]
+        cursor.execute(f"SELECT MIN(`id`), MAX(`id`) FROM `{_TABLE}`")
+        min_id, max_id = cursor.fetchone()
+    conn.commit()
+    column_sql = ", ".join(f"`{column}`" for column in columns)
+    # Rows inserted after this point reach the shadow through the trigger.
+    max_id = max_id or 0
+    span = max(1, max_id - (min_id or 0))
+    last_id = state["last_id"]
+    copied = state["copied_rows"]
+    started = time.monotonic()
+    copied_at_start = copied
+    last_report = 0.0
+
+    while last_id < max_id:
+        with conn.cursor() as cursor:
+            _wait_for_load(cursor, args.max_threads_running)
+            cursor.execute(
+                f"SELECT `id` FROM `{_TABLE}` WHERE `id` > %s ORDER BY `id` LIMIT 1 OFFSET %s",
+                (last_id, max(0, args.chunk_size - 1)),
+            )
+            row = cursor.fetchone()
+            upper = min(row[0], max_id) if row else max_id
+            # The shared locks hold off a concurrent update of these rows
+            # until the batch commits; its trigger then writes the new version.
+            cursor.execute(
+                f"INSERT IGNORE INTO `{shadow}` ({column_sql}) "
+                f"SELECT {column_sql} FROM `{_TABLE}` FORCE INDEX (PRIMARY) "
+                f"WHERE `id` > %s AND `id` <= %s LOCK IN SHARE MODE",
+                (last_id, upper),
+            )
+            copied += cursor.rowcount
+            last_id = upper
+            cursor.execute(
+                f"UPDATE `{_STATE_TABLE}` SET `last_id` = %s, `copied_rows` = %s WHERE `version` = %s",
+                (last_id, copied, version),
+            )
+        conn.commit()
+
+        now = time.monotonic()
+        if now - last_report >= 5.0 or last_id >= max_id:
+            last_report = now
+            done = min(1.0, (last_id - (min_id or 0)) / span)
+            rate = (copied - copied_at_start) / max(now - started, 1e-6)
+            eta = (1 - done) * (now - started) / done if done > 0 else 0.0
+            print(
+                f"  v{version}: {done:6.1%} id {last_id}/{max_id}, {copied} rows, "
+                f"{rate:.0f} rows/s, ETA {eta:.0f}s",
+                flush=True,
+            )
+        if args.sleep > 0:
+            time.sleep(args.sleep)
+
+
+def _auto_increment(cursor, table_name: str) -> int | None:
+    # MySQL 8 caches information_schema statistics for a day by default; ask
+    # for the live counter. 5.7 has no such cache (or variable).
+    try:
+        cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+    except pymysql.MySQLError:
+        pass
+    cursor.execute(
+        "SELECT `AUTO_INCREMENT` FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table_name,),
+    )
+    row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def _swap(conn, version: int, state: dict, drop_old: bool) -> str | None:
+    shadow = state["shadow_table"]
+    old_table = f"{_TABLE}_backup_v{version}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    with conn.cursor() as cursor:
+        # CREATE TABLE LIKE starts the shadow's counter over, and copied rows
+        # only raise it to MAX(id) + 1: ids of rows deleted from the top would
+        # be handed out again. InnoDB never lowers it below MAX(id) + 1, and
+        # rows inserted before the RENAME reach the shadow with their ids.
+        next_id = _auto_increment(cursor, _TABLE)
+        if next_id is not None:
+            cursor.execute(f"ALTER TABLE `{shadow}` AUTO_INCREMENT = {next_id}")
+        # One statement: readers and writers see either table, never neither.
+        cursor.execute(f"RENAME TABLE `{_TABLE}` TO `{old_table}`, `{shadow}` TO `{_TABLE}`")
+        # The triggers moved with the old table, which nothing writes to now.
+        _drop_triggers(cursor)
+        if drop_old:
+            cursor.execute(f"DROP TABLE `{old_table}`")
+        cursor.execute(
+            f"UPDATE `{_STATE_TABLE}` SET `status` = 'applied', `shadow_table` = '', "
+            f"`finished_at` = UTC_TIMESTAMP() WHERE `version` = %s",
+            (version,),
+        )
+    conn.commit()
+    return None if drop_old else old_table
+
+
+def _run(conn, version: int, state: dict | None, args: argparse.Namespace) -> None:
+    name = _MIGRATIONS[version][0]
+    if state is not None and state["status"] == "copying":
+        with conn.cursor() as cursor:
+            resumable = table_exists(cursor, state["shadow_table"]) and _triggers_present(cursor)
+        if resumable:
+            print(f"v{version} {name}: resuming after id {state['last_id']}")
+        else:
+            # Writes made while a trigger was missing never reached the shadow.
+            print(f"v{version} {name}: shadow table or triggers missing, starting over")
+            state = None
+    if state is None or state["status"] != "copying":
+        print(f"v{version} {name}: creating shadow table and triggers")
+        state = _start(conn, version)
+
+    _copy(conn, version, state, args)
+    old_table = _swap(conn, version, state, args.drop_old)
+    print(f"v{version} {name}: applied" + (f"; old table kept as {old_table}" if old_table else ""))
+
+
+def _abort(conn, states: dict[int, dict]) -> None:
+    with conn.cursor() as cursor:
+        _drop_triggers(cursor)
+        for version, state in states.items():
+            if state["status"] == "copying":
+                cursor.execute(f"DROP TABLE IF EXISTS `{state['shadow_table']}`")
+                cursor.execute(f"DELETE FROM `{_STATE_TABLE}` WHERE `version` = %s", (version,))
+                print(f"v{version}: aborted")
+    conn.commit()
+
+
+def main() -> None:
+    args = _parse_args()
+    load_dotenv(args.env_file)
+    sys.path.insert(0, _backend_dir)
+
+    conn = pymysql.connect(**build_db_config())
+    try:
+        with conn.cursor() as cursor:
+            if not table_exists(cursor, _TABLE):
+                raise SystemExit(f"Table {_TABLE} does not exist; create it with rebuild_monitor_records.py.")
+            _ensure_state_table(cursor)
+            states = _load_state(cursor)
+        conn.commit()
+
+        if args.abort:
+            _abort(conn, states)
+            return
+
+        target = args.target if args.target is not None else max(_MIGRATIONS)
+        for version in sorted(_MIGRATIONS):
+            name, check, _ = _MIGRATIONS[version]
+            state = states.get(version)
+            if state is not None and state["status"] != "copying":
+                if args.status:
+                    print(f"v{version} {name}: {state['status']} at {state['finished_at']}")
+                continue
+            if state is None:
+                with conn.cursor() as cursor:
+                    decision = check(cursor)
+            else:
+                decision = _APPLY
+            if args.status:
+                progress = f" (copying, after id {state['last_id']})" if state is not None else ""
+                print(f"v{version} {name}: {'pending' if decision == _APPLY else decision}{progress}")
+                continue
+            if version > target:
+                break
+            if decision == _SATISFIED:
+                _record_done(conn, version, "satisfied")
+                print(f"v{version} {name}: already in the schema")
+            elif decision == _SKIP:
+                print(f"v{version} {name}: not enabled, skipped")
+            else:
+                _run(conn, version, state, args)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
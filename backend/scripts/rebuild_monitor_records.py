@@ -1,21 +1,49 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
+import json
 import os
+import sys
 from datetime import datetime
 from urllib.parse import unquote, urlparse
 
 import pymysql
 from dotenv import load_dotenv
 
+_backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Mirrors MonitorRecord.__table_args__ in models/data_monitor.py.
+_INDEXES = {
+    "ix_monitor_records_created_at": "KEY `ix_monitor_records_created_at` (`created_at`)",
+    "ix_monitor_records_updated_at": "KEY `ix_monitor_records_updated_at` (`updated_at`)",
+    "ix_monitor_records_status_created_at": (
+        "KEY `ix_monitor_records_status_created_at` (`status`, `created_at`)"
+    ),
+    "ix_monitor_records_source_created_at": (
+        "KEY `ix_monitor_records_source_created_at` (`source`, `created_at`)"
+    ),
+    "ix_monitor_records_image_tier_created_at": (
+        "KEY `ix_monitor_records_image_tier_created_at` (`image_tier`, `created_at`)"
+    ),
+    "ix_monitor_records_remark": "KEY `ix_monitor_records_remark` (`remark`)",
+    "ft_monitor_records_remark": "FULLTEXT KEY `ft_monitor_records_remark` (`remark`) WITH PARSER ngram",
+}
+# InnoDB does not support FULLTEXT indexes on partitioned tables.
+_PARTITIONED_SKIPPED_INDEXES = {"ft_monitor_records_remark"}
+
 
 def _parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
-        description="Backup old monitor_records table and rebuild with new schema."
+        description=(
+            "Backup old monitor_records table and rebuild with new schema. The rebuilt "
+            "table starts empty; use scripts/migrate_monitor_records.py to change the "
+            "schema of a live table while keeping its data."
+        )
     )
     parser.add_argument(
         "--env-file",
-        default=os.path.join(os.path.dirname(__file__), "..", ".env"),
+        default=os.path.join(_backend_dir, ".env"),
         help="Path to .env file (default: backend/.env).",
     )
     parser.add_argument(
@@ -23,10 +51,54 @@ def _parse_args() -> argparse.Namespace:
         default="monitor_records",
         help="Target table name (default: monitor_records).",
     )
-    return parser.parse_args()
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--upgrade-in-place",
+        action="store_true",
+        help="Keep the table and data; only add missing columns and indexes.",
+    )
+    mode.add_argument(
+        "--partition-in-place",
+        action="store_true",
+        help=(
+            "Keep the data and convert the table to monthly RANGE partitions on created_at. "
+            "Copies the whole table and blocks writes while it runs."
+        ),
+    )
+    mode.add_argument(
+        "--maintain-partitions",
+        action="store_true",
+        help=(
+            "Create partitions MONITOR_PARTITION_MONTHS_AHEAD months ahead and drop months older "
+            "than MONITOR_RECORD_RETENTION_DAYS, deleting their images. The backend also does "
+            "this daily when MONITOR_RECORDS_PARTITIONED is set."
+        ),
+    )
+    parser.add_argument(
+        "--backend-stopped",
+        action="store_true",
+        help=(
+            "Confirm the backend is not running. Required by --maintain-partitions with "
+            "IMAGE_SEGMENT_STORE_ENABLED: the segment store has a single writer."
+        ),
+    )
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        help="With a rebuild: create the new table with monthly RANGE partitions on created_at.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="With --maintain-partitions: only print what would be created and dropped.",
+    )
+    args = parser.parse_args()
+    if args.partitioned and (args.upgrade_in_place or args.partition_in_place or args.maintain_partitions):
+        parser.error("--partitioned only applies to a rebuild")
+    return args
 
 
-def _build_db_config() -> dict:
+def build_db_config() -> dict:
     mysql_url = (os.getenv("MYSQL_URL") or "").strip()
     if mysql_url:
         parsed = urlparse(mysql_url)
@@ -56,42 +128,160 @@ def _build_db_config() -> dict:
     }
 
 
-def _table_exists(cursor: pymysql.cursors.Cursor, table_name: str) -> bool:
+def table_exists(cursor: pymysql.cursors.Cursor, table_name: str) -> bool:
     cursor.execute("SHOW TABLES LIKE %s", (table_name,))
     return cursor.fetchone() is not None
 
 
-def _rebuild_table(cursor: pymysql.cursors.Cursor, table_name: str) -> str | None:
+def is_partitioned(cursor: pymysql.cursors.Cursor, table_name: str) -> bool:
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL",
+        (table_name,),
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def _partition_clause(first_month: datetime) -> str:
+    from services.record_partitions import partition_by_clause
+
+    return partition_by_clause(first_month.date(), datetime.utcnow())
+
+
+def _rebuild_table(cursor: pymysql.cursors.Cursor, table_name: str, partitioned: bool) -> str | None:
     backup_table = None
-    if _table_exists(cursor, table_name):
+    if table_exists(cursor, table_name):
         suffix = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_table = f"{table_name}_backup_{suffix}"
         cursor.execute(f"RENAME TABLE `{table_name}` TO `{backup_table}`")
 
+    # The partition key must be part of every unique key, so a partitioned
+    # table's primary key is (id, created_at).
+    primary_key = "`id`, `created_at`" if partitioned else "`id`"
+    index_sql = ",\n      ".join(
+        definition
+        for name, definition in _INDEXES.items()
+        if not (partitioned and name in _PARTITIONED_SKIPPED_INDEXES)
+    )
+    partition_sql = _partition_clause(datetime.utcnow()) if partitioned else ""
     create_sql = f"""
     CREATE TABLE `{table_name}` (
       `id` INT NOT NULL AUTO_INCREMENT,
       `scene_image_path` VARCHAR(255) NOT NULL,
       `status` VARCHAR(32) NOT NULL,
       `remark` VARCHAR(255) NOT NULL DEFAULT '',
+      `source` VARCHAR(64) NOT NULL DEFAULT '',
+      `image_tier` SMALLINT NOT NULL DEFAULT 0,
       `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
       `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-      PRIMARY KEY (`id`)
-    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+      PRIMARY KEY ({primary_key}),
+      {index_sql}
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    {partition_sql};
     """
     cursor.execute(create_sql)
     return backup_table
 
 
+def _upgrade_table(cursor: pymysql.cursors.Cursor, table_name: str) -> list[str]:
+    # The column and B-tree indexes use InnoDB online DDL. The first FULLTEXT
+    # index rebuilds the table and blocks writes while it runs, so upgrade a
+    # large table off-hours.
+    if not table_exists(cursor, table_name):
+        raise SystemExit(f"Table {table_name} does not exist; run without --upgrade-in-place.")
+
+    applied: list[str] = []
+    cursor.execute(f"SHOW COLUMNS FROM `{table_name}` LIKE 'source'")
+    if cursor.fetchone() is None:
+        cursor.execute(
+            f"ALTER TABLE `{table_name}` ADD COLUMN `source` VARCHAR(64) NOT NULL DEFAULT '' AFTER `remark`"
+        )
+        applied.append("column source")
+    cursor.execute(f"SHOW COLUMNS FROM `{table_name}` LIKE 'image_tier'")
+    if cursor.fetchone() is None:
+        cursor.execute(
+            f"ALTER TABLE `{table_name}` ADD COLUMN `image_tier` SMALLINT NOT NULL DEFAULT 0 AFTER `source`"
+        )
+        applied.append("column image_tier")
+
+    cursor.execute(f"SHOW INDEX FROM `{table_name}`")
+    existing = {row[2] for row in cursor.fetchall()}
+    skipped = _PARTITIONED_SKIPPED_INDEXES if is_partitioned(cursor, table_name) else set()
+    for name, definition in _INDEXES.items():
+        if name not in existing and name not in skipped:
+            cursor.execute(f"ALTER TABLE `{table_name}` ADD {definition}")
+            applied.append(f"index {name}")
+    return applied
+
+
+def _partition_table(cursor: pymysql.cursors.Cursor, table_name: str) -> str:
+    # One table copy: ALTER TABLE ... PARTITION BY rebuilds the table and
+    # blocks writes until it finishes, so run it off-hours.
+    if not table_exists(cursor, table_name):
+        raise SystemExit(f"Table {table_name} does not exist; run with --partitioned instead.")
+    if is_partitioned(cursor, table_name):
+        raise SystemExit(f"Table {table_name} is already partitioned.")
+
+    cursor.execute(f"SELECT MIN(`created_at`) FROM `{table_name}`")
+    oldest = cursor.fetchone()[0] or datetime.utcnow()
+    cursor.execute(f"SHOW INDEX FROM `{table_name}`")
+    existing = {row[2] for row in cursor.fetchall()}
+    for name in _PARTITIONED_SKIPPED_INDEXES & existing:
+        cursor.execute(f"ALTER TABLE `{table_name}` DROP INDEX `{name}`")
+    partition_sql = _partition_clause(oldest)
+    cursor.execute(
+        f"ALTER TABLE `{table_name}` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `created_at`) {partition_sql}"
+    )
+    return partition_sql
+
+
+def _maintain_partitions(dry_run: bool) -> dict:
+    from database import get_engine
+    from services.record_partitions import record_partition_maintainer
+
+    async def run() -> dict:
+        try:
+            return await record_partition_maintainer.run(dry_run=dry_run)
+        finally:
+            await get_engine().dispose()
+
+    return asyncio.run(run())
+
+
 def main() -> None:
     args = _parse_args()
     load_dotenv(args.env_file)
-    db_config = _build_db_config()
+    # Partition helpers are shared with the backend's own maintenance task.
+    sys.path.insert(0, _backend_dir)
+
+    if args.maintain_partitions:
+        if args.table_name != "monitor_records":
+            raise SystemExit("--maintain-partitions only works on monitor_records.")
+        import config
+
+        # Deleting images from here while the backend holds the segment index
+        # in memory would be undone by its next compaction.
+        if config.IMAGE_SEGMENT_STORE_ENABLED and not args.dry_run and not args.backend_stopped:
+            raise SystemExit(
+                "IMAGE_SEGMENT_STORE_ENABLED is set and the segment store has a single writer. "
+                "Let the backend run the maintenance (MONITOR_RECORDS_PARTITIONED=true), or stop "
+                "it and pass --backend-stopped."
+            )
+        stats = _maintain_partitions(args.dry_run)
+        print(json.dumps(stats, indent=2, default=str))
+        return
+
+    db_config = build_db_config()
 
     conn = pymysql.connect(**db_config)
     try:
         with conn.cursor() as cursor:
-            backup_table = _rebuild_table(cursor, args.table_name)
+            if args.upgrade_in_place:
+                applied = _upgrade_table(cursor, args.table_name)
+            elif args.partition_in_place:
+                partition_sql = _partition_table(cursor, args.table_name)
+            else:
+                backup_table = _rebuild_table(cursor, args.table_name, args.partitioned)
         conn.commit()
     except Exception:
         conn.rollback()
@@ -99,7 +289,11 @@ def main() -> None:
     finally:
         conn.close()
 
-    if backup_table:
+    if args.partition_in_place:
+        print(f"Partitioning done:\n{partition_sql}")
+    elif args.upgrade_in_place:
+        print(f"Upgrade done. Added: {', '.join(applied)}" if applied else "Upgrade done. Nothing to add.")
+    elif backup_table:
         print(f"Rebuild done. Old table backed up as: {backup_table}")
     else:
         print("Rebuild done. No old table found; new table created directly.")
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+_backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Run one pass of the tiered image recompression (IMAGE_RECOMPRESS_TIERS) "
+            "and report the disk space reclaimed. Safe to run next to the backend, "
+            "except with IMAGE_SEGMENT_STORE_ENABLED (single writer): stop it first "
+            "and pass --backend-stopped."
+        )
+    )
+    parser.add_argument(
+        "--env-file",
+        default=os.path.join(_backend_dir, ".env"),
+        help="Path to .env file (default: backend/.env).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Re-encode in memory and report what would be reclaimed without changing anything.",
+    )
+    parser.add_argument(
+        "--backend-stopped",
+        action="store_true",
+        help="Confirm the backend is not running. Required with IMAGE_SEGMENT_STORE_ENABLED.",
+    )
+    return parser.parse_args()
+
+
+async def _run(args: argparse.Namespace) -> None:
+    from database import get_engine
+    from services.image_recompression import image_recompressor
+
+    try:
+        stats = await image_recompressor.run_pass(dry_run=args.dry_run)
+    finally:
+        await image_recompressor.stop()
+        await get_engine().dispose()
+
+    print(json.dumps(stats, indent=2))
+    print(f"Reclaimed {stats['reclaimed_bytes'] / 1024 / 1024:.1f} MiB", file=sys.stderr)
+
+
+def main() -> None:
+    args = _parse_args()
+    load_dotenv(args.env_file)
+    sys.path.insert(0, _backend_dir)
+    import config
+
+    # Even a dry run opens the segment index, which may only have one owner.
+    if config.IMAGE_SEGMENT_STORE_ENABLED and not args.backend_stopped:
+        raise SystemExit(
+            "IMAGE_SEGMENT_STORE_ENABLED is set and the segment store has a single writer. "
+            "Use the backend's IMAGE_RECOMPRESS_ENABLED task, or stop it and pass --backend-stopped."
+        )
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import config
+
+
+PRIORITY_MANUAL = 0
+PRIORITY_BACKGROUND = 1
+_PRIORITY_NAMES = {PRIORITY_MANUAL: "manual", PRIORITY_BACKGROUND: "background"}
+
+_RATE_WINDOW_SECONDS = 60.0
+_WAIT_EWMA_ALPHA = 0.3
+# Sources come from clients; keys are cut to the monitor record column size.
+_MAX_SOURCE_LENGTH = 64
+
+
+class DetectionQueueFull(RuntimeError):
+    def __init__(self, source: str, retry_after: float) -> None:
+        super().__init__(f"Detection queue for {source} is full")
+        self.source = source
+        self.retry_after = retry_after
+
+
+class _SourceStats:
+    def __init__(self, source: str, weight: float) -> None:
+        self.source = source
+        self.weight = weight
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_ewma: float | None = None
+        # Monotonic times of recent arrivals/completions, trimmed to the window.
+        self.arrivals: deque[float] = deque()
+        self.completions: deque[float] = deque()
+        # Start-time fair queuing: finish tag of this source's last request.
+        self.last_finish = 0.0
+
+    @staticmethod
+    def _rate(events: deque[float], now: float) -> float:
+        while events and now - events[0] > _RATE_WINDOW_SECONDS:
+            events.popleft()
+        return round(len(events) / _RATE_WINDOW_SECONDS, 3)
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "source": self.source,
+            "weight": self.weight,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "arrival_rate_per_s": self._rate(self.arrivals, now),
+            "completion_rate_per_s": self._rate(self.completions, now),
+            "wait_ewma_ms": round(self.wait_ewma * 1000, 1) if self.wait_ewma is not None else None,
+        }
+
+
+class DetectionScheduler:
+    # Admission to the vision model in place of a plain semaphore. Manual
+    # requests always go ahead of queued background (uploader) work. Within a
+    # class, sources share the slots by weight using start-time fair queuing,
+    # so one chatty camera only delays its own frames.
+    def __init__(self, concurrency: int, *, weights: dict[str, float], max_queue_per_source: int) -> None:
+        self._capacity = max(1, concurrency)
+        self._weights = weights
+        self._max_queue = max_queue_per_source
+        self._running = 0
+        self._sequence = itertools.count()
+        # priority -> heap of (start tag, sequence, source stats, future)
+        self._queues: dict[int, list] = {PRIORITY_MANUAL: [], PRIORITY_BACKGROUND: []}
+        self._virtual_time: dict[int, float] = {PRIORITY_MANUAL: 0.0, PRIORITY_BACKGROUND: 0.0}
+        self._stats: dict[tuple[int, str], _SourceStats] = {}
+
+    def _stats_for(self, priority: int, source: str) -> _SourceStats:
+        stats = self._stats.get((priority, source))
+        if stats is None:
+            weight = max(0.01, float(self._weights.get(source, 1.0)))
+            stats = self._stats[(priority, source)] = _SourceStats(source, weight)
+        return stats
+
+    def _forget_idle(self, priority: int) -> None:
+        # Drop sources with nothing queued or running once their finish tag no
+        # longer holds them back: it is not ahead of the class's virtual time,
+        # or nothing of the class is waiting. A later frame then starts from
+        # the virtual time just as it would have; only the counters are lost,
+        # so snapshot() lists recent sources instead of every id ever seen.
+        waiting = bool(self._queues[priority])
+        for key, stats in list(self._stats.items()):
+            if key[0] != priority or stats.queued or stats.running:
+                continue
+            if waiting and stats.last_finish > self._virtual_time[priority]:
+                continue
+            del self._stats[key]
+
+    @asynccontextmanager
+    async def slot(
+        self, source: str, priority: int = PRIORITY_BACKGROUND, *, reject_when_full: bool = True
+    ) -> AsyncIterator[None]:
+        # Raises DetectionQueueFull when a background source already has
+        # max_queue_per_source frames waiting (unless reject_when_full=False).
+        stats = self._stats_for(priority, (source or "unknown")[:_MAX_SOURCE_LENGTH])
+        now = time.monotonic()
+        stats.arrivals.append(now)
+        try:
+            await self._acquire(stats, priority, reject_when_full)
+        except BaseException:
+            self._forget_idle(priority)
+            raise
+        stats.running += 1
+        waited = time.monotonic() - now
+        stats.wait_ewma = (
+            waited
+            if stats.wait_ewma is None
+            else _WAIT_EWMA_ALPHA * waited + (1 - _WAIT_EWMA_ALPHA) * stats.wait_ewma
+        )
+        try:
+            yield
+        finally:
+            stats.running -= 1
+            stats.completed += 1
+            stats.completions.append(time.monotonic())
+            self._running -= 1
+            self._dispatch()
+            self._forget_idle(priority)
+
+    async def _acquire(self, stats: _SourceStats, priority: int, reject_when_full: bool) -> None:
+        if self._running < self._capacity and not any(self._queues.values()):
+            self._running += 1
+            return
+
+        if (
+            reject_when_full
+            and priority == PRIORITY_BACKGROUND
+            and 0 < self._max_queue <= stats.queued
+        ):
+            stats.rejected += 1
+            # Roughly how long this source's backlog takes to drain.
+            rate = _SourceStats._rate(stats.completions, time.monotonic())
+            raise DetectionQueueFull(stats.source, stats.queued / rate if rate > 0 else 1.0)
+
+        start = max(self._virtual_time[priority], stats.last_finish)
+        stats.last_finish = start + 1.0 / stats.weight
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queues[priority], (start, next(self._sequence), stats, future))
+        stats.queued += 1
+        # Entries left behind by cancelled waiters can hide a free slot.
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted the slot just as the caller went away: pass it on.
+                self._running -= 1
+                self._dispatch()
+            raise
+        finally:
+            stats.queued -= 1
+
+    def _dispatch(self) -> None:
+        while self._running < self._capacity:
+            entry = self._pop_next()
+            if entry is None:
+                return
+            self._running += 1
+            entry[3].set_result(None)
+
+    def _pop_next(self) -> tuple | None:
+        for priority in (PRIORITY_MANUAL, PRIORITY_BACKGROUND):
+            queue = self._queues[priority]
+            while queue:
+                entry = heapq.heappop(queue)
+                if entry[3].done():
+                    continue
+                self._virtual_time[priority] = entry[0]
+                return entry
+        return None
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        sources = [
+            {"priority": _PRIORITY_NAMES[priority], **stats.snapshot(now)}
+            for (priority, _), stats in sorted(self._stats.items(), key=lambda item: (item[0][0], item[0][1]))
+        ]
+        return {
+            "capacity": self._capacity,
+            "running": self._running,
+            "queued": sum(item["queued"] for item in sources),
+            "max_queue_per_source": self._max_queue,
+            "sources": sources,
+        }
+
+
+detection_scheduler = DetectionScheduler(
+    config.DETECTION_MAX_CONCURRENCY,
+    weights=config.DETECTION_SOURCE_WEIGHTS,
+    max_queue_per_source=config.DETECTION_MAX_QUEUE_PER_SOURCE,
+)
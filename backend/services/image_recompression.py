@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from PIL import Image, ImageOps
+from sqlalchemy import select, update
+
+import config
+from database import get_session_factory
+from models.data_monitor import MonitorRecord
+from services.monitor_records import (
+    CHANGE_UPSERT,
+    ensure_database_initialized,
+    log_record_changes,
+    publish_record_changes,
+    read_stored_image,
+    save_image_to_data_image,
+    schedule_image_deletion,
+    to_read_model,
+)
+
+
+_FIRE_STATUS = "发生火灾"
+
+
+def _lower_priority(nice: int) -> None:
+    # Pool initializer: recompression only gets CPU the detector leaves idle.
+    if hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def reencode_image(data: bytes, fmt: str, quality: int, max_side: int) -> tuple[bytes, str] | None:
+    # Runs in a pool process. None when the result would not be smaller.
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source).convert("RGB")
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    output = io.BytesIO()
+    if fmt == "webp":
+        image.save(output, "WEBP", quality=quality, method=4)
+        mime_type = "image/webp"
+    else:
+        image.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+        mime_type = "image/jpeg"
+    encoded = output.getvalue()
+    return (encoded, mime_type) if len(encoded) < len(data) else None
+
+
+def _empty_stats() -> dict:
+    return {
+        "examined": 0,
+        "recompressed": 0,
+        "unchanged": 0,
+        "missing": 0,
+        "conflicts": 0,
+        "failed": 0,
+        "bytes_before": 0,
+        "bytes_after": 0,
+        "reclaimed_bytes": 0,
+    }
+
+
+class ImageRecompressor:
+    # Moves aging monitor images down the IMAGE_RECOMPRESS_TIERS ladder. Images
+    # are immutable by name, so a recompressed image gets a new file name and
+    # the record is switched to it with a compare-and-swap UPDATE; a record
+    # edited meanwhile keeps its new image and the re-encoded copy is dropped.
+    def __init__(self) -> None:
+        self._pool: ProcessPoolExecutor | None = None
+        self._task: asyncio.Task | None = None
+        self._running = False
+        self.last_run: dict | None = None
+        self.totals = _empty_stats()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that runs an event loop and DB pools is unsafe.
+            self._pool = ProcessPoolExecutor(
+                max_workers=max(1, config.IMAGE_RECOMPRESS_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority,
+                initargs=(config.IMAGE_RECOMPRESS_NICE,),
+            )
+        return self._pool
+
+    def start(self) -> None:
+        if config.IMAGE_RECOMPRESS_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, config.IMAGE_RECOMPRESS_INTERVAL_SECONDS))
+            try:
+                stats = await self.run_pass()
+                if stats["examined"]:
+                    print(f"Image recompression: {stats}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"Image recompression failed: {exc}")
+
+    async def run_pass(self, *, dry_run: bool = False) -> dict:
+        # One sweep over every tier, highest first. dry_run encodes and counts
+        # what would be reclaimed without writing anything.
+        if self._running:
+            raise RuntimeError("Image recompression is already running")
+        self._running = True
+        started = time.perf_counter()
+        stats = _empty_stats()
+        now = datetime.utcnow()
+        # Tiers are sorted by age. Records older than a higher tier's cutoff
+        # belong to that tier, so a lower tier only takes the window up to it
+        # (a dry run writes no image_tier that would filter them out).
+        older_cutoff: datetime | None = None
+        try:
+            await ensure_database_initialized()
+            tiers = list(enumerate(config.IMAGE_RECOMPRESS_TIERS, start=1))
+            for tier_number, tier in reversed(tiers):
+                cutoff = now - timedelta(days=tier["after_days"])
+                await self._run_tier(tier_number, tier, cutoff, older_cutoff, stats, dry_run)
+                older_cutoff = cutoff
+        finally:
+            self._running = False
+
+        stats["reclaimed_bytes"] = stats["bytes_before"] - stats["bytes_after"]
+        stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        stats["dry_run"] = dry_run
+        if not dry_run:
+            for key in self.totals:
+                self.totals[key] += stats[key]
+        self.last_run = {"finished_at": datetime.utcnow().isoformat(), **stats}
+        return stats
+
+    async def _run_tier(
+        self,
+        tier_number: int,
+        tier: dict,
+        cutoff: datetime,
+        older_cutoff: datetime | None,
+        stats: dict,
+        dry_run: bool,
+    ) -> None:
+        batch_size = max(1, config.IMAGE_RECOMPRESS_BATCH_SIZE)
+        last_id = 0
+        while True:
+            stmt = (
+                select(MonitorRecord.id, MonitorRecord.scene_image_path)
+                .where(
+                    MonitorRecord.image_tier < tier_number,
+                    MonitorRecord.created_at < cutoff,
+                    MonitorRecord.id > last_id,
+                )
+                .order_by(MonitorRecord.id)
+                .limit(batch_size)
+            )
+            if older_cutoff is not None:
+                stmt = stmt.where(MonitorRecord.created_at >= older_cutoff)
+            if config.IMAGE_RECOMPRESS_KEEP_FIRE_ORIGINALS:
+                stmt = stmt.where(MonitorRecord.status != _FIRE_STATUS)
+            async with get_session_factory()() as db:
+                rows = list((await db.execute(stmt)).all())
+            if not rows:
+                return
+            last_id = rows[-1].id
+            # The pool size bounds CPU; the batch bounds memory.
+            await asyncio.gather(
+                *(
+                    self._recompress_one(row.id, row.scene_image_path, tier_number, tier, stats, dry_run)
+                    for row in rows
+                )
+            )
+
+    async def _recompress_one(
+        self, record_id: int, old_path: str, tier_number: int, tier: dict, stats: dict, dry_run: bool
+    ) -> None:
+        stats["examined"] += 1
+        data = await asyncio.to_thread(read_stored_image, old_path)
+        if data is None:
+            stats["missing"] += 1
+            if not dry_run:
+                await self._swap(record_id, old_path, old_path, tier_number)
+            return
+
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._get_pool(),
+                reencode_image,
+                data,
+                config.IMAGE_RECOMPRESS_FORMAT,
+                tier["quality"],
+                tier["max_side"],
+            )
+        except Exception:
+            stats["failed"] += 1
+            return
+
+        if result is None:
+            stats["unchanged"] += 1
+            if not dry_run:
+                await self._swap(record_id, old_path, old_path, tier_number)
+            return
+
+        encoded, mime_type = result
+        if dry_run:
+            stats["recompressed"] += 1
+            stats["bytes_before"] += len(data)
+            stats["bytes_after"] += len(encoded)
+            return
+
+        new_path = await asyncio.to_thread(save_image_to_data_image, encoded, mime_type)
+        try:
+            swapped = await self._swap(record_id, old_path, new_path, tier_number)
+        except Exception:
+            schedule_image_deletion([new_path])
+            stats["failed"] += 1
+            return
+        if not swapped:
+            schedule_image_deletion([new_path])
+            stats["conflicts"] += 1
+            return
+        schedule_image_deletion([old_path])
+        stats["recompressed"] += 1
+        stats["bytes_before"] += len(data)
+        stats["bytes_after"] += len(encoded)
+
+    async def _swap(self, record_id: int, old_path: str, new_path: str, tier_number: int) -> bool:
+        async with get_session_factory()() as db:
+            result = await db.execute(
+                update(MonitorRecord)
+                .where(MonitorRecord.id == record_id, MonitorRecord.scene_image_path == old_path)
+                # Not a user edit: keep updated_at.
+                .values(
+                    scene_image_path=new_path,
+                    image_tier=tier_number,
+                    updated_at=MonitorRecord.updated_at,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                await db.rollback()
+                return False
+            changes = []
+            if new_path != old_path:
+                changes = log_record_changes(db, [record_id], CHANGE_UPSERT)
+            await db.commit()
+            if changes:
+                record = await db.get(MonitorRecord, record_id)
+                await publish_record_changes(changes, [to_read_model(record) if record else None])
+            return True
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": config.IMAGE_RECOMPRESS_ENABLED,
+            "running": self._running,
+            "format": config.IMAGE_RECOMPRESS_FORMAT,
+            "tiers": config.IMAGE_RECOMPRESS_TIERS,
+            "keep_fire_originals": config.IMAGE_RECOMPRESS_KEEP_FIRE_ORIGINALS,
+            "last_run": self.last_run,
+            "totals": self.totals,
+        }
+
+
+image_recompressor = ImageRecompressor()
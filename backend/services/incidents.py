@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import weakref
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config
+from database import get_session_factory
+from models.data_monitor import MonitorIncident
+from models.schemas import MonitorIncidentRead
+from services.monitor_records import (
+    build_image_url,
+    ensure_database_initialized,
+    save_image_to_data_image,
+    schedule_image_deletion,
+)
+from services.record_changes import incident_change_hub
+
+
+INCIDENT_OPEN = "open"
+INCIDENT_CLOSED = "closed"
+
+
+def _frame(kind: str, image_path: str, seen_at: datetime, confidence: float | None) -> dict:
+    return {"kind": kind, "image_path": image_path, "seen_at": seen_at.isoformat(), "confidence": confidence}
+
+
+def _read_model(
+    incident_id: int,
+    source: str,
+    status: str,
+    first_seen_at: datetime,
+    last_seen_at: datetime,
+    frame_count: int,
+    max_confidence: float | None,
+    frames: list[dict],
+) -> MonitorIncidentRead:
+    return MonitorIncidentRead(
+        id=incident_id,
+        source=source,
+        status=status,
+        first_seen_at=first_seen_at,
+        last_seen_at=last_seen_at,
+        frame_count=frame_count,
+        max_confidence=max_confidence,
+        frames=[{**frame, "image_url": build_image_url(frame["image_path"])} for frame in frames],
+    )
+
+
+def to_incident_read(incident: MonitorIncident) -> MonitorIncidentRead:
+    return _read_model(
+        incident.id,
+        incident.source,
+        incident.status,
+        incident.first_seen_at,
+        incident.last_seen_at,
+        incident.frame_count,
+        incident.max_confidence,
+        list(incident.frames or []),
+    )
+
+
+class _OpenIncident:
+    # In-memory state of an open incident. The row lags it by at most
+    # INCIDENT_FLUSH_SECONDS; frame changes are written immediately.
+    def __init__(self, row: MonitorIncident) -> None:
+        self.id = row.id
+        self.source = row.source
+        self.first_seen_at = row.first_seen_at
+        self.last_seen_at = row.last_seen_at
+        self.frame_count = row.frame_count
+        self.max_confidence = row.max_confidence
+        self.frames: list[dict] = list(row.frames or [])
+        self.dirty = False
+        self.flushed_at = time.monotonic()
+
+    def read_model(self, status: str = INCIDENT_OPEN) -> MonitorIncidentRead:
+        return _read_model(
+            self.id,
+            self.source,
+            status,
+            self.first_seen_at,
+            self.last_seen_at,
+            self.frame_count,
+            self.max_confidence,
+            self.frames,
+        )
+
+    def values(self) -> dict:
+        return {
+            "last_seen_at": self.last_seen_at,
+            "frame_count": self.frame_count,
+            "max_confidence": self.max_confidence,
+            # A new list, so the JSON column is always rewritten.
+            "frames": list(self.frames),
+        }
+
+
+class IncidentTracker:
+    # Collapses consecutive fire frames per source into one incident. Each
+    # positive frame bumps the counters in memory; the row is written and
+    # broadcast when the incident opens, when its representative frames change,
+    # at most every INCIDENT_FLUSH_SECONDS for counter-only updates, and when it
+    # closes after INCIDENT_GAP_SECONDS without a fire frame.
+    def __init__(self) -> None:
+        self._open: dict[str, _OpenIncident] = {}
+        # Sources come from clients: a source's lock lives only while some
+        # coroutine holds or awaits it, not for every source ever seen.
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+        self._sweeper: asyncio.Task | None = None
+
+    def _lock_for(self, source: str) -> asyncio.Lock:
+        lock = self._locks.get(source)
+        if lock is None:
+            lock = self._locks[source] = asyncio.Lock()
+        return lock
+
+    def start(self) -> None:
+        if config.INCIDENT_AGGREGATION_ENABLED and self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self) -> None:
+        if self._sweeper is None:
+            return
+        self._sweeper.cancel()
+        try:
+            await self._sweeper
+        except asyncio.CancelledError:
+            pass
+        self._sweeper = None
+        # Leave incidents open: after a quick restart the next frame resumes them.
+        for source in list(self._open):
+            async with self._lock_for(source):
+                state = self._open.get(source)
+                if state is not None and state.dirty:
+                    async with get_session_factory()() as db:
+                        await self._flush(db, state)
+
+    async def record_fire_frame(
+        self,
+        *,
+        source: str,
+        image_bytes: bytes,
+        mime_type: str,
+        confidence: float | None = None,
+        seen_at: datetime | None = None,
+    ) -> MonitorIncidentRead:
+        await ensure_database_initialized()
+        seen_at = seen_at or datetime.utcnow()
+        source = source[:64]
+
+        async with self._lock_for(source):
+            async with get_session_factory()() as db:
+                state = self._open.get(source)
+                if state is None:
+                    state = await self._load_open(db, source)
+                if state is not None and (seen_at - state.last_seen_at).total_seconds() > config.INCIDENT_GAP_SECONDS:
+                    await self._close(db, state)
+                    state = None
+
+                if state is None:
+                    state = await self._create(db, source, image_bytes, mime_type, confidence, seen_at)
+                else:
+                    await self._attach(db, state, image_bytes, mime_type, confidence, seen_at)
+                return state.read_model()
+
+    async def _load_open(self, db: AsyncSession, source: str) -> _OpenIncident | None:
+        # An incident left open by a previous process.
+        result = await db.execute(
+            select(MonitorIncident)
+            .where(MonitorIncident.source == source, MonitorIncident.status == INCIDENT_OPEN)
+            .order_by(MonitorIncident.last_seen_at.desc())
+            .limit(1)
+        )
+        row = result.scalars().first()
+        if row is None:
+            return None
+        state = _OpenIncident(row)
+        self._open[source] = state
+        return state
+
+    async def _create(
+        self,
+        db: AsyncSession,
+        source: str,
+        image_bytes: bytes,
+        mime_type: str,
+        confidence: float | None,
+        seen_at: datetime,
+    ) -> _OpenIncident:
+        image_path = await asyncio.to_thread(save_image_to_data_image, image_bytes, mime_type)
+        row = MonitorIncident(
+            source=source,
+            status=INCIDENT_OPEN,
+            first_seen_at=seen_at,
+            last_seen_at=seen_at,
+            frame_count=1,
+            max_confidence=confidence,
+            frames=[_frame("first", image_path, seen_at, confidence)],
+        )
+        db.add(row)
+        try:
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            schedule_image_deletion([image_path])
+            raise
+        state = _OpenIncident(row)
+        self._open[source] = state
+        await self._publish(state.read_model())
+        return state
+
+    def _plan_frame(self, state: _OpenIncident, confidence: float | None, seen_at: datetime) -> str | None:
+        # Which slot this frame takes, if any: "peak" when it beats the best
+        # confidence so far, else "latest" when the newest sample is older than
+        # INCIDENT_FRAME_INTERVAL_SECONDS. Bounded by INCIDENT_MAX_FRAMES.
+        max_frames = max(1, config.INCIDENT_MAX_FRAMES)
+        if max_frames >= 2 and confidence is not None and (
+            state.max_confidence is None or confidence > state.max_confidence
+        ):
+            return "peak"
+        has_peak = any(frame["kind"] == "peak" for frame in state.frames)
+        if max_frames - 1 - int(has_peak) <= 0:
+            return None
+        newest = max(datetime.fromisoformat(frame["seen_at"]) for frame in state.frames)
+        if (seen_at - newest).total_seconds() >= config.INCIDENT_FRAME_INTERVAL_SECONDS:
+            return "latest"
+        return None
+
+    async def _attach(
+        self,
+        db: AsyncSession,
+        state: _OpenIncident,
+        image_bytes: bytes,
+        mime_type: str,
+        confidence: float | None,
+        seen_at: datetime,
+    ) -> None:
+        kind = self._plan_frame(state, confidence, seen_at)
+        state.frame_count += 1
+        state.last_seen_at = max(state.last_seen_at, seen_at)
+        if confidence is not None and (state.max_confidence is None or confidence > state.max_confidence):
+            state.max_confidence = confidence
+        state.dirty = True
+
+        if kind is None:
+            if time.monotonic() - state.flushed_at >= config.INCIDENT_FLUSH_SECONDS:
+                await self._flush(db, state)
+            return
+
+        image_path = await asyncio.to_thread(save_image_to_data_image, image_bytes, mime_type)
+        evicted: list[str] = []
+        frames = list(state.frames)
+        if kind == "peak":
+            evicted = [frame["image_path"] for frame in frames if frame["kind"] == "peak"]
+            frames = [frame for frame in frames if frame["kind"] != "peak"]
+        frames.append(_frame(kind, image_path, seen_at, confidence))
+        while len(frames) > max(1, config.INCIDENT_MAX_FRAMES):
+            oldest = min(
+                (frame for frame in frames if frame["kind"] == "latest"),
+                key=lambda frame: frame["seen_at"],
+                default=None,
+            )
+            if oldest is None:
+                break
+            frames.remove(oldest)
+            evicted.append(oldest["image_path"])
+
+        previous = state.frames
+        state.frames = frames
+        try:
+            await self._flush(db, state)
+        except Exception:
+            state.frames = previous
+            schedule_image_deletion([image_path])
+            raise
+        schedule_image_deletion(evicted)
+
+    async def _flush(self, db: AsyncSession, state: _OpenIncident) -> None:
+        await db.execute(update(MonitorIncident).where(MonitorIncident.id == state.id).values(**state.values()))
+        await db.commit()
+        state.dirty = False
+        state.flushed_at = time.monotonic()
+        await self._publish(state.read_model())
+
+    async def _close(self, db: AsyncSession, state: _OpenIncident) -> None:
+        await db.execute(
+            update(MonitorIncident)
+            .where(MonitorIncident.id == state.id)
+            .values(**state.values(), status=INCIDENT_CLOSED)
+        )
+        await db.commit()
+        self._open.pop(state.source, None)
+        await self._publish(state.read_model(INCIDENT_CLOSED))
+
+    async def _publish(self, incident: MonitorIncidentRead) -> None:
+        await incident_change_hub.publish(cursor=0, changes=[incident.model_dump(mode="json")])
+
+    async def sweep(self) -> None:
+        # Flush counters that have waited long enough and close idle incidents,
+        # including ones a previous process left open.
+        now = datetime.utcnow()
+        gap = timedelta(seconds=config.INCIDENT_GAP_SECONDS)
+        for source in list(self._open):
+            async with self._lock_for(source):
+                state = self._open.get(source)
+                if state is None:
+                    continue
+                async with get_session_factory()() as db:
+                    if now - state.last_seen_at > gap:
+                        await self._close(db, state)
+                    elif state.dirty and time.monotonic() - state.flushed_at >= config.INCIDENT_FLUSH_SECONDS:
+                        await self._flush(db, state)
+
+        tracked = {state.id for state in self._open.values()}
+        async with get_session_factory()() as db:
+            result = await db.execute(
+                select(MonitorIncident).where(
+                    MonitorIncident.status == INCIDENT_OPEN,
+                    MonitorIncident.last_seen_at < now - gap,
+                )
+            )
+            stale = [row for row in result.scalars().all() if row.id not in tracked]
+            if not stale:
+                return
+            await db.execute(
+                update(MonitorIncident)
+                .where(MonitorIncident.id.in_([row.id for row in stale]))
+                .values(status=INCIDENT_CLOSED)
+            )
+            await db.commit()
+        for row in stale:
+            row.status = INCIDENT_CLOSED
+            await self._publish(to_incident_read(row))
+
+    async def _sweep_forever(self) -> None:
+        interval = max(1.0, min(config.INCIDENT_FLUSH_SECONDS, config.INCIDENT_GAP_SECONDS / 2))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await ensure_database_initialized()
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"Incident sweep failed: {exc}")
+
+    def overlay(self, incidents: list[MonitorIncidentRead]) -> list[MonitorIncidentRead]:
+        # Rows of open incidents may lag memory by one flush interval.
+        current = {state.id: state for state in self._open.values()}
+        return [
+            current[incident.id].read_model() if incident.id in current else incident
+            for incident in incidents
+        ]
+
+
+async def list_incidents(
+    db: AsyncSession,
+    *,
+    status: str | None = None,
+    source: str | None = None,
+    limit: int = 100,
+) -> list[MonitorIncidentRead]:
+    await ensure_database_initialized()
+    stmt = select(MonitorIncident)
+    if status:
+        stmt = stmt.where(MonitorIncident.status == status)
+    if source and source.strip():
+        stmt = stmt.where(MonitorIncident.source == source.strip())
+    stmt = stmt.order_by(MonitorIncident.last_seen_at.desc(), MonitorIncident.id.desc()).limit(limit)
+    result = await db.execute(stmt)
+    return incident_tracker.overlay([to_incident_read(row) for row in result.scalars().all()])
+
+
+incident_tracker = IncidentTracker()
@@ -1,18 +1,26 @@
 from __future__ import annotations
 
 import asyncio
+import base64
+import json
 import mimetypes
 import re
-from datetime import datetime
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from uuid import uuid4
 
+from sqlalchemy import Select, and_, delete, func, or_, select
+from sqlalchemy.dialects.mysql import match
 from sqlalchemy.ext.asyncio import AsyncSession
 
+import config
 from config import DATA_IMAGE_DIR
 from database import init_database
-from models.data_monitor import MonitorRecord
-from models.schemas import MonitorRecordRead
+from models.data_monitor import MonitorRecord, MonitorRecordChange
+from models.schemas import MonitorRecordFilters, MonitorRecordRead
+from services.record_changes import record_change_hub
+from services.segment_store import segment_image_store
 
 
 _backend_dir = Path(__file__).resolve().parents[1]
@@ -22,6 +30,29 @@ _data_image_dir.mkdir(parents=True, exist_ok=True)
 _db_init_lock = asyncio.Lock()
 _db_initialized = False
 
+CHANGE_UPSERT = "upsert"
+CHANGE_DELETE = "delete"
+# Transactions may commit out of change-id order; anything logged this recently
+# is re-sent even below the cursor so a slow commit is never skipped.
+_CHANGE_COMMIT_GRACE_SECONDS = 5.0
+_CHANGE_PRUNE_INTERVAL_SECONDS = 600.0
+_last_change_prune_at = 0.0
+
+MONITOR_SORT_COLUMNS = {
+    "id": MonitorRecord.id,
+    "status": MonitorRecord.status,
+    "remark": MonitorRecord.remark,
+    "created_at": MonitorRecord.created_at,
+    "updated_at": MonitorRecord.updated_at,
+    "time": MonitorRecord.created_at,
+}
+# Stored status values behind each status filter; the first one is written
+# when a bulk update sets the status.
+_STATUS_FILTER_VALUES = {"fire": ("发生火灾",), "normal": ("无火灾", "normal")}
+_pending_image_deletions: set[asyncio.Future] = set()
+# MySQL's ngram_token_size; shorter search terms fall back to LIKE.
+_FULLTEXT_MIN_TERM_CHARS = 2
+
 
 def build_image_url(image_path: str) -> str:
     filename = Path(image_path).name
@@ -35,6 +66,7 @@ def to_read_model(record: MonitorRecord) -> MonitorRecordRead:
         scene_image_url=build_image_url(record.scene_image_path),
         status=record.status,
         remark=record.remark,
+        source=record.source or "",
         created_at=record.created_at,
         updated_at=record.updated_at,
     )
@@ -68,12 +100,28 @@ def _suffix_from_mime_type(mime_type: str | None) -> str:
 def save_image_to_data_image(image_bytes: bytes, mime_type: str | None = None) -> str:
     suffix = _suffix_from_mime_type(mime_type)
     filename = f"monitor_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid4().hex[:8]}{suffix}"
-    target = _data_image_dir / filename
-    target.write_bytes(image_bytes)
+    if config.IMAGE_SEGMENT_STORE_ENABLED:
+        segment_image_store.put(filename, image_bytes)
+    else:
+        (_data_image_dir / filename).write_bytes(image_bytes)
+    # The same path either way: readers resolve the name through the segment
+    # index first, then fall back to the file.
     return str(Path(DATA_IMAGE_DIR) / filename)
 
 
+def read_stored_image(scene_image_path: str) -> bytes | None:
+    data = segment_image_store.read(Path(scene_image_path).name)
+    if data is not None:
+        return data
+    try:
+        return (_backend_dir / scene_image_path).read_bytes()
+    except OSError:
+        return None
+
+
 def delete_stored_image(scene_image_path: str) -> None:
+    if segment_image_store.delete(Path(scene_image_path).name):
+        return
     target = (_backend_dir / scene_image_path).resolve()
     try:
         target.relative_to(_data_image_dir)
@@ -85,6 +133,268 @@ def delete_stored_image(scene_image_path: str) -> None:
         target.unlink()
 
 
+def _delete_stored_images(scene_image_paths: list[str]) -> None:
+    for scene_image_path in scene_image_paths:
+        try:
+            delete_stored_image(scene_image_path)
+        except OSError:
+            pass
+
+
+def schedule_image_deletion(scene_image_paths: list[str]) -> None:
+    # Call after commit. Unlinking thousands of files runs on a worker thread
+    # so it never holds up the request or the event loop.
+    if not scene_image_paths:
+        return
+    future = asyncio.get_running_loop().run_in_executor(None, _delete_stored_images, list(scene_image_paths))
+    _pending_image_deletions.add(future)
+    future.add_done_callback(_pending_image_deletions.discard)
+
+
+def _normalize_status(status: str) -> str:
+    normalized_status = status.strip().lower()
+    if normalized_status not in {"发生火灾", "无火灾"}:
+        normalized_status = "normal"
+    return normalized_status
+
+
+def stored_status(status_filter: str) -> str:
+    # "fire" / "normal" -> the value written to monitor_records.status.
+    return _STATUS_FILTER_VALUES[status_filter][0]
+
+
+def _utc_naive(value: datetime) -> datetime:
+    # Columns hold naive UTC (datetime.utcnow).
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _remark_search_clause(term: str, dialect_name: str):
+    if (
+        dialect_name == "mysql"
+        and not config.MONITOR_RECORDS_PARTITIONED
+        and len(term) >= _FULLTEXT_MIN_TERM_CHARS
+    ):
+        # A quoted phrase is a substring match on the ngram index and keeps
+        # boolean-mode operators in user input literal.
+        phrase = '"' + term.replace('"', " ") + '"'
+        return match(MonitorRecord.remark, against=phrase).in_boolean_mode()
+    return MonitorRecord.remark.contains(term, autoescape=True)
+
+
+def filter_records_query(stmt: Select, filters: MonitorRecordFilters, dialect_name: str) -> Select:
+    conditions = []
+    if filters.status:
+        conditions.append(MonitorRecord.status.in_(_STATUS_FILTER_VALUES[filters.status]))
+    if filters.source and filters.source.strip():
+        conditions.append(MonitorRecord.source == filters.source.strip())
+    if filters.created_from is not None:
+        conditions.append(MonitorRecord.created_at >= _utc_naive(filters.created_from))
+    if filters.created_to is not None:
+        conditions.append(MonitorRecord.created_at < _utc_naive(filters.created_to))
+    if filters.updated_from is not None:
+        conditions.append(MonitorRecord.updated_at >= _utc_naive(filters.updated_from))
+    if filters.updated_to is not None:
+        conditions.append(MonitorRecord.updated_at < _utc_naive(filters.updated_to))
+    if filters.q and filters.q.strip():
+        conditions.append(_remark_search_clause(filters.q.strip(), dialect_name))
+    return stmt.where(*conditions)
+
+
+def _encode_page_cursor(record: MonitorRecord, sort_by: str) -> str:
+    value = getattr(record, MONITOR_SORT_COLUMNS[sort_by].key)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, record.id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_page_cursor(token: str, sort_by: str) -> tuple[object, int]:
+    # Raises ValueError for anything that is not a cursor from this sort.
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        value, record_id = json.loads(raw)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid page cursor") from exc
+    if not isinstance(record_id, int):
+        raise ValueError("Invalid page cursor")
+    column = MONITOR_SORT_COLUMNS[sort_by]
+    if column.key in {"created_at", "updated_at"}:
+        value = datetime.fromisoformat(str(value))
+    elif column.key == "id":
+        value = int(value)
+    elif not isinstance(value, str):
+        raise ValueError("Invalid page cursor")
+    return value, record_id
+
+
+def build_records_query(
+    filters: MonitorRecordFilters,
+    *,
+    sort_by: str,
+    sort_order: str,
+    dialect_name: str,
+    limit: int | None = None,
+    after: str | None = None,
+) -> Select:
+    # Keyset pagination: `after` is the next_cursor of the previous page, so
+    # deep pages cost the same as the first. Raises ValueError for a bad cursor.
+    column = MONITOR_SORT_COLUMNS[sort_by]
+    ascending = sort_order == "asc"
+    stmt = filter_records_query(select(MonitorRecord), filters, dialect_name)
+
+    if after:
+        value, last_id = _decode_page_cursor(after, sort_by)
+        past = column > value if ascending else column < value
+        if column.key == "id":
+            stmt = stmt.where(past)
+        else:
+            # Ties on the sort column continue by id descending, as ordered below.
+            stmt = stmt.where(or_(past, and_(column == value, MonitorRecord.id < last_id)))
+
+    stmt = stmt.order_by(column.asc() if ascending else column.desc(), MonitorRecord.id.desc())
+    if limit is not None:
+        # One extra row tells whether another page exists.
+        stmt = stmt.limit(limit + 1)
+    return stmt
+
+
+async def query_monitor_records(
+    db: AsyncSession,
+    filters: MonitorRecordFilters,
+    *,
+    sort_by: str = "created_at",
+    sort_order: str = "desc",
+    limit: int | None = None,
+    after: str | None = None,
+) -> tuple[list[MonitorRecordRead], str | None]:
+    await ensure_database_initialized()
+    stmt = build_records_query(
+        filters,
+        sort_by=sort_by,
+        sort_order=sort_order,
+        dialect_name=db.bind.dialect.name,
+        limit=limit,
+        after=after,
+    )
+    rows = list((await db.execute(stmt)).scalars().all())
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_page_cursor(rows[-1], sort_by)
+    return [to_read_model(row) for row in rows], next_cursor
+
+
+def log_record_changes(db: AsyncSession, record_ids: list[int], op: str) -> list[MonitorRecordChange]:
+    # Call before commit so the change rows land in the same transaction.
+    changes = [MonitorRecordChange(record_id=record_id, op=op) for record_id in record_ids]
+    db.add_all(changes)
+    return changes
+
+
+def change_payload(record_id: int, seq: int, record: MonitorRecordRead | None) -> dict:
+    if record is None:
+        return {"seq": seq, "op": CHANGE_DELETE, "id": record_id}
+    return {"seq": seq, "op": CHANGE_UPSERT, "id": record_id, "record": record.model_dump(mode="json")}
+
+
+async def publish_record_changes(
+    changes: list[MonitorRecordChange], records: list[MonitorRecordRead | None]
+) -> None:
+    # After commit only. records[i] is None for a delete.
+    if not changes:
+        return
+    await record_change_hub.publish(
+        cursor=max(change.id for change in changes),
+        changes=[
+            change_payload(change.record_id, change.id, record)
+            for change, record in zip(changes, records)
+        ],
+    )
+
+
+async def current_change_cursor(db: AsyncSession) -> int:
+    await ensure_database_initialized()
+    return int(await db.scalar(select(func.max(MonitorRecordChange.id))) or 0)
+
+
+async def record_list_validator(db: AsyncSession) -> tuple[int, int]:
+    # (latest change id, retained change rows) from the change log. Any record
+    # write moves it, including a slow commit that lands below the latest id,
+    # and it costs one aggregate over a retention-bounded table instead of the
+    # full list query. Used as the list endpoint's ETag.
+    await ensure_database_initialized()
+    row = (
+        await db.execute(select(func.max(MonitorRecordChange.id), func.count(MonitorRecordChange.id)))
+    ).one()
+    return int(row[0] or 0), int(row[1] or 0)
+
+
+async def _prune_record_changes(db: AsyncSession) -> None:
+    global _last_change_prune_at
+
+    now = time.monotonic()
+    if now - _last_change_prune_at < _CHANGE_PRUNE_INTERVAL_SECONDS:
+        return
+    _last_change_prune_at = now
+
+    cutoff = datetime.utcnow() - timedelta(hours=config.MONITOR_CHANGE_RETENTION_HOURS)
+    latest = await current_change_cursor(db)
+    # Always keep the newest row so the log can tell a pruned cursor from an idle one.
+    await db.execute(
+        delete(MonitorRecordChange).where(
+            MonitorRecordChange.changed_at < cutoff,
+            MonitorRecordChange.id < latest,
+        )
+    )
+    await db.commit()
+
+
+async def list_record_changes(db: AsyncSession, since: int, limit: int) -> dict:
+    # Changes after `since`, collapsed to the latest state per record: "upsert"
+    # with the current row, or a "delete" tombstone. reset=True means the cursor
+    # is older than the retained log and the client must reload the full list.
+    await ensure_database_initialized()
+    await _prune_record_changes(db)
+
+    if since > 0:
+        oldest = await db.scalar(select(func.min(MonitorRecordChange.id)))
+        if oldest is not None and since < oldest - 1:
+            return {"cursor": await current_change_cursor(db), "reset": True, "has_more": False, "changes": []}
+
+    grace_cutoff = datetime.utcnow() - timedelta(seconds=_CHANGE_COMMIT_GRACE_SECONDS)
+    result = await db.execute(
+        select(MonitorRecordChange)
+        .where(or_(MonitorRecordChange.id > since, MonitorRecordChange.changed_at >= grace_cutoff))
+        .order_by(MonitorRecordChange.id)
+        .limit(limit + 1)
+    )
+    rows = list(result.scalars().all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest_seq: dict[int, int] = {}
+    for row in rows:
+        latest_seq[row.record_id] = row.id
+
+    records: dict[int, MonitorRecordRead] = {}
+    if latest_seq:
+        result = await db.execute(select(MonitorRecord).where(MonitorRecord.id.in_(list(latest_seq))))
+        records = {row.id: to_read_model(row) for row in result.scalars().all()}
+
+    return {
+        "cursor": max([since, *(row.id for row in rows)]),
+        "reset": False,
+        "has_more": has_more,
+        "changes": [
+            # The current row decides the op, whatever the logged op was.
+            change_payload(record_id, seq, records.get(record_id))
+            for record_id, seq in sorted(latest_seq.items(), key=lambda item: item[1])
+        ],
+    }
+
+
 async def create_monitor_record(
     db: AsyncSession,
     *,
@@ -92,25 +402,63 @@ async def create_monitor_record(
     mime_type: str | None,
     status: str,
     remark: str = "",
+    source: str = "",
 ) -> MonitorRecordRead:
     await ensure_database_initialized()
 
-    normalized_status = status.strip().lower()
-    if normalized_status not in {"发生火灾", "无火灾"}:
-        normalized_status = "normal"
-
     scene_image_path = save_image_to_data_image(image_bytes=image_bytes, mime_type=mime_type)
     record = MonitorRecord(
         scene_image_path=scene_image_path,
-        status=normalized_status,
+        status=_normalize_status(status),
         remark=remark.strip(),
+        source=source[:64],
     )
     db.add(record)
     try:
+        await db.flush()
+        changes = log_record_changes(db, [record.id], CHANGE_UPSERT)
         await db.commit()
         await db.refresh(record)
     except Exception:
         await db.rollback()
         delete_stored_image(scene_image_path)
         raise
-    return to_read_model(record)
+    read_model = to_read_model(record)
+    await publish_record_changes(changes, [read_model])
+    return read_model
+
+
+async def create_monitor_records(
+    db: AsyncSession,
+    items: list[dict],
+) -> list[MonitorRecordRead]:
+    # items: [{"image_bytes", "mime_type", "status", "remark", "source"}]; one INSERT batch, one commit.
+    await ensure_database_initialized()
+
+    records: list[MonitorRecord] = []
+    try:
+        for item in items:
+            scene_image_path = save_image_to_data_image(
+                image_bytes=item["image_bytes"],
+                mime_type=item.get("mime_type"),
+            )
+            records.append(
+                MonitorRecord(
+                    scene_image_path=scene_image_path,
+                    status=_normalize_status(item["status"]),
+                    remark=str(item.get("remark", "")).strip(),
+                    source=str(item.get("source", ""))[:64],
+                )
+            )
+        db.add_all(records)
+        await db.flush()
+        changes = log_record_changes(db, [record.id for record in records], CHANGE_UPSERT)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        for record in records:
+            delete_stored_image(record.scene_image_path)
+        raise
+    read_models = [to_read_model(record) for record in records]
+    await publish_record_changes(changes, read_models)
+    return read_models
@@ -1,30 +1,43 @@
 from __future__ import annotations
 
 import base64
+import json
+import time
 from typing import Any
 
 import httpx
 from fastapi import HTTPException
 
 import config
+from services.qwen_pool import QwenEndpoint, parse_retry_after, qwen_endpoint_pool
+from utils import detect_fire_verdict
 
 
-def _build_prompt() -> str:
+def _build_prompt(region_mode: str = "full") -> str:
+    if region_mode == "mosaic":
+        subject = (
+            "The image is a mosaic of regions cropped from one camera frame by a local detector, "
+            "separated by gray borders. Determine whether any region contains visible fire, "
+        )
+    elif region_mode == "crops":
+        subject = (
+            "The images are regions cropped from one camera frame by a local detector. "
+            "Determine whether any of them contains visible fire, "
+        )
+    else:
+        subject = "Determine whether the image contains visible fire, "
     return (
-        "You are a fire detection assistant. Determine whether the image contains visible fire, "
-        "dense smoke, or burning scenes. Return JSON only: {\"fire\": true} or {\"fire\": false}. "
+        "You are a fire detection assistant. " + subject + "dense smoke, or burning scenes. "
+        "Return JSON only: {\"fire\": true} or {\"fire\": false}. "
         "Do not return any extra text."
     )
 
 
-async def call_qwen(image_bytes: bytes, mime_type: str) -> str:
-    if not config.QWEN_API_KEY:
-        raise HTTPException(status_code=500, detail="Missing QWEN_API_KEY environment variable.")
-
-    image_b64 = base64.b64encode(image_bytes).decode("utf-8")
-    data_url = f"data:{mime_type};base64,{image_b64}"
+def _build_payload(
+    model: str, data_urls: list[str], region_mode: str = "full", stream: bool = False
+) -> dict[str, Any]:
     payload: dict[str, Any] = {
-        "model": config.QWEN_MODEL,
+        "model": model,
         "messages": [
             {
                 "role": "system",
@@ -33,36 +46,200 @@ async def call_qwen(image_bytes: bytes, mime_type: str) -> str:
             {
                 "role": "user",
                 "content": [
-                    {"type": "image_url", "image_url": {"url": data_url}},
-                    {"type": "text", "text": _build_prompt()},
+                    *({"type": "image_url", "image_url": {"url": url}} for url in data_urls),
+                    {"type": "text", "text": _build_prompt(region_mode)},
                 ],
             },
         ],
         "temperature": 0.0,
         "response_format": {"type": "json_object"},
     }
+    if stream:
+        payload["stream"] = True
+    return payload
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.post(
-            config.QWEN_API_URL,
-            headers={
-                "Authorization": f"Bearer {config.QWEN_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json=payload,
-        )
-        if resp.status_code >= 400:
-            raise HTTPException(status_code=502, detail=f"Qwen API error: {resp.text}")
-        data = resp.json()
 
+def _content_to_text(content: Any) -> str:
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    if content is None:
+        return ""
+    return str(content)
+
+
+def _extract_text(data: dict[str, Any]) -> str:
     choices = data.get("choices", [])
     if not choices:
         raise HTTPException(status_code=502, detail="Qwen returned no choices.")
 
-    text = choices[0].get("message", {}).get("content", "")
-    if isinstance(text, list):
-        text = "".join(part.get("text", "") for part in text if isinstance(part, dict))
-    text = str(text).strip()
+    text = _content_to_text(choices[0].get("message", {}).get("content", "")).strip()
     if not text:
         raise HTTPException(status_code=502, detail="Qwen returned empty text.")
     return text
+
+
+class _UpstreamError(Exception):
+    def __init__(self, status_code: int, body: str, retry_after: float | None = None) -> None:
+        super().__init__(body)
+        self.status_code = status_code
+        self.body = body
+        self.retry_after = retry_after
+
+
+def _auth_headers(endpoint: QwenEndpoint) -> dict[str, str]:
+    return {
+        "Authorization": f"Bearer {endpoint.api_key}",
+        "Content-Type": "application/json",
+    }
+
+
+def _raise_for_upstream_status(resp: httpx.Response, body: str) -> None:
+    if resp.status_code >= 400:
+        raise _UpstreamError(
+            resp.status_code,
+            body,
+            retry_after=parse_retry_after(resp.headers.get("Retry-After")),
+        )
+
+
+async def _complete(
+    client: httpx.AsyncClient, endpoint: QwenEndpoint, data_urls: list[str], region_mode: str
+) -> str:
+    resp = await client.post(
+        endpoint.api_url,
+        headers=_auth_headers(endpoint),
+        json=_build_payload(endpoint.model, data_urls, region_mode),
+    )
+    _raise_for_upstream_status(resp, resp.text)
+    return _extract_text(resp.json())
+
+
+async def _stream(
+    client: httpx.AsyncClient, endpoint: QwenEndpoint, data_urls: list[str], region_mode: str
+) -> str:
+    chunks: list[str] = []
+    async with client.stream(
+        "POST",
+        endpoint.api_url,
+        headers=_auth_headers(endpoint),
+        json=_build_payload(endpoint.model, data_urls, region_mode, stream=True),
+    ) as resp:
+        if resp.status_code >= 400:
+            body = (await resp.aread()).decode("utf-8", errors="replace")
+            _raise_for_upstream_status(resp, body)
+
+        if "text/event-stream" not in resp.headers.get("Content-Type", ""):
+            # Upstream ignored "stream": treat it as a regular completion body.
+            body = await resp.aread()
+            try:
+                return _extract_text(json.loads(body))
+            except json.JSONDecodeError as exc:
+                raise _UpstreamError(502, body.decode("utf-8", errors="replace")) from exc
+
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            try:
+                event = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+
+            for choice in event.get("choices") or []:
+                chunks.append(_content_to_text((choice.get("delta") or {}).get("content")))
+
+            if detect_fire_verdict("".join(chunks)) is not None:
+                # Leaving the context manager closes the stream; the rest of the
+                # reply cannot change the verdict. The caller stores the text as
+                # received and parses the verdict from it.
+                break
+
+    return "".join(chunks).strip()
+
+
+async def _request_text(
+    client: httpx.AsyncClient, endpoint: QwenEndpoint, data_urls: list[str], region_mode: str
+) -> str:
+    if not config.QWEN_STREAM:
+        return await _complete(client, endpoint, data_urls, region_mode)
+
+    try:
+        text = await _stream(client, endpoint, data_urls, region_mode)
+    except _UpstreamError as exc:
+        # 400 usually means the endpoint or model rejects streaming; retry plain.
+        if exc.status_code != 400:
+            raise
+        return await _complete(client, endpoint, data_urls, region_mode)
+    if not text:
+        # A failure of this endpoint: call_qwen_images moves on to the next
+        # instead of paying for the same request again here.
+        raise HTTPException(status_code=502, detail="Qwen returned empty text.")
+    return text
+
+
+async def call_qwen(image_bytes: bytes, mime_type: str) -> str:
+    return await call_qwen_images([(image_bytes, mime_type)])
+
+
+async def call_qwen_images(images: list[tuple[bytes, str]], region_mode: str = "full") -> str:
+    # images: [(bytes, mime_type)]; region_mode tells the prompt whether these are
+    # the full frame or detector crops ("crops" / "mosaic").
+    if not any(item["api_key"] for item in config.QWEN_ENDPOINTS):
+        raise HTTPException(status_code=500, detail="Missing QWEN_API_KEY environment variable.")
+
+    data_urls = [
+        f"data:{mime_type};base64,{base64.b64encode(image_bytes).decode('utf-8')}"
+        for image_bytes, mime_type in images
+    ]
+
+    tried: list[QwenEndpoint] = []
+    last_error = "No Qwen endpoint configured."
+    async with httpx.AsyncClient(timeout=config.QWEN_TIMEOUT) as client:
+        while len(tried) < qwen_endpoint_pool.size:
+            endpoint = qwen_endpoint_pool.acquire(exclude=tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+
+            if not endpoint.api_key:
+                qwen_endpoint_pool.report_failure(endpoint, "missing api key")
+                last_error = f"Missing API key for Qwen endpoint '{endpoint.name}'."
+                continue
+
+            started_at = time.monotonic()
+            try:
+                text = await _request_text(client, endpoint, data_urls, region_mode)
+            except httpx.HTTPError as exc:
+                qwen_endpoint_pool.report_failure(endpoint, f"{type(exc).__name__}: {exc}")
+                last_error = f"Qwen API request failed ({endpoint.name}): {exc}"
+                continue
+            except _UpstreamError as exc:
+                if exc.status_code == 429:
+                    qwen_endpoint_pool.report_rate_limited(endpoint, exc.retry_after)
+                    last_error = f"Qwen API rate limited ({endpoint.name}): {exc.body}"
+                else:
+                    qwen_endpoint_pool.report_failure(endpoint, f"HTTP {exc.status_code}")
+                    last_error = f"Qwen API error ({endpoint.name}): {exc.body}"
+                continue
+            except HTTPException as exc:
+                # No choices or empty text: another endpoint may do better.
+                qwen_endpoint_pool.report_failure(endpoint, str(exc.detail))
+                last_error = f"Qwen API error ({endpoint.name}): {exc.detail}"
+                continue
+            except Exception as exc:
+                # e.g. a body that is not the JSON we expect.
+                qwen_endpoint_pool.report_failure(endpoint, f"{type(exc).__name__}: {exc}")
+                last_error = f"Qwen API returned an unusable reply ({endpoint.name}): {exc}"
+                continue
+            except BaseException:
+                # Cancelled with the caller: every path out must settle
+                # `outstanding`, or the endpoint looks busier forever.
+                qwen_endpoint_pool.release(endpoint)
+                raise
+
+            qwen_endpoint_pool.report_success(endpoint, time.monotonic() - started_at)
+            return text
+
+    raise HTTPException(status_code=502, detail=last_error)
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import time
+from email.utils import parsedate_to_datetime
+from threading import Lock
+
+import config
+
+
+_LATENCY_EWMA_ALPHA = 0.3
+_MAX_EJECT_SECONDS = 300.0
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class QwenEndpoint:
+    def __init__(self, *, name: str, api_url: str, api_key: str, model: str, weight: float) -> None:
+        self.name = name
+        self.api_url = api_url
+        self.api_key = api_key
+        self.model = model
+        self.weight = weight
+        self.outstanding = 0
+        self.latency_ewma: float | None = None
+        self.total_requests = 0
+        self.total_failures = 0
+        self.rate_limited_count = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.last_error: str | None = None
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "name": self.name,
+            "api_url": self.api_url,
+            "model": self.model,
+            "weight": self.weight,
+            "healthy": self.is_available(now),
+            "ejected_for_seconds": round(max(0.0, self.ejected_until - now), 3),
+            "outstanding": self.outstanding,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1)
+            if self.latency_ewma is not None
+            else None,
+            "total_requests": self.total_requests,
+            "total_failures": self.total_failures,
+            "rate_limited_count": self.rate_limited_count,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+        }
+
+
+class QwenEndpointPool:
+    def __init__(
+        self,
+        endpoints: list[QwenEndpoint],
+        *,
+        strategy: str = "latency",
+        eject_seconds: float = 30.0,
+        failure_threshold: int = 3,
+    ) -> None:
+        if not endpoints:
+            raise ValueError("QwenEndpointPool requires at least one endpoint")
+        self._lock = Lock()
+        self._endpoints = endpoints
+        self.strategy = strategy if strategy in {"latency", "least_outstanding"} else "latency"
+        self.eject_seconds = max(0.0, eject_seconds)
+        self.failure_threshold = max(1, failure_threshold)
+
+    @property
+    def size(self) -> int:
+        return len(self._endpoints)
+
+    def _score(self, endpoint: QwenEndpoint) -> tuple[float, float]:
+        # Unmeasured endpoints score 0 latency so each one gets probed early.
+        latency = endpoint.latency_ewma or 0.0
+        load = (endpoint.outstanding + 1) / endpoint.weight
+        if self.strategy == "least_outstanding":
+            return load, latency
+        return latency * load, load
+
+    def acquire(self, exclude: list[QwenEndpoint] | None = None) -> QwenEndpoint | None:
+        exclude = exclude or []
+        now = time.monotonic()
+        with self._lock:
+            candidates = [ep for ep in self._endpoints if ep not in exclude]
+            if not candidates:
+                return None
+
+            available = [ep for ep in candidates if ep.is_available(now)]
+            if available:
+                endpoint = min(available, key=self._score)
+            else:
+                # Every endpoint is ejected: fail open on the one that recovers first.
+                endpoint = min(candidates, key=lambda ep: ep.ejected_until)
+
+            endpoint.outstanding += 1
+            endpoint.total_requests += 1
+            return endpoint
+
+    def _eject(self, endpoint: QwenEndpoint, seconds: float) -> None:
+        seconds = min(_MAX_EJECT_SECONDS, max(0.0, seconds))
+        endpoint.ejected_until = max(endpoint.ejected_until, time.monotonic() + seconds)
+
+    def report_success(self, endpoint: QwenEndpoint, latency: float) -> None:
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+            endpoint.consecutive_failures = 0
+            endpoint.last_error = None
+            if endpoint.latency_ewma is None:
+                endpoint.latency_ewma = latency
+            else:
+                endpoint.latency_ewma += _LATENCY_EWMA_ALPHA * (latency - endpoint.latency_ewma)
+
+    def report_rate_limited(self, endpoint: QwenEndpoint, retry_after: float | None) -> None:
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+            endpoint.total_failures += 1
+            endpoint.rate_limited_count += 1
+            endpoint.last_error = "rate limited (429)"
+            self._eject(endpoint, retry_after if retry_after is not None else self.eject_seconds)
+
+    def release(self, endpoint: QwenEndpoint) -> None:
+        # The request was abandoned (cancelled) without an answer: drop it
+        # from the load count without judging the endpoint.
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+
+    def report_failure(self, endpoint: QwenEndpoint, error: str) -> None:
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+            endpoint.total_failures += 1
+            endpoint.consecutive_failures += 1
+            endpoint.last_error = error[:500]
+            if endpoint.consecutive_failures >= self.failure_threshold:
+                self._eject(endpoint, self.eject_seconds)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            endpoints = [endpoint.snapshot(now) for endpoint in self._endpoints]
+        return {
+            "strategy": self.strategy,
+            "healthy_count": sum(1 for item in endpoints if item["healthy"]),
+            "endpoints": endpoints,
+        }
+
+
+def _build_pool() -> QwenEndpointPool:
+    endpoints = [QwenEndpoint(**item) for item in config.QWEN_ENDPOINTS]
+    return QwenEndpointPool(
+        endpoints,
+        strategy=config.QWEN_ROUTING_STRATEGY,
+        eject_seconds=config.QWEN_EJECT_SECONDS,
+        failure_threshold=config.QWEN_EJECT_FAILURE_THRESHOLD,
+    )
+
+
+qwen_endpoint_pool = _build_pool()
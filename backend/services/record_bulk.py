@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import json
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from datetime import datetime
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config
+from database import get_session_factory
+from models.data_monitor import MonitorRecord
+from models.schemas import MonitorRecordFilters, MonitorRecordSelection
+from services.monitor_records import (
+    CHANGE_DELETE,
+    CHANGE_UPSERT,
+    ensure_database_initialized,
+    filter_records_query,
+    log_record_changes,
+    publish_record_changes,
+    schedule_image_deletion,
+    stored_status,
+    to_read_model,
+)
+
+
+def selection_error(selection: MonitorRecordSelection) -> str | None:
+    # Guards against a typo turning into "every record in the table".
+    if (selection.ids is None) == (selection.filters is None):
+        return "Pass exactly one of ids or filters"
+    if selection.filters is not None:
+        values = selection.filters.model_dump(exclude_none=True)
+        if not any(value.strip() if isinstance(value, str) else True for value in values.values()):
+            return "filters must contain at least one condition"
+    return None
+
+
+def _line(payload: dict) -> str:
+    return json.dumps(payload, ensure_ascii=False) + "\n"
+
+
+async def _count_selected(db: AsyncSession, selection: MonitorRecordSelection) -> int:
+    if selection.ids is not None:
+        return len(set(selection.ids))
+    stmt = filter_records_query(select(MonitorRecord.id), selection.filters, db.bind.dialect.name)
+    return int(await db.scalar(select(func.count()).select_from(stmt.subquery())) or 0)
+
+
+async def _iter_selected_chunks(
+    db: AsyncSession, selection: MonitorRecordSelection, chunk_size: int
+) -> AsyncIterator[tuple[list, int]]:
+    # Yields ([(id, scene_image_path), ...], requested ids not found). Filter
+    # selections walk the id index with a keyset, so rows an update moves out
+    # of the filter are never revisited.
+    if selection.ids is not None:
+        ids = sorted(set(selection.ids))
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start : start + chunk_size]
+            result = await db.execute(
+                select(MonitorRecord.id, MonitorRecord.scene_image_path).where(MonitorRecord.id.in_(chunk))
+            )
+            rows = list(result.all())
+            yield rows, len(chunk) - len(rows)
+        return
+
+    filters: MonitorRecordFilters = selection.filters
+    last_id = 0
+    while True:
+        stmt = (
+            filter_records_query(
+                select(MonitorRecord.id, MonitorRecord.scene_image_path), filters, db.bind.dialect.name
+            )
+            .where(MonitorRecord.id > last_id)
+            .order_by(MonitorRecord.id)
+            .limit(chunk_size)
+        )
+        rows = list((await db.execute(stmt)).all())
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield rows, 0
+
+
+async def _delete_chunk(db: AsyncSession, rows: list) -> None:
+    ids = [row.id for row in rows]
+    await db.execute(
+        delete(MonitorRecord).where(MonitorRecord.id.in_(ids)).execution_options(synchronize_session=False)
+    )
+    changes = log_record_changes(db, ids, CHANGE_DELETE)
+    await db.commit()
+    schedule_image_deletion([row.scene_image_path for row in rows])
+    await publish_record_changes(changes, [None] * len(ids))
+
+
+def _update_chunk(values: dict) -> Callable[[AsyncSession, list], Awaitable[None]]:
+    async def apply(db: AsyncSession, rows: list) -> None:
+        ids = [row.id for row in rows]
+        await db.execute(
+            update(MonitorRecord)
+            .where(MonitorRecord.id.in_(ids))
+            .values(**values, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        changes = log_record_changes(db, ids, CHANGE_UPSERT)
+        await db.commit()
+
+        result = await db.execute(
+            select(MonitorRecord)
+            .where(MonitorRecord.id.in_(ids))
+            .execution_options(populate_existing=True)
+        )
+        records = {row.id: to_read_model(row) for row in result.scalars().all()}
+        await publish_record_changes(changes, [records.get(change.record_id) for change in changes])
+
+    return apply
+
+
+async def _stream_bulk(
+    selection: MonitorRecordSelection,
+    apply_chunk: Callable[[AsyncSession, list], Awaitable[None]],
+) -> AsyncIterator[str]:
+    # NDJSON: one "start" line, one "progress" line per committed chunk, then
+    # "summary" (or "error"; chunks committed before it stay committed).
+    await ensure_database_initialized()
+    chunk_size = max(1, config.MONITOR_BULK_CHUNK_SIZE)
+    started = time.perf_counter()
+    affected = missing = chunks = 0
+
+    async with get_session_factory()() as db:
+        total = await _count_selected(db, selection)
+        yield _line({"type": "start", "total": total, "chunk_size": chunk_size})
+        try:
+            async for rows, chunk_missing in _iter_selected_chunks(db, selection, chunk_size):
+                chunks += 1
+                missing += chunk_missing
+                if rows:
+                    await apply_chunk(db, rows)
+                    affected += len(rows)
+                yield _line(
+                    {
+                        "type": "progress",
+                        "chunk": chunks,
+                        "affected": len(rows),
+                        "missing": chunk_missing,
+                        "done": affected,
+                        "total": total,
+                    }
+                )
+        except Exception as exc:
+            await db.rollback()
+            yield _line({"type": "error", "chunk": chunks, "done": affected, "error": str(exc)})
+            return
+
+    yield _line(
+        {
+            "type": "summary",
+            "affected": affected,
+            "missing": missing,
+            "chunks": chunks,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+    )
+
+
+def stream_bulk_delete(selection: MonitorRecordSelection) -> AsyncIterator[str]:
+    return _stream_bulk(selection, _delete_chunk)
+
+
+def stream_bulk_update(
+    selection: MonitorRecordSelection, *, status: str | None = None, remark: str | None = None
+) -> AsyncIterator[str]:
+    values: dict = {}
+    if status is not None:
+        values["status"] = stored_status(status)
+    if remark is not None:
+        values["remark"] = remark.strip()
+    return _stream_bulk(selection, _update_chunk(values))
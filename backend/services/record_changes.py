@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+from fastapi import WebSocket
+
+
+class RecordChangeHub:
+    # Fan-out of monitor record changes to /ws/data-monitor/changes clients.
+    # Messages carry the same change objects as the delta API, so a client can
+    # apply either source and resume from the last cursor after a reconnect.
+    # The incident hub reuses it with its own message type.
+    def __init__(self, message_type: str = "record_changes") -> None:
+        self._message_type = message_type
+        self._lock = asyncio.Lock()
+        self._clients: set[WebSocket] = set()
+
+    async def connect(self, websocket: WebSocket) -> None:
+        await websocket.accept()
+        async with self._lock:
+            self._clients.add(websocket)
+
+    async def disconnect(self, websocket: WebSocket) -> None:
+        async with self._lock:
+            self._clients.discard(websocket)
+
+    def build_message(self, cursor: int, changes: list[dict], *, reset: bool = False) -> str:
+        payload = {"type": self._message_type, "cursor": cursor, "reset": reset, "changes": changes}
+        return json.dumps(payload, ensure_ascii=False)
+
+    async def publish(self, cursor: int, changes: list[dict]) -> None:
+        if changes:
+            await self._broadcast(self.build_message(cursor, changes))
+
+    async def publish_reset(self, cursor: int) -> None:
+        # For removals that bypass the change log (dropped partitions): every
+        # client reloads the full list.
+        await self._broadcast(self.build_message(cursor, [], reset=True))
+
+    async def _broadcast(self, message: str) -> None:
+        async with self._lock:
+            clients = list(self._clients)
+
+        if not clients:
+            return
+
+        disconnected: list[WebSocket] = []
+
+        for client in clients:
+            try:
+                await client.send_text(message)
+            except Exception:
+                disconnected.append(client)
+
+        if disconnected:
+            async with self._lock:
+                for client in disconnected:
+                    self._clients.discard(client)
+
+
+record_change_hub = RecordChangeHub()
+incident_change_hub = RecordChangeHub("incident_changes")
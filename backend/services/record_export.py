@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import io
+import json
+import zipfile
+from collections.abc import AsyncIterator
+from datetime import datetime
+from pathlib import Path
+
+from database import read_session
+from models.schemas import MonitorRecordFilters
+from services.monitor_records import (
+    build_records_query,
+    ensure_database_initialized,
+    read_stored_image,
+    to_read_model,
+)
+
+
+EXPORT_FIELDS = [
+    "id",
+    "status",
+    "source",
+    "remark",
+    "created_at",
+    "updated_at",
+    "scene_image_path",
+    "scene_image_url",
+]
+# Rows fetched per round trip from the server-side cursor.
+_EXPORT_YIELD_PER = 1000
+
+
+def export_media_type(fmt: str, include_images: bool) -> str:
+    if include_images:
+        return "application/zip"
+    return "text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson"
+
+
+def export_filename(fmt: str, include_images: bool) -> str:
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"monitor_records_{stamp}.{'zip' if include_images else fmt}"
+
+
+def image_archive_name(scene_image_path: str) -> str:
+    return f"images/{Path(scene_image_path).name}"
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only, unseekable buffer: zipfile then streams entries with data
+    # descriptors, and the generator hands out whatever has been written.
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        return chunk
+
+
+class _RowEncoder:
+    def __init__(self, fmt: str) -> None:
+        self._text = io.StringIO()
+        self._writer = csv.DictWriter(self._text, fieldnames=EXPORT_FIELDS) if fmt == "csv" else None
+
+    def header(self) -> bytes:
+        if self._writer is None:
+            return b""
+        self._writer.writeheader()
+        # BOM so Excel opens the Chinese status/remark columns as UTF-8.
+        return "\ufeff".encode("utf-8") + self._take()
+
+    def encode(self, records: list[dict]) -> bytes:
+        if self._writer is None:
+            return "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+        self._writer.writerows({field: record.get(field) for field in EXPORT_FIELDS} for record in records)
+        return self._take()
+
+    def _take(self) -> bytes:
+        data = self._text.getvalue().encode("utf-8")
+        self._text.seek(0)
+        self._text.truncate(0)
+        return data
+
+
+async def _iter_record_batches(db, filters: MonitorRecordFilters) -> AsyncIterator[list[dict]]:
+    # db.stream() runs the query on a server-side cursor (SSCursor on MySQL), so
+    # only one batch of rows is ever held in the process.
+    stmt = build_records_query(filters, sort_by="id", sort_order="asc", dialect_name=db.bind.dialect.name)
+    result = await db.stream(stmt.execution_options(yield_per=_EXPORT_YIELD_PER))
+    async for partition in result.scalars().partitions():
+        yield [to_read_model(row).model_dump(mode="json") for row in partition]
+
+
+async def stream_records_export(
+    filters: MonitorRecordFilters,
+    fmt: str = "csv",
+    include_images: bool = False,
+) -> AsyncIterator[bytes]:
+    # Records matching `filters` in id order, as CSV or NDJSON. With images the
+    # output is a ZIP built on the fly: records.<fmt>, then images/<file> for
+    # each record, then summary.json. Memory stays at one batch or one image.
+    await ensure_database_initialized()
+    encoder = _RowEncoder(fmt)
+
+    async with read_session() as db:
+        if not include_images:
+            yield encoder.header()
+            async for records in _iter_record_batches(db, filters):
+                yield encoder.encode(records)
+            return
+
+        sink = _ChunkSink()
+        counts = {"records": 0, "images": 0, "missing_images": 0}
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+            # Two passes inside one transaction: InnoDB's consistent snapshot
+            # keeps the image pass in line with the records file.
+            with archive.open(f"records.{fmt}", mode="w", force_zip64=True) as entry:
+                entry.write(encoder.header())
+                async for records in _iter_record_batches(db, filters):
+                    entry.write(encoder.encode(records))
+                    counts["records"] += len(records)
+                    # The deflater may hold everything back for a while.
+                    if chunk := sink.drain():
+                        yield chunk
+
+            async for records in _iter_record_batches(db, filters):
+                for record in records:
+                    data = await asyncio.to_thread(read_stored_image, record["scene_image_path"])
+                    if data is None:
+                        counts["missing_images"] += 1
+                        continue
+                    # JPEGs do not compress; store them as-is.
+                    archive.writestr(
+                        image_archive_name(record["scene_image_path"]),
+                        data,
+                        compress_type=zipfile.ZIP_STORED,
+                    )
+                    counts["images"] += 1
+                    yield sink.drain()
+
+            archive.writestr("summary.json", json.dumps(counts, ensure_ascii=False, indent=2))
+        yield sink.drain()
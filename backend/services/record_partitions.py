@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+import config
+from database import get_engine, get_session_factory
+from models.data_monitor import MonitorRecord, MonitorRecordChange
+from services.monitor_records import current_change_cursor, delete_stored_image, ensure_database_initialized
+from services.record_changes import record_change_hub
+
+
+_TABLE = MonitorRecord.__tablename__
+# Catch-all for rows past the last month partition; kept empty by creating
+# month partitions ahead of time, so splitting it never copies rows.
+FUTURE_PARTITION = "pmax"
+_MONTH_PARTITION = re.compile(r"^p(\d{4})(\d{2})$")
+# An expired partition is exchanged into this table, its images are deleted
+# from there, then the table is dropped. A leftover one is finished next run.
+_EXPIRED_PREFIX = f"{_TABLE}_expired_"
+_EXPIRED_CHUNK_SIZE = 1000
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+
+def _month_of(name: str) -> date | None:
+    match = _MONTH_PARTITION.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def _definitions(months: list[date]) -> str:
+    # `pYYYYMM` holds rows created before the first day of the next month; the
+    # first partition therefore also holds everything older.
+    parts = [
+        f"PARTITION `{partition_name(month)}` VALUES LESS THAN ('{add_months(month, 1).isoformat()}')"
+        for month in months
+    ]
+    parts.append(f"PARTITION `{FUTURE_PARTITION}` VALUES LESS THAN (MAXVALUE)")
+    return ",\n  ".join(parts)
+
+
+def partition_by_clause(first_month: date, now: datetime) -> str:
+    # For CREATE/ALTER TABLE: one partition per month from first_month through
+    # MONITOR_PARTITION_MONTHS_AHEAD months past `now`, then the catch-all.
+    last_month = add_months(month_start(now), max(0, config.MONITOR_PARTITION_MONTHS_AHEAD))
+    months = [month_start(first_month)]
+    while months[-1] < last_month:
+        months.append(add_months(months[-1], 1))
+    return f"PARTITION BY RANGE COLUMNS(`created_at`) (\n  {_definitions(months)}\n)"
+
+
+def _delete_images(scene_image_paths: list[str]) -> None:
+    for scene_image_path in scene_image_paths:
+        try:
+            delete_stored_image(scene_image_path)
+        except OSError:
+            pass
+
+
+async def _partitions(conn: AsyncConnection) -> list[dict]:
+    result = await conn.execute(
+        text(
+            "SELECT PARTITION_NAME AS name, TABLE_ROWS AS approx_rows "
+            "FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ),
+        {"table": _TABLE},
+    )
+    return [dict(row) for row in result.mappings()]
+
+
+async def _leftover_expired_tables(conn: AsyncConnection) -> list[str]:
+    result = await conn.execute(
+        text(
+            "SELECT TABLE_NAME FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME LIKE :pattern"
+        ),
+        {"pattern": _EXPIRED_PREFIX.replace("_", r"\_") + "%"},
+    )
+    return sorted(row[0] for row in result)
+
+
+class RecordPartitionMaintainer:
+    # Keeps a partitioned monitor_records table ready for the coming months
+    # and applies MONITOR_RECORD_RETENTION_DAYS by dropping whole months: an
+    # instant metadata change instead of a row-by-row DELETE. Dropped rows get
+    # no change log entries, so delta clients are told to reload instead.
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self._running = False
+        self.last_run: dict | None = None
+
+    def start(self) -> None:
+        if config.MONITOR_RECORDS_PARTITIONED and self._task is None:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_forever(self) -> None:
+        # First run at startup, so a backend that was down over a month
+        # boundary does not keep writing into the catch-all partition.
+        while True:
+            try:
+                stats = await self.run()
+                if stats["created"] or stats["dropped"] or stats["purged_rows"]:
+                    print(f"Monitor record partitions: {stats}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"Monitor record partition maintenance failed: {exc}")
+            await asyncio.sleep(max(60.0, config.MONITOR_PARTITION_MAINTENANCE_INTERVAL_SECONDS))
+
+    async def run(self, *, dry_run: bool = False) -> dict:
+        # Raises RuntimeError when the table is not partitioned. dry_run only
+        # reports which partitions would be created and dropped.
+        if self._running:
+            raise RuntimeError("Partition maintenance is already running")
+        self._running = True
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        stats = {"created": [], "dropped": [], "purged_rows": 0}
+        try:
+            await ensure_database_initialized()
+            engine = get_engine()
+            if engine.dialect.name != "mysql":
+                raise RuntimeError(f"Partitioned {_TABLE} needs MySQL; configured dialect is {engine.dialect.name}")
+            # DDL commits implicitly in MySQL; autocommit keeps the reads in
+            # between from pinning an old snapshot.
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                if not dry_run:
+                    for table in await _leftover_expired_tables(conn):
+                        stats["purged_rows"] += await self._purge_expired_table(conn, table)
+                partitions = await _partitions(conn)
+                if not partitions:
+                    raise RuntimeError(
+                        f"{_TABLE} is not partitioned; run scripts/rebuild_monitor_records.py "
+                        "--partitioned or --partition-in-place first"
+                    )
+                await self._create_ahead(conn, partitions, now, stats, dry_run)
+                await self._drop_expired(conn, partitions, now, stats, dry_run)
+                stats["partitions"] = await _partitions(conn)
+        finally:
+            self._running = False
+
+        if stats["dropped"] and not dry_run:
+            await self._reset_change_log()
+        stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        stats["dry_run"] = dry_run
+        self.last_run = {"finished_at": datetime.utcnow().isoformat(), **stats}
+        return stats
+
+    async def _create_ahead(
+        self, conn: AsyncConnection, partitions: list[dict], now: datetime, stats: dict, dry_run: bool
+    ) -> None:
+        months = [month for month in (_month_of(item["name"]) for item in partitions) if month]
+        last_wanted = add_months(month_start(now), max(0, config.MONITOR_PARTITION_MONTHS_AHEAD))
+        month = add_months(max(months), 1) if months else month_start(now)
+        missing: list[date] = []
+        while month <= last_wanted:
+            missing.append(month)
+            month = add_months(month, 1)
+        if not missing:
+            return
+        stats["created"] = [partition_name(month) for month in missing]
+        if not dry_run:
+            await conn.execute(
+                text(
+                    f"ALTER TABLE `{_TABLE}` REORGANIZE PARTITION `{FUTURE_PARTITION}` "
+                    f"INTO ({_definitions(missing)})"
+                )
+            )
+
+    async def _drop_expired(
+        self, conn: AsyncConnection, partitions: list[dict], now: datetime, stats: dict, dry_run: bool
+    ) -> None:
+        if config.MONITOR_RECORD_RETENTION_DAYS <= 0:
+            return
+        cutoff = now - timedelta(days=config.MONITOR_RECORD_RETENTION_DAYS)
+        for item in partitions:
+            month = _month_of(item["name"])
+            # Only months whose every row is past the retention.
+            if month is None or datetime.combine(add_months(month, 1), datetime.min.time()) > cutoff:
+                continue
+            stats["dropped"].append({"partition": item["name"], "approx_rows": item["approx_rows"]})
+            if dry_run:
+                continue
+            expired_table = f"{_EXPIRED_PREFIX}{item['name']}"
+            await conn.execute(text(f"CREATE TABLE `{expired_table}` LIKE `{_TABLE}`"))
+            await conn.execute(text(f"ALTER TABLE `{expired_table}` REMOVE PARTITIONING"))
+            await conn.execute(
+                text(f"ALTER TABLE `{_TABLE}` EXCHANGE PARTITION `{item['name']}` WITH TABLE `{expired_table}`")
+            )
+            await conn.execute(text(f"ALTER TABLE `{_TABLE}` DROP PARTITION `{item['name']}`"))
+            stats["purged_rows"] += await self._purge_expired_table(conn, expired_table)
+
+    async def _purge_expired_table(self, conn: AsyncConnection, table: str) -> int:
+        # The rows are already out of monitor_records; delete their images a
+        # chunk at a time, then the table.
+        purged = 0
+        last_id = 0
+        while True:
+            rows = (
+                await conn.execute(
+                    text(
+                        f"SELECT id, scene_image_path FROM `{table}` WHERE id > :last_id ORDER BY id LIMIT :limit"
+                    ),
+                    {"last_id": last_id, "limit": _EXPIRED_CHUNK_SIZE},
+                )
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            await asyncio.to_thread(_delete_images, [row[1] for row in rows])
+            purged += len(rows)
+        await conn.execute(text(f"DROP TABLE `{table}`"))
+        return purged
+
+    async def _reset_change_log(self) -> None:
+        # Pruning the log below the newest entry makes every older delta
+        # cursor come back with reset=True; live sockets get a reset message.
+        async with get_session_factory()() as db:
+            latest = await current_change_cursor(db)
+            await db.execute(delete(MonitorRecordChange).where(MonitorRecordChange.id < latest))
+            await db.commit()
+        await record_change_hub.publish_reset(latest)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": config.MONITOR_RECORDS_PARTITIONED,
+            "running": self._running,
+            "months_ahead": config.MONITOR_PARTITION_MONTHS_AHEAD,
+            "retention_days": config.MONITOR_RECORD_RETENTION_DAYS,
+            "last_run": self.last_run,
+        }
+
+
+record_partition_maintainer = RecordPartitionMaintainer()
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import io
+import json
+import math
+
+from PIL import Image, UnidentifiedImageError
+
+import config
+
+
+_MOSAIC_GAP_PX = 8
+_MOSAIC_BACKGROUND = (128, 128, 128)
+_JPEG_QUALITY = 90
+
+
+def parse_detection_metadata(raw: str | None) -> dict | None:
+    # The uploader's "metadata" form field: {"boxes": [[x1, y1, x2, y2], ...],
+    # "confidences": [...], "label", "source_id", ...}. Raises ValueError.
+    if raw is None or not raw.strip():
+        return None
+    try:
+        metadata = json.loads(raw)
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"metadata 不是合法的 JSON: {exc.msg}") from exc
+    if not isinstance(metadata, dict):
+        raise ValueError("metadata 必须是 JSON 对象")
+
+    boxes: list[list[float]] = []
+    for box in metadata.get("boxes") or []:
+        if not isinstance(box, (list, tuple)) or len(box) != 4:
+            raise ValueError("metadata.boxes 的每一项必须是 [x1, y1, x2, y2]")
+        try:
+            boxes.append([float(value) for value in box])
+        except (TypeError, ValueError) as exc:
+            raise ValueError("metadata.boxes 只能包含数字") from exc
+
+    confidences: list[float | None] = []
+    for value in metadata.get("confidences") or []:
+        try:
+            confidences.append(float(value))
+        except (TypeError, ValueError):
+            confidences.append(None)
+    confidences = (confidences + [None] * len(boxes))[: len(boxes)]
+
+    metadata["boxes"] = boxes
+    metadata["confidences"] = confidences
+    return metadata
+
+
+def _padded_region(box: list[float], width: int, height: int) -> tuple[int, int, int, int] | None:
+    x1, y1, x2, y2 = box
+    x1, x2 = sorted((max(0.0, x1), min(float(width), x2)))
+    y1, y2 = sorted((max(0.0, y1), min(float(height), y2)))
+    if x2 - x1 < 1 or y2 - y1 < 1:
+        return None
+    # Context around the box lets the model tell fire from lamps and reflections.
+    pad = max(config.DETECT_REGION_MIN_PADDING_PX, config.DETECT_REGION_PADDING * max(x2 - x1, y2 - y1))
+    return (
+        max(0, int(x1 - pad)),
+        max(0, int(y1 - pad)),
+        min(width, int(math.ceil(x2 + pad))),
+        min(height, int(math.ceil(y2 + pad))),
+    )
+
+
+def _union_area(regions: list[tuple[int, int, int, int]]) -> int:
+    # Exact union on the compressed grid of region edges; a handful of regions.
+    xs = sorted({x for region in regions for x in (region[0], region[2])})
+    ys = sorted({y for region in regions for y in (region[1], region[3])})
+    area = 0
+    for x1, x2 in zip(xs, xs[1:]):
+        for y1, y2 in zip(ys, ys[1:]):
+            if any(r[0] <= x1 and x2 <= r[2] and r[1] <= y1 and y2 <= r[3] for r in regions):
+                area += (x2 - x1) * (y2 - y1)
+    return area
+
+
+def _fit(image: Image.Image) -> Image.Image:
+    max_side = config.DETECT_REGION_MAX_SIDE
+    if max(image.size) <= max_side:
+        return image
+    scale = max_side / max(image.size)
+    return image.resize(
+        (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+        Image.Resampling.LANCZOS,
+    )
+
+
+def _encode_jpeg(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=_JPEG_QUALITY)
+    return buffer.getvalue()
+
+
+def _build_mosaic(crops: list[Image.Image]) -> Image.Image:
+    columns = math.ceil(math.sqrt(len(crops)))
+    rows = math.ceil(len(crops) / columns)
+    cell_w = max(crop.width for crop in crops)
+    cell_h = max(crop.height for crop in crops)
+    mosaic = Image.new(
+        "RGB",
+        (columns * cell_w + (columns - 1) * _MOSAIC_GAP_PX, rows * cell_h + (rows - 1) * _MOSAIC_GAP_PX),
+        _MOSAIC_BACKGROUND,
+    )
+    for index, crop in enumerate(crops):
+        row, column = divmod(index, columns)
+        left = column * (cell_w + _MOSAIC_GAP_PX) + (cell_w - crop.width) // 2
+        top = row * (cell_h + _MOSAIC_GAP_PX) + (cell_h - crop.height) // 2
+        mosaic.paste(crop, (left, top))
+    return mosaic
+
+
+def build_model_images(
+    image_bytes: bytes,
+    mime_type: str,
+    detections: dict | None,
+) -> tuple[list[tuple[bytes, str]], str, tuple[int, int] | None]:
+    # Returns (images for the vision model, "full" | "crops" | "mosaic", frame size).
+    # Anything unusable (no boxes, undecodable frame, crops covering most of the
+    # frame) falls back to the full frame.
+    full = [(image_bytes, mime_type)]
+    boxes = (detections or {}).get("boxes") or []
+    if config.DETECT_REGION_MODE not in {"crops", "mosaic"} or not boxes:
+        return full, "full", None
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as opened:
+            frame = opened.convert("RGB")
+    except (UnidentifiedImageError, OSError):
+        return full, "full", None
+    size = frame.size
+
+    confidences = detections.get("confidences") or [None] * len(boxes)
+    ranked = sorted(
+        zip(boxes, confidences),
+        key=lambda item: item[1] if item[1] is not None else 0.0,
+        reverse=True,
+    )[: max(1, config.DETECT_REGION_MAX_COUNT)]
+    regions = [region for box, _ in ranked if (region := _padded_region(box, *size)) is not None]
+    if not regions:
+        return full, "full", size
+    if _union_area(regions) >= config.DETECT_REGION_MAX_AREA_RATIO * size[0] * size[1]:
+        return full, "full", size
+
+    crops = [_fit(frame.crop(region)) for region in regions]
+    if config.DETECT_REGION_MODE == "crops":
+        return [(_encode_jpeg(crop), "image/jpeg") for crop in crops], "crops", size
+    return [(_encode_jpeg(_build_mosaic(crops)), "image/jpeg")], "mosaic", size
@@ -31,7 +31,15 @@ class ScriptUploaderProcessManager:
             str(config.SCRIPT_UPLOADER_MIN_UPLOAD_INTERVAL),
             "--timeout",
             str(config.SCRIPT_UPLOADER_TIMEOUT),
+            "--workers",
+            str(config.SCRIPT_UPLOADER_WORKERS),
+            "--queue-size",
+            str(config.SCRIPT_UPLOADER_QUEUE_SIZE),
         ]
+        if config.SCRIPT_UPLOADER_LATEST_ONLY:
+            cmd.append("--latest-only")
+        if config.SCRIPT_UPLOADER_FRAME_SOCKET:
+            cmd.extend(["--frame-socket", config.SCRIPT_UPLOADER_FRAME_SOCKET])
         return cmd
 
     def start(self) -> None:
@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import os
+import re
+import struct
+import zlib
+from pathlib import Path
+from threading import Condition, Lock
+
+import config
+
+
+# Segment record: magic, name length, data length, crc32(data), then the name
+# and the image bytes. Records are self-describing so a lost index.log can be
+# rebuilt from the segments alone.
+_RECORD_HEADER = struct.Struct("<4sHII")
+_RECORD_MAGIC = b"FIMG"
+# Index log entry: op, name length, segment, data offset, data length, then the
+# name. Replayed in order at startup; a torn tail from a crash is ignored.
+_INDEX_ENTRY = struct.Struct("<BHIQI")
+_OP_PUT = 1
+_OP_DELETE = 2
+
+_SEGMENT_NAME = re.compile(r"^seg-(\d{6})\.dat$")
+
+
+class SegmentImageStore:
+    # Append-only image store: frames go into large segment files instead of
+    # one small file each. `_index` maps the image file name (what
+    # scene_image_path and the /static/data-image URL already carry) to
+    # (segment, offset, length), so callers keep using names.
+    #
+    # Deletes only drop the index entry; compact() copies the live images of
+    # mostly-dead sealed segments forward and removes those segments.
+    def __init__(self, directory: Path, *, max_segment_bytes: int, fsync: bool = False) -> None:
+        self._directory = directory
+        self._max_segment_bytes = max(1, max_segment_bytes)
+        self._fsync = fsync
+        self._lock = Lock()
+        # close() sets _stopping and waits on _compaction_done until no
+        # compaction is in flight, so none ever touches a closed file.
+        self._stopping = False
+        self._compactions = 0
+        self._compaction_done = Condition(self._lock)
+        self._loaded = False
+        self._index: dict[str, tuple[int, int, int]] = {}
+        # segment -> bytes of records still referenced by the index
+        self._live_bytes: dict[int, int] = {}
+        self._segment_sizes: dict[int, int] = {}
+        self._active: int | None = None
+        self._active_file = None
+        self._index_file = None
+
+    @property
+    def _index_path(self) -> Path:
+        return self._directory / "index.log"
+
+    def _segment_path(self, segment: int) -> Path:
+        return self._directory / f"seg-{segment:06d}.dat"
+
+    @staticmethod
+    def _record_size(name: str, length: int) -> int:
+        return _RECORD_HEADER.size + len(name.encode("utf-8")) + length
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._directory.mkdir(parents=True, exist_ok=True)
+        for path in self._directory.iterdir():
+            match = _SEGMENT_NAME.match(path.name)
+            if match:
+                self._segment_sizes[int(match.group(1))] = path.stat().st_size
+        if self._index_path.exists():
+            valid_length = self._replay_index()
+            # Cut a torn tail off before appending, or every entry written
+            # after it would be misparsed on the next load.
+            if valid_length < self._index_path.stat().st_size:
+                with open(self._index_path, "r+b") as handle:
+                    handle.truncate(valid_length)
+        elif self._segment_sizes:
+            self._rebuild_from_segments()
+        self._index_file = open(self._index_path, "ab")
+        self._open_active(max(self._segment_sizes, default=1))
+        self._loaded = True
+
+    def _replay_index(self) -> int:
+        # Returns the length of the intact prefix of index.log.
+        data = self._index_path.read_bytes()
+        position = 0
+        while position + _INDEX_ENTRY.size <= len(data):
+            op, name_length, segment, offset, length = _INDEX_ENTRY.unpack_from(data, position)
+            end = position + _INDEX_ENTRY.size + name_length
+            if end > len(data) or op not in (_OP_PUT, _OP_DELETE):
+                break
+            try:
+                name = data[position + _INDEX_ENTRY.size : end].decode("utf-8")
+            except UnicodeDecodeError:
+                break
+            position = end
+            if op == _OP_PUT:
+                self._set_location(name, (segment, offset, length))
+            else:
+                self._drop_location(name)
+        return position
+
+    def _rebuild_from_segments(self) -> None:
+        # Recovery path when index.log is lost: the last copy of each name wins.
+        # Images deleted since they were written come back until deleted again.
+        for segment in sorted(self._segment_sizes):
+            with open(self._segment_path(segment), "rb") as handle:
+                position = 0
+                while True:
+                    header = handle.read(_RECORD_HEADER.size)
+                    if len(header) < _RECORD_HEADER.size:
+                        break
+                    magic, name_length, length, _ = _RECORD_HEADER.unpack(header)
+                    if magic != _RECORD_MAGIC:
+                        break
+                    name = handle.read(name_length).decode("utf-8")
+                    data_offset = position + _RECORD_HEADER.size + name_length
+                    handle.seek(length, os.SEEK_CUR)
+                    position = data_offset + length
+                    self._set_location(name, (segment, data_offset, length))
+        with open(self._index_path, "wb") as handle:
+            for name, location in self._index.items():
+                handle.write(self._index_entry(_OP_PUT, name, location))
+
+    def _set_location(self, name: str, location: tuple[int, int, int]) -> None:
+        self._drop_location(name)
+        self._index[name] = location
+        self._live_bytes[location[0]] = self._live_bytes.get(location[0], 0) + self._record_size(
+            name, location[2]
+        )
+
+    def _drop_location(self, name: str) -> tuple[int, int, int] | None:
+        location = self._index.pop(name, None)
+        if location is not None:
+            self._live_bytes[location[0]] -= self._record_size(name, location[2])
+        return location
+
+    @staticmethod
+    def _index_entry(op: int, name: str, location: tuple[int, int, int]) -> bytes:
+        encoded = name.encode("utf-8")
+        return _INDEX_ENTRY.pack(op, len(encoded), *location) + encoded
+
+    def _open_active(self, segment: int) -> None:
+        self._active = segment
+        self._active_file = open(self._segment_path(segment), "ab")
+        self._segment_sizes.setdefault(segment, self._active_file.tell())
+
+    def _seal_active(self) -> None:
+        self._active_file.flush()
+        os.fsync(self._active_file.fileno())
+        self._active_file.close()
+        self._open_active(self._active + 1)
+
+    def _append(self, name: str, data: bytes) -> tuple[int, int, int]:
+        # Caller holds the lock.
+        if self._segment_sizes[self._active] >= self._max_segment_bytes:
+            self._seal_active()
+        encoded = name.encode("utf-8")
+        offset = self._segment_sizes[self._active]
+        self._active_file.write(_RECORD_HEADER.pack(_RECORD_MAGIC, len(encoded), len(data), zlib.crc32(data)))
+        self._active_file.write(encoded)
+        self._active_file.write(data)
+        self._active_file.flush()
+        self._segment_sizes[self._active] = offset + self._record_size(name, len(data))
+        location = (self._active, offset + _RECORD_HEADER.size + len(encoded), len(data))
+        # The index entry goes after the data: a crash in between only leaves
+        # unreferenced bytes for the compactor.
+        self._index_file.write(self._index_entry(_OP_PUT, name, location))
+        self._index_file.flush()
+        self._set_location(name, location)
+        return location
+
+    def _sync(self) -> None:
+        # Caller holds the lock. Data first, so a synced index entry never
+        # points at bytes that were lost.
+        os.fsync(self._active_file.fileno())
+        os.fsync(self._index_file.fileno())
+
+    def put(self, name: str, data: bytes) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            self._append(name, data)
+            if self._fsync:
+                self._sync()
+
+    def delete(self, name: str) -> bool:
+        if not self._loaded and not self._directory.exists():
+            return False
+        with self._lock:
+            self._ensure_loaded()
+            location = self._drop_location(name)
+            if location is None:
+                return False
+            self._index_file.write(self._index_entry(_OP_DELETE, name, location))
+            self._index_file.flush()
+            if self._fsync:
+                os.fsync(self._index_file.fileno())
+            return True
+
+    def open(self, name: str) -> tuple[int, int, int] | None:
+        # (fd, offset, length) for serving or reading; the caller closes fd.
+        # An open fd keeps working even if the compactor removes the segment.
+        if not self._loaded and not self._directory.exists():
+            return None
+        for _ in range(2):
+            with self._lock:
+                self._ensure_loaded()
+                location = self._index.get(name)
+            if location is None:
+                return None
+            segment, offset, length = location
+            try:
+                return os.open(self._segment_path(segment), os.O_RDONLY), offset, length
+            except FileNotFoundError:
+                # Moved by the compactor between lookup and open: look again.
+                continue
+        return None
+
+    def read(self, name: str) -> bytes | None:
+        opened = self.open(name)
+        if opened is None:
+            return None
+        fd, offset, length = opened
+        try:
+            return os.pread(fd, length, offset)
+        finally:
+            os.close(fd)
+
+    def compact(self, garbage_ratio: float) -> dict:
+        # Sealed segments with at least `garbage_ratio` unreferenced bytes have
+        # their live images appended to the active segment, then are removed.
+        # Images are moved one at a time so puts and reads are never held up
+        # for a whole segment. Stops early, removing nothing, when close()
+        # is called; the images moved so far are already in the index log.
+        stats = {"segments": 0, "moved": 0, "reclaimed_bytes": 0}
+        with self._lock:
+            if self._stopping:
+                return stats
+            self._ensure_loaded()
+            candidates = [
+                segment
+                for segment, size in self._segment_sizes.items()
+                if segment != self._active
+                and size > 0
+                and 1 - self._live_bytes.get(segment, 0) / size >= garbage_ratio
+            ]
+            stats["segments"] = len(candidates)
+            if not candidates:
+                return stats
+            self._compactions += 1
+
+        try:
+            for segment in candidates:
+                with self._lock:
+                    if self._stopping:
+                        return stats
+                    names = [name for name, location in self._index.items() if location[0] == segment]
+                with open(self._segment_path(segment), "rb") as handle:
+                    for name in names:
+                        with self._lock:
+                            if self._stopping:
+                                return stats
+                            location = self._index.get(name)
+                            if location is None or location[0] != segment:
+                                continue
+                            self._append(name, os.pread(handle.fileno(), location[2], location[1]))
+                        stats["moved"] += 1
+
+            with self._lock:
+                if self._stopping:
+                    return stats
+                self._active_file.flush()
+                os.fsync(self._active_file.fileno())
+                self._rewrite_index()
+                for segment in candidates:
+                    stats["reclaimed_bytes"] += self._segment_sizes.pop(segment, 0)
+                    self._live_bytes.pop(segment, None)
+                    self._segment_path(segment).unlink(missing_ok=True)
+            return stats
+        finally:
+            with self._lock:
+                self._compactions -= 1
+                self._compaction_done.notify_all()
+
+    def _rewrite_index(self) -> None:
+        # Caller holds the lock. Also drops the delete entries from the log.
+        temp_path = self._index_path.with_suffix(".tmp")
+        with open(temp_path, "wb") as handle:
+            for name, location in self._index.items():
+                handle.write(self._index_entry(_OP_PUT, name, location))
+            handle.flush()
+            os.fsync(handle.fileno())
+        self._index_file.close()
+        os.replace(temp_path, self._index_path)
+        self._index_file = open(self._index_path, "ab")
+
+    def snapshot(self) -> dict:
+        if not self._loaded and not self._directory.exists():
+            return {"images": 0, "segments": []}
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                "images": len(self._index),
+                "active_segment": self._active,
+                "segments": [
+                    {
+                        "segment": segment,
+                        "bytes": size,
+                        "live_bytes": self._live_bytes.get(segment, 0),
+                    }
+                    for segment, size in sorted(self._segment_sizes.items())
+                ],
+            }
+
+    def close(self) -> None:
+        # Blocks until an in-flight compact() has seen _stopping and returned.
+        with self._lock:
+            self._stopping = True
+            try:
+                while self._compactions:
+                    self._compaction_done.wait()
+                if not self._loaded:
+                    return
+                self._active_file.close()
+                self._index_file.close()
+                self._loaded = False
+                self._index.clear()
+                self._live_bytes.clear()
+                self._segment_sizes.clear()
+            finally:
+                self._stopping = False
+
+
+segment_image_store = SegmentImageStore(
+    Path(__file__).resolve().parents[1] / config.DATA_IMAGE_DIR / "segments",
+    max_segment_bytes=config.IMAGE_SEGMENT_MAX_BYTES,
+    fsync=config.IMAGE_SEGMENT_FSYNC,
+)
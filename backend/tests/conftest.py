@@ -0,0 +1,35 @@
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Before config is imported: never run the tests against a configured MySQL.
+_TMP_DIR = tempfile.mkdtemp(prefix="fire-backend-tests-")
+os.environ["MYSQL_URL"] = f"sqlite+aiosqlite:///{_TMP_DIR}/test.db"
+os.environ["DATA_IMAGE_DIR"] = f"{_TMP_DIR}/data_image"
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture
+def run_db():
+    # Runs an async function against freshly created tables on its own loop.
+    from database import Base, dispose_engines, get_engine
+    from models import data_monitor  # noqa: F401
+
+    def run(function, *args, **kwargs):
+        async def main():
+            async with get_engine().begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+                await conn.run_sync(Base.metadata.create_all)
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                await dispose_engines()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+from services.detection_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_MANUAL,
+    DetectionQueueFull,
+    DetectionScheduler,
+)
+
+
+def _scheduler(concurrency=1, weights=None, max_queue_per_source=0):
+    return DetectionScheduler(concurrency, weights=weights or {}, max_queue_per_source=max_queue_per_source)
+
+
+def test_idle_sources_are_forgotten():
+    scheduler = _scheduler()
+
+    async def run():
+        release = asyncio.Event()
+
+        async def hold(source):
+            async with scheduler.slot(source, PRIORITY_BACKGROUND):
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold(f"cam{index}")) for index in range(50)]
+        await asyncio.sleep(0)
+        assert len(scheduler.snapshot()["sources"]) == 50
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert scheduler.snapshot()["sources"] == []
+
+
+def test_source_keys_are_capped():
+    scheduler = _scheduler()
+
+    async def run():
+        async with scheduler.slot("x" * 500, PRIORITY_BACKGROUND):
+            return scheduler.snapshot()["sources"][0]["source"]
+
+    assert asyncio.run(run()) == "x" * 64
+
+
+def _admission_order(scheduler, requests):
+    # Holds the single slot while `requests` ((source, priority) pairs) queue
+    # up in order, then returns the order in which they were admitted.
+    order = []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def blocker():
+            async with scheduler.slot("blocker", PRIORITY_BACKGROUND):
+                await release.wait()
+
+        async def request(source, priority):
+            async with scheduler.slot(source, priority):
+                order.append(source)
+
+        tasks = [asyncio.create_task(blocker())]
+        await asyncio.sleep(0)
+        for source, priority in requests:
+            tasks.append(asyncio.create_task(request(source, priority)))
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    return order
+
+
+def test_sources_share_slots_fairly():
+    order = _admission_order(_scheduler(), [("a", PRIORITY_BACKGROUND)] * 4 + [("b", PRIORITY_BACKGROUND)] * 2)
+    assert order == ["a", "b", "a", "b", "a", "a"]
+
+
+def test_weights_set_each_source_share():
+    order = _admission_order(
+        _scheduler(weights={"a": 2.0}), [("a", PRIORITY_BACKGROUND)] * 4 + [("b", PRIORITY_BACKGROUND)] * 2
+    )
+    # Start tags: a at 0, 0.5, 1, 1.5; b at 0, 1.
+    assert order == ["a", "b", "a", "a", "b", "a"]
+
+
+def test_manual_requests_go_ahead_of_queued_background_work():
+    order = _admission_order(
+        _scheduler(), [("a", PRIORITY_BACKGROUND)] * 2 + [("manual", PRIORITY_MANUAL), ("b", PRIORITY_BACKGROUND)]
+    )
+    assert order[0] == "manual"
+
+
+def test_background_source_over_its_queue_cap_is_rejected():
+    scheduler = _scheduler(max_queue_per_source=2)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def request(source):
+            async with scheduler.slot(source, PRIORITY_BACKGROUND):
+                await release.wait()
+
+        tasks = [asyncio.create_task(request("a")) for _ in range(3)]
+        await asyncio.sleep(0)
+        with pytest.raises(DetectionQueueFull) as excinfo:
+            async with scheduler.slot("a", PRIORITY_BACKGROUND):
+                pass
+        # Manual work is never rejected: it queues.
+        manual = asyncio.create_task(request_manual())
+        await asyncio.sleep(0)
+        assert not manual.done()
+        release.set()
+        await asyncio.gather(*tasks, manual)
+        return excinfo.value
+
+    async def request_manual():
+        async with scheduler.slot("a", PRIORITY_MANUAL):
+            pass
+
+    error = asyncio.run(run())
+    assert error.source == "a" and error.retry_after > 0
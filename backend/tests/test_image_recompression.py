@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+import config
+from database import get_session_factory
+from models.data_monitor import MonitorRecord
+from services.image_recompression import image_recompressor
+
+
+def test_each_record_is_examined_by_one_tier_only(run_db, monkeypatch):
+    monkeypatch.setattr(
+        config,
+        "IMAGE_RECOMPRESS_TIERS",
+        [
+            {"after_days": 7.0, "quality": 70, "max_side": 0},
+            {"after_days": 30.0, "quality": 50, "max_side": 0},
+        ],
+    )
+    monkeypatch.setattr(config, "IMAGE_RECOMPRESS_KEEP_FIRE_ORIGINALS", False)
+    now = datetime.utcnow()
+
+    async def scenario():
+        async with get_session_factory()() as db:
+            for days in (1, 10, 40, 400):
+                db.add(
+                    MonitorRecord(
+                        scene_image_path=f"missing-{days}.jpg",
+                        status="无火灾",
+                        remark="",
+                        created_at=now - timedelta(days=days),
+                        updated_at=now - timedelta(days=days),
+                    )
+                )
+            await db.commit()
+        return await image_recompressor.run_pass(dry_run=True)
+
+    stats = run_db(scenario)
+    # 10 days old: tier 1; 40 and 400 days old: tier 2 only.
+    assert stats["examined"] == 3
+    assert stats["missing"] == 3
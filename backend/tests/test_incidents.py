@@ -0,0 +1,34 @@
+import asyncio
+import gc
+
+from services.incidents import IncidentTracker
+
+
+def test_source_locks_are_not_kept_after_use():
+    tracker = IncidentTracker()
+
+    async def run():
+        for index in range(100):
+            async with tracker._lock_for(f"cam{index}"):
+                pass
+
+    asyncio.run(run())
+    gc.collect()
+    assert len(tracker._locks) == 0
+
+
+def test_waiters_share_the_source_lock():
+    tracker = IncidentTracker()
+    inside = []
+
+    async def critical(tag):
+        async with tracker._lock_for("cam0"):
+            inside.append(tag)
+            assert len(inside) == 1
+            await asyncio.sleep(0.01)
+            inside.remove(tag)
+
+    async def run():
+        await asyncio.gather(*(critical(index) for index in range(5)))
+
+    asyncio.run(run())
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from database import get_session_factory
+from models.data_monitor import MonitorRecord
+from models.schemas import MonitorRecordFilters
+from routers import data_monitor_router
+from services.monitor_records import (
+    CHANGE_UPSERT,
+    _decode_page_cursor,
+    _encode_page_cursor,
+    log_record_changes,
+    query_monitor_records,
+)
+
+_START = datetime(2024, 5, 1, 12, 0, 0)
+
+
+def _record(record_id, minutes, status="无火灾", remark=""):
+    created_at = _START + timedelta(minutes=minutes)
+    return MonitorRecord(
+        id=record_id,
+        scene_image_path=f"{record_id}.jpg",
+        status=status,
+        remark=remark,
+        created_at=created_at,
+        updated_at=created_at,
+    )
+
+
+@pytest.mark.parametrize(
+    ("sort_by", "expected"),
+    [
+        ("created_at", datetime(2024, 5, 1, 12, 0, 0, 250000)),
+        ("id", 42),
+        ("remark", "厨房 \"灶台\""),
+    ],
+)
+def test_page_cursor_round_trip(sort_by, expected):
+    record = MonitorRecord(id=42, created_at=datetime(2024, 5, 1, 12, 0, 0, 250000), remark="厨房 \"灶台\"")
+    token = _encode_page_cursor(record, sort_by)
+    assert "=" not in token
+    assert _decode_page_cursor(token, sort_by) == (expected, 42)
+
+
+@pytest.mark.parametrize("token", ["", "not-base64!", "WzEsMl0", "WyJ4IiwgInkiXQ"])
+def test_bad_page_cursor_is_rejected(token):
+    # "WzEsMl0" is [1,2] (not a datetime), "WyJ4IiwgInkiXQ" is ["x", "y"] (id not an int).
+    with pytest.raises(ValueError):
+        _decode_page_cursor(token, "created_at")
+
+
+@pytest.mark.parametrize(("sort_by", "sort_order"), [("created_at", "desc"), ("created_at", "asc"), ("status", "desc")])
+def test_keyset_pages_cover_the_list_once(run_db, sort_by, sort_order):
+    async def scenario():
+        async with get_session_factory()() as db:
+            # Ties on created_at and status exercise the id tie-break.
+            db.add_all(
+                _record(record_id, minutes=record_id // 3, status="发生火灾" if record_id % 2 else "无火灾")
+                for record_id in range(1, 11)
+            )
+            await db.commit()
+            filters = MonitorRecordFilters()
+            full, _ = await query_monitor_records(db, filters, sort_by=sort_by, sort_order=sort_order)
+            paged, after = [], None
+            while True:
+                rows, after = await query_monitor_records(
+                    db, filters, sort_by=sort_by, sort_order=sort_order, limit=3, after=after
+                )
+                paged.extend(rows)
+                if after is None:
+                    return [row.id for row in full], [row.id for row in paged]
+
+    full, paged = run_db(scenario)
+    assert len(full) == 10
+    assert paged == full
+
+
+def test_list_etag_answers_304_until_a_record_changes(run_db):
+    app = FastAPI()
+    app.include_router(data_monitor_router)
+
+    async def scenario():
+        async with get_session_factory()() as db:
+            db.add(_record(1, minutes=0))
+            log_record_changes(db, [1], CHANGE_UPSERT)
+            await db.commit()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = await client.get("/api/data-monitor/records")
+            etag = first.headers["ETag"]
+            cached = await client.get("/api/data-monitor/records", headers={"If-None-Match": etag})
+
+            async with get_session_factory()() as db:
+                db.add(_record(2, minutes=1))
+                log_record_changes(db, [2], CHANGE_UPSERT)
+                await db.commit()
+            changed = await client.get("/api/data-monitor/records", headers={"If-None-Match": etag})
+        return first, cached, changed
+
+    first, cached, changed = run_db(scenario)
+    assert first.status_code == 200 and [row["id"] for row in first.json()] == [1]
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["ETag"] == first.headers["ETag"]
+    assert changed.status_code == 200 and [row["id"] for row in changed.json()] == [2, 1]
+    assert changed.headers["ETag"] != first.headers["ETag"]
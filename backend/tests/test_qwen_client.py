@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import config
+from services import qwen_client
+from services.qwen_pool import QwenEndpoint, QwenEndpointPool
+from utils import parse_fire_result
+
+
+def _endpoint(name):
+    return QwenEndpoint(name=name, api_url=f"http://{name}.invalid", api_key="key", model="m", weight=1.0)
+
+
+@pytest.fixture
+def endpoints(monkeypatch):
+    endpoints = [_endpoint("a"), _endpoint("b")]
+    monkeypatch.setattr(config, "QWEN_ENDPOINTS", [{"api_key": "key"}])
+    monkeypatch.setattr(qwen_client, "qwen_endpoint_pool", QwenEndpointPool(endpoints, strategy="least_outstanding"))
+    return endpoints
+
+
+@pytest.mark.parametrize(
+    "error", [ValueError("not json"), HTTPException(status_code=502, detail="Qwen returned empty text.")]
+)
+def test_unusable_reply_fails_over_to_the_next_endpoint(endpoints, monkeypatch, error):
+    calls = []
+
+    async def request(client, endpoint, *args):
+        calls.append(endpoint.name)
+        if len(calls) == 1:
+            raise error
+        return '{"fire": true}'
+
+    monkeypatch.setattr(qwen_client, "_request_text", request)
+    assert asyncio.run(qwen_client.call_qwen(b"jpeg", "image/jpeg")) == '{"fire": true}'
+    assert len(calls) == 2 and calls[0] != calls[1]
+    assert [endpoint.outstanding for endpoint in endpoints] == [0, 0]
+    assert sorted(endpoint.total_failures for endpoint in endpoints) == [0, 1]
+
+
+def test_every_endpoint_unusable_is_a_502(endpoints, monkeypatch):
+    async def request(*args):
+        raise ValueError("not json")
+
+    monkeypatch.setattr(qwen_client, "_request_text", request)
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(qwen_client.call_qwen(b"jpeg", "image/jpeg"))
+    assert excinfo.value.status_code == 502
+    assert [endpoint.outstanding for endpoint in endpoints] == [0, 0]
+
+
+def test_cancelled_request_releases_without_a_failure(endpoints, monkeypatch):
+    async def request(*args):
+        raise asyncio.CancelledError()
+
+    monkeypatch.setattr(qwen_client, "_request_text", request)
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(qwen_client.call_qwen(b"jpeg", "image/jpeg"))
+    assert [endpoint.outstanding for endpoint in endpoints] == [0, 0]
+    # Cancellation says nothing about the endpoint's health.
+    assert [endpoint.total_failures for endpoint in endpoints] == [0, 0]
+
+
+def _sse(*contents):
+    events = [
+        "data: " + json.dumps({"choices": [{"delta": {"content": content}}]}) + "\n\n" for content in contents
+    ]
+    return "".join(events) + "data: [DONE]\n\n"
+
+
+def test_stream_returns_the_model_text_up_to_the_verdict():
+    endpoint = _endpoint("a")
+
+    def handler(request):
+        body = _sse('{"fi', 're":fal', 'se', ', "reason": "lamp"}')
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await qwen_client._stream(client, endpoint, ["data:,"], "full")
+
+    text = asyncio.run(run())
+    assert text == '{"fire":false'
+    assert parse_fire_result(text) is False
+
+
+def test_empty_stream_fails_over_without_a_plain_retry(endpoints, monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append((request.url.host, json.loads(request.content).get("stream", False)))
+        if request.url.host == "a.invalid":
+            return httpx.Response(200, text=_sse(""), headers={"Content-Type": "text/event-stream"})
+        return httpx.Response(200, text=_sse('{"fire": true}'), headers={"Content-Type": "text/event-stream"})
+
+    transport = httpx.MockTransport(handler)
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(config, "QWEN_STREAM", True)
+    monkeypatch.setattr(qwen_client.httpx, "AsyncClient", lambda **kwargs: real_client(transport=transport, **kwargs))
+    monkeypatch.setattr(qwen_client, "qwen_endpoint_pool", QwenEndpointPool(endpoints, strategy="least_outstanding"))
+
+    assert asyncio.run(qwen_client.call_qwen(b"jpeg", "image/jpeg")) == '{"fire": true}'
+    # One streamed request per endpoint; the empty one was not repeated.
+    assert sorted(requests) == [("a.invalid", True), ("b.invalid", True)]
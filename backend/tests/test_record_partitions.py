@@ -0,0 +1,81 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+
+import config
+from services.record_partitions import (
+    FUTURE_PARTITION,
+    RecordPartitionMaintainer,
+    add_months,
+    partition_by_clause,
+    partition_name,
+)
+
+
+@pytest.mark.parametrize(
+    ("month", "count", "expected"),
+    [
+        (date(2024, 1, 1), 1, date(2024, 2, 1)),
+        (date(2024, 11, 1), 2, date(2025, 1, 1)),
+        (date(2024, 12, 1), 1, date(2025, 1, 1)),
+        (date(2024, 1, 1), -1, date(2023, 12, 1)),
+        (date(2024, 3, 1), -14, date(2023, 1, 1)),
+    ],
+)
+def test_add_months(month, count, expected):
+    assert add_months(month, count) == expected
+
+
+def test_partition_by_clause_covers_first_month_through_months_ahead(monkeypatch):
+    monkeypatch.setattr(config, "MONITOR_PARTITION_MONTHS_AHEAD", 2)
+    clause = partition_by_clause(date(2024, 10, 17), datetime(2024, 12, 3))
+    assert clause.count("PARTITION `") == 6
+    # Each month partition is bounded by the first day of the next month.
+    assert "PARTITION `p202410` VALUES LESS THAN ('2024-11-01')" in clause
+    assert "PARTITION `p202502` VALUES LESS THAN ('2025-03-01')" in clause
+    assert f"PARTITION `{FUTURE_PARTITION}` VALUES LESS THAN (MAXVALUE)" in clause
+
+
+def _partitions(*months):
+    return [{"name": partition_name(month), "approx_rows": 0} for month in months] + [
+        {"name": FUTURE_PARTITION, "approx_rows": 0}
+    ]
+
+
+def test_missing_months_ahead_are_created(monkeypatch):
+    monkeypatch.setattr(config, "MONITOR_PARTITION_MONTHS_AHEAD", 2)
+    stats = {"created": []}
+    asyncio.run(
+        RecordPartitionMaintainer()._create_ahead(
+            None, _partitions(date(2024, 11, 1), date(2024, 12, 1)), datetime(2024, 12, 20), stats, True
+        )
+    )
+    assert stats["created"] == ["p202501", "p202502"]
+
+
+def test_only_months_entirely_past_retention_are_dropped(monkeypatch):
+    monkeypatch.setattr(config, "MONITOR_RECORD_RETENTION_DAYS", 30)
+    stats = {"dropped": []}
+    asyncio.run(
+        RecordPartitionMaintainer()._drop_expired(
+            None,
+            _partitions(date(2024, 9, 1), date(2024, 10, 1), date(2024, 11, 1)),
+            # Cutoff 2024-10-15: September is entirely older; October is not.
+            datetime(2024, 11, 14),
+            stats,
+            True,
+        )
+    )
+    assert [item["partition"] for item in stats["dropped"]] == ["p202409"]
+
+
+def test_retention_zero_drops_nothing(monkeypatch):
+    monkeypatch.setattr(config, "MONITOR_RECORD_RETENTION_DAYS", 0)
+    stats = {"dropped": []}
+    asyncio.run(
+        RecordPartitionMaintainer()._drop_expired(
+            None, _partitions(date(2000, 1, 1)), datetime(2024, 11, 14), stats, True
+        )
+    )
+    assert stats["dropped"] == []
@@ -0,0 +1,56 @@
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+import app_factory
+from services.segment_store import SegmentImageStore
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    store = SegmentImageStore(tmp_path / "segments", max_segment_bytes=1024 * 1024)
+    store.put("other.jpg", b"xxxxxxxx")
+    store.put("a.jpg", b"0123456789")
+    monkeypatch.setattr(app_factory, "segment_image_store", store)
+    app = Starlette(routes=[Mount("/img", app_factory.DataImageFiles(directory=str(tmp_path)))])
+    with TestClient(app) as test_client:
+        yield test_client
+    store.close()
+
+
+def test_full_image_advertises_ranges(client):
+    response = client.get("/img/a.jpg")
+    assert response.status_code == 200
+    assert response.content == b"0123456789"
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+@pytest.mark.parametrize(
+    ("header", "body", "content_range"),
+    [
+        ("bytes=2-5", b"2345", "bytes 2-5/10"),
+        ("bytes=7-", b"789", "bytes 7-9/10"),
+        ("bytes=-3", b"789", "bytes 7-9/10"),
+        ("bytes=8-100", b"89", "bytes 8-9/10"),
+    ],
+)
+def test_single_range(client, header, body, content_range):
+    response = client.get("/img/a.jpg", headers={"Range": header})
+    assert response.status_code == 206
+    assert response.content == body
+    assert response.headers["content-range"] == content_range
+    assert response.headers["content-length"] == str(len(body))
+
+
+def test_unsatisfiable_range(client):
+    response = client.get("/img/a.jpg", headers={"Range": "bytes=10-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */10"
+
+
+def test_multiple_ranges_and_stale_if_range_get_the_whole_image(client):
+    for headers in ({"Range": "bytes=0-1,4-5"}, {"Range": "bytes=0-1", "If-Range": '"old.jpg"'}):
+        response = client.get("/img/a.jpg", headers=headers)
+        assert response.status_code == 200
+        assert response.content == b"0123456789"
@@ -0,0 +1,73 @@
+import threading
+import time
+
+from services.segment_store import SegmentImageStore
+
+
+def _store(directory, **kwargs):
+    return SegmentImageStore(directory, max_segment_bytes=1024 * 1024, **kwargs)
+
+
+def test_torn_index_tail_is_truncated_before_appending(tmp_path):
+    store = _store(tmp_path)
+    store.put("a.jpg", b"first")
+    store.close()
+
+    # A crash in the middle of an index entry.
+    with open(tmp_path / "index.log", "ab") as handle:
+        handle.write(b"\x01\x05\x00")
+
+    store = _store(tmp_path)
+    store.put("b.jpg", b"second")
+    assert store.read("b.jpg") == b"second"
+    store.close()
+
+    store = _store(tmp_path)
+    assert store.read("a.jpg") == b"first"
+    assert store.read("b.jpg") == b"second"
+    store.close()
+
+
+def test_fsync_store_round_trips(tmp_path):
+    store = _store(tmp_path, fsync=True)
+    store.put("a.jpg", b"data")
+    assert store.delete("a.jpg")
+    store.put("b.jpg", b"more")
+    store.close()
+
+    store = _store(tmp_path, fsync=True)
+    assert store.read("a.jpg") is None
+    assert store.read("b.jpg") == b"more"
+    store.close()
+
+
+def test_close_waits_for_and_stops_an_inflight_compaction(tmp_path):
+    store = SegmentImageStore(tmp_path, max_segment_bytes=64)
+    for index in range(20):
+        store.put(f"{index}.jpg", bytes([index]) * 40)
+    for index in range(0, 20, 2):
+        store.delete(f"{index}.jpg")
+
+    moving = threading.Event()
+    append = store._append
+
+    def slow_append(name, data):
+        moving.set()
+        time.sleep(0.05)
+        return append(name, data)
+
+    store._append = slow_append
+    result = {}
+    compactor = threading.Thread(target=lambda: result.update(store.compact(0.5)))
+    compactor.start()
+    assert moving.wait(5)
+    store.close()
+    compactor.join(5)
+
+    assert not compactor.is_alive()
+    assert result["moved"] >= 1 and result["reclaimed_bytes"] == 0
+
+    store = _store(tmp_path)
+    for index in range(1, 20, 2):
+        assert store.read(f"{index}.jpg") == bytes([index]) * 40
+    store.close()
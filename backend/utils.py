@@ -1,6 +1,10 @@
 from __future__ import annotations
 
 import json
+import re
+
+
+_FIRE_VERDICT_PATTERN = re.compile(r'(?<![a-z_])"?fire"?\s*:\s*(true|false)')
 
 
 def parse_fire_result(text: str) -> bool:
@@ -12,10 +16,17 @@ def parse_fire_result(text: str) -> bool:
     except json.JSONDecodeError:
         pass
 
-    if '"fire": true' in normalized or "fire:true" in normalized:
-        return True
-    if '"fire": false' in normalized or "fire:false" in normalized:
-        return False
+    # Also covers a streamed reply cut short once the verdict was in.
+    verdict = detect_fire_verdict(normalized)
+    if verdict is not None:
+        return verdict
     if "fire" in normalized and "no_fire" not in normalized:
         return True
     return False
+
+
+def detect_fire_verdict(partial_text: str) -> bool | None:
+    match = _FIRE_VERDICT_PATTERN.search(partial_text.lower())
+    if match is None:
+        return None
+    return match.group(1) == "true"
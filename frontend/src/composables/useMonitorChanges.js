@@ -0,0 +1,84 @@
+import { ref } from "vue";
+import { apiBase, getWsBaseUrl } from "../config/api";
+
+export function useMonitorChanges(getCursor, onChanges) {
+  const monitorChangesConnected = ref(false);
+
+  let changesSocket = null;
+  let changesReconnectTimer = null;
+  let changesStopped = true;
+
+  function scheduleChangesReconnect() {
+    if (changesReconnectTimer !== null || changesStopped) {
+      return;
+    }
+    changesReconnectTimer = window.setTimeout(() => {
+      changesReconnectTimer = null;
+      connectMonitorChanges();
+    }, 2000);
+  }
+
+  function connectMonitorChanges() {
+    changesStopped = false;
+    if (
+      changesSocket &&
+      (changesSocket.readyState === WebSocket.OPEN ||
+        changesSocket.readyState === WebSocket.CONNECTING)
+    ) {
+      return;
+    }
+
+    // The server replays everything after `since` before live pushes, so a
+    // reconnect catches up without refetching the list.
+    const cursor = getCursor();
+    const query = cursor === null ? "" : `?since=${cursor}`;
+    const socket = new WebSocket(`${getWsBaseUrl(apiBase)}/ws/data-monitor/changes${query}`);
+    changesSocket = socket;
+
+    socket.onopen = () => {
+      monitorChangesConnected.value = true;
+    };
+
+    socket.onmessage = (event) => {
+      try {
+        const payload = JSON.parse(event.data);
+        if (payload.type === "record_changes") {
+          onChanges(payload);
+        }
+      } catch {
+        // Ignore malformed messages; the next delta sync repairs the view.
+      }
+    };
+
+    socket.onclose = () => {
+      if (changesSocket === socket) {
+        changesSocket = null;
+        monitorChangesConnected.value = false;
+        scheduleChangesReconnect();
+      }
+    };
+
+    socket.onerror = () => {
+      socket.close();
+    };
+  }
+
+  function cleanupMonitorChanges() {
+    changesStopped = true;
+    if (changesSocket) {
+      changesSocket.close();
+      changesSocket = null;
+    }
+    if (changesReconnectTimer !== null) {
+      clearTimeout(changesReconnectTimer);
+      changesReconnectTimer = null;
+    }
+    monitorChangesConnected.value = false;
+  }
+
+  return {
+    monitorChangesConnected,
+    connectMonitorChanges,
+    cleanupMonitorChanges,
+  };
+}
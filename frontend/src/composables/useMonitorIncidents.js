@@ -0,0 +1,104 @@
+import { ref } from "vue";
+import { apiBase, getWsBaseUrl } from "../config/api";
+import { fetchMonitorIncidents } from "../services/fireApi";
+
+const MAX_INCIDENTS = 50;
+
+export function useMonitorIncidents() {
+  const monitorIncidents = ref([]);
+  const monitorIncidentsConnected = ref(false);
+
+  let incidentsSocket = null;
+  let incidentsReconnectTimer = null;
+  let incidentsStopped = true;
+
+  // Messages carry whole incidents in their latest state, so merging is a
+  // replace-by-id.
+  function mergeIncidents(incidents) {
+    const byId = new Map(monitorIncidents.value.map((incident) => [incident.id, incident]));
+    for (const incident of incidents) {
+      byId.set(incident.id, incident);
+    }
+    monitorIncidents.value = [...byId.values()]
+      .sort((a, b) => String(b.last_seen_at).localeCompare(String(a.last_seen_at)) || b.id - a.id)
+      .slice(0, MAX_INCIDENTS);
+  }
+
+  function scheduleIncidentsReconnect() {
+    if (incidentsReconnectTimer !== null || incidentsStopped) {
+      return;
+    }
+    incidentsReconnectTimer = window.setTimeout(() => {
+      incidentsReconnectTimer = null;
+      connectMonitorIncidents();
+    }, 2000);
+  }
+
+  function connectMonitorIncidents() {
+    incidentsStopped = false;
+    if (
+      incidentsSocket &&
+      (incidentsSocket.readyState === WebSocket.OPEN ||
+        incidentsSocket.readyState === WebSocket.CONNECTING)
+    ) {
+      return;
+    }
+
+    const socket = new WebSocket(`${getWsBaseUrl(apiBase)}/ws/data-monitor/incidents`);
+    incidentsSocket = socket;
+
+    socket.onopen = async () => {
+      monitorIncidentsConnected.value = true;
+      // The socket only replays open incidents; recently closed ones come
+      // from the list API.
+      try {
+        mergeIncidents(await fetchMonitorIncidents(apiBase, { limit: MAX_INCIDENTS }));
+      } catch {
+        // Live pushes still arrive; the next reconnect retries the list.
+      }
+    };
+
+    socket.onmessage = (event) => {
+      try {
+        const payload = JSON.parse(event.data);
+        if (payload.type === "incident_changes") {
+          mergeIncidents(payload.changes || []);
+        }
+      } catch {
+        // Ignore malformed messages; the next push carries the full state.
+      }
+    };
+
+    socket.onclose = () => {
+      if (incidentsSocket === socket) {
+        incidentsSocket = null;
+        monitorIncidentsConnected.value = false;
+        scheduleIncidentsReconnect();
+      }
+    };
+
+    socket.onerror = () => {
+      socket.close();
+    };
+  }
+
+  function cleanupMonitorIncidents() {
+    incidentsStopped = true;
+    if (incidentsSocket) {
+      incidentsSocket.close();
+      incidentsSocket = null;
+    }
+    if (incidentsReconnectTimer !== null) {
+      clearTimeout(incidentsReconnectTimer);
+      incidentsReconnectTimer = null;
+    }
+    monitorIncidentsConnected.value = false;
+  }
+
+  return {
+    monitorIncidents,
+    monitorIncidentsConnected,
+    connectMonitorIncidents,
+    cleanupMonitorIncidents,
+  };
+}
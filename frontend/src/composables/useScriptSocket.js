@@ -7,6 +7,7 @@ export function useScriptSocket() {
   const scriptFireDetected = ref(false);
   const scriptErrorText = ref("");
   const scriptSocketConnected = ref(false);
+  const scriptDetections = ref(null);
 
   let scriptSocket = null;
   let scriptReconnectTimer = null;
@@ -49,6 +50,7 @@ export function useScriptSocket() {
         if (payload.image_data_url) {
           scriptPreviewUrl.value = payload.image_data_url;
         }
+        scriptDetections.value = payload.detections || null;
         scriptFireDetected.value = !!payload.fire_detected;
         scriptResultText.value = payload.result_text || "";
         scriptErrorText.value = "";
@@ -87,6 +89,7 @@ export function useScriptSocket() {
     scriptFireDetected,
     scriptErrorText,
     scriptSocketConnected,
+    scriptDetections,
     connectScriptSocket,
     cleanupScriptSocket,
   };
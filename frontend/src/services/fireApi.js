@@ -25,17 +25,114 @@ export async function detectManualFireRequest(apiBase, file) {
   return data;
 }
 
-export async function fetchMonitorRecords(apiBase, sortBy, sortOrder) {
+function appendMonitorFilters(query, filters) {
+  for (const [key, value] of Object.entries(filters)) {
+    if (value !== "" && value !== null && value !== undefined) {
+      query.set(key, String(value));
+    }
+  }
+}
+
+export function buildMonitorExportUrl(apiBase, filters, format, images) {
+  const query = new URLSearchParams({ format, images: String(images) });
+  appendMonitorFilters(query, filters);
+  return `${apiBase}/api/data-monitor/records/export?${query.toString()}`;
+}
+
+export async function fetchMonitorRecords(apiBase, sortBy, sortOrder, filters = {}, page = {}) {
   const query = new URLSearchParams({
     sort_by: sortBy,
     sort_order: sortOrder,
   });
+  appendMonitorFilters(query, filters);
+  if (page.limit) {
+    query.set("limit", String(page.limit));
+  }
+  if (page.after) {
+    query.set("after", page.after);
+  }
   const response = await fetch(`${apiBase}/api/data-monitor/records?${query.toString()}`);
   const data = await parseJsonResponse(response);
   if (!response.ok) {
     throw new Error(data.detail || "获取数据监控列表失败");
   }
-  return Array.isArray(data) ? data : [];
+  const cursor = response.headers.get("X-Changes-Cursor");
+  return {
+    rows: Array.isArray(data) ? data : [],
+    cursor: cursor === null ? null : Number(cursor),
+    nextCursor: response.headers.get("X-Next-Cursor"),
+  };
+}
+
+export async function runMonitorBulkRequest(apiBase, action, payload, onProgress) {
+  // action: "update" | "delete". The server streams NDJSON progress lines.
+  const response = await fetch(`${apiBase}/api/data-monitor/records/bulk-${action}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload),
+  });
+  if (!response.ok) {
+    const data = await parseJsonResponse(response);
+    throw new Error(data.detail || "批量操作失败");
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  let summary = null;
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) {
+      break;
+    }
+    buffered += decoder.decode(value, { stream: true });
+    let newline = buffered.indexOf("\n");
+    while (newline >= 0) {
+      const line = buffered.slice(0, newline).trim();
+      buffered = buffered.slice(newline + 1);
+      newline = buffered.indexOf("\n");
+      if (!line) {
+        continue;
+      }
+      const event = JSON.parse(line);
+      if (event.type === "error") {
+        throw new Error(event.error || "批量操作失败");
+      }
+      if (event.type === "summary") {
+        summary = event;
+      }
+      onProgress?.(event);
+    }
+  }
+  return summary;
+}
+
+export async function fetchMonitorRecordChanges(apiBase, since) {
+  const query = new URLSearchParams({ since: String(since) });
+  const response = await fetch(
+    `${apiBase}/api/data-monitor/records/changes?${query.toString()}`
+  );
+  const data = await parseJsonResponse(response);
+  if (!response.ok) {
+    throw new Error(data.detail || "获取数据监控变更失败");
+  }
+  return data;
+}
+
+export async function fetchMonitorIncidents(apiBase, { status = "", source = "", limit = 50 } = {}) {
+  const query = new URLSearchParams({ limit: String(limit) });
+  if (status) {
+    query.set("status", status);
+  }
+  if (source) {
+    query.set("source", source);
+  }
+  const response = await fetch(`${apiBase}/api/data-monitor/incidents?${query.toString()}`);
+  const data = await parseJsonResponse(response);
+  if (!response.ok) {
+    throw new Error(data.detail || "获取火灾事件失败");
+  }
+  return data;
 }
 
 export async function createMonitorRecord(apiBase, remark, sceneImageFile) {
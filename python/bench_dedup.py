@@ -0,0 +1,146 @@
+import argparse
+import random
+import timeit
+
+from tracking import BoxTracker, is_same_target_set
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark saved-frame dedup: legacy greedy IoU loop vs vectorized matching + tracker."
+    )
+    parser.add_argument("--sizes", default="1,4,16,64", help="Comma-separated box counts per frame")
+    parser.add_argument("--repeat", type=int, default=2000, help="Calls per timing sample")
+    parser.add_argument("--iou-threshold", type=float, default=0.7, help="Dedup IoU threshold")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    return parser.parse_args()
+
+
+# Previous yolo.py implementation, kept verbatim as the baseline.
+def legacy_box_iou(box_a, box_b):
+    x1 = max(box_a[0], box_b[0])
+    y1 = max(box_a[1], box_b[1])
+    x2 = min(box_a[2], box_b[2])
+    y2 = min(box_a[3], box_b[3])
+
+    inter_w = max(0.0, x2 - x1)
+    inter_h = max(0.0, y2 - y1)
+    inter_area = inter_w * inter_h
+    if inter_area <= 0:
+        return 0.0
+
+    area_a = max(0.0, box_a[2] - box_a[0]) * max(0.0, box_a[3] - box_a[1])
+    area_b = max(0.0, box_b[2] - box_b[0]) * max(0.0, box_b[3] - box_b[1])
+    union = area_a + area_b - inter_area
+    if union <= 0:
+        return 0.0
+    return inter_area / union
+
+
+def legacy_is_same_target_set(current_boxes, saved_boxes, iou_threshold):
+    if not current_boxes or not saved_boxes:
+        return False
+    if len(current_boxes) != len(saved_boxes):
+        return False
+
+    matched = [False] * len(saved_boxes)
+    for cur in current_boxes:
+        best_iou = 0.0
+        best_idx = -1
+        for idx, old in enumerate(saved_boxes):
+            if matched[idx]:
+                continue
+            iou = legacy_box_iou(cur, old)
+            if iou > best_iou:
+                best_iou = iou
+                best_idx = idx
+        if best_idx < 0 or best_iou < iou_threshold:
+            return False
+        matched[best_idx] = True
+    return True
+
+
+def random_boxes(rng: random.Random, count: int) -> list[list[float]]:
+    boxes = []
+    for _ in range(count):
+        x = rng.uniform(0, 1800)
+        y = rng.uniform(0, 1000)
+        w = rng.uniform(20, 200)
+        h = rng.uniform(20, 200)
+        boxes.append([x, y, x + w, y + h])
+    return boxes
+
+
+def jitter(rng: random.Random, boxes: list[list[float]], pixels: float) -> list[list[float]]:
+    return [[v + rng.uniform(-pixels, pixels) for v in box] for box in boxes]
+
+
+def bench_matching(args: argparse.Namespace, rng: random.Random) -> None:
+    print(f"{'boxes':>6} {'legacy us/call':>15} {'vectorized us/call':>19} {'speedup':>8} {'agree':>7}")
+    for size in [int(item) for item in args.sizes.split(",") if item.strip()]:
+        saved = random_boxes(rng, size)
+        samples = [jitter(rng, saved, 6.0) for _ in range(50)]
+        rng.shuffle(saved)
+
+        legacy = timeit.timeit(
+            lambda: [legacy_is_same_target_set(s, saved, args.iou_threshold) for s in samples],
+            number=max(1, args.repeat // len(samples)),
+        )
+        vectorized = timeit.timeit(
+            lambda: [is_same_target_set(s, saved, args.iou_threshold) for s in samples],
+            number=max(1, args.repeat // len(samples)),
+        )
+        calls = max(1, args.repeat // len(samples)) * len(samples)
+        agree = sum(
+            legacy_is_same_target_set(s, saved, args.iou_threshold)
+            == is_same_target_set(s, saved, args.iou_threshold)
+            for s in samples
+        )
+        print(
+            f"{size:>6} {legacy / calls * 1e6:>15.1f} {vectorized / calls * 1e6:>19.1f} "
+            f"{legacy / vectorized:>7.1f}x {agree:>4}/{len(samples)}"
+        )
+
+
+def bench_flicker(args: argparse.Namespace, rng: random.Random) -> None:
+    # One slowly drifting fire box that the detector drops every few frames.
+    base = [600.0, 400.0, 700.0, 520.0]
+    frames = []
+    for index in range(300):
+        box = [v + index * 0.2 for v in base]
+        visible = rng.random() > 0.3
+        frames.append([jitter(rng, [box], 3.0)[0]] if visible else [])
+
+    legacy_saves = 0
+    last_saved: list[list[float]] = []
+    for boxes in frames:
+        if boxes:
+            if not legacy_is_same_target_set(boxes, last_saved, args.iou_threshold):
+                legacy_saves += 1
+                last_saved = boxes
+        else:
+            last_saved = []
+
+    tracker = BoxTracker(change_iou=args.iou_threshold, max_age=2.0)
+    tracker_saves = 0
+    for index, boxes in enumerate(frames):
+        tracker.update(boxes, index / 25.0)
+        if boxes and tracker.pending_save():
+            tracker_saves += 1
+            tracker.mark_saved()
+
+    print()
+    print(f"Flickering target over {len(frames)} frames (save interval ignored):")
+    print(f"  legacy dedup saves:  {legacy_saves}")
+    print(f"  tracker dedup saves: {tracker_saves}")
+
+
+def main() -> None:
+    args = parse_args()
+    rng = random.Random(args.seed)
+    bench_matching(args, rng)
+    bench_flicker(args, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import argparse
+import shutil
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from inference_backend import backend_name, load_model
+from tracking import iou_matrix, match_boxes
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Export fire_test.pt to CPU runtimes (ONNX/OpenVINO, optional int8) and compare them."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="Export (and optionally int8-calibrate) a model")
+    export.add_argument("--weights", default="fire_test.pt", help="PyTorch weights to export")
+    export.add_argument("--format", choices=["onnx", "openvino"], default="openvino", help="Target runtime")
+    export.add_argument("--imgsz", type=int, default=640, help="Input resolution (square)")
+    export.add_argument(
+        "--dynamic",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Dynamic batch/shape; needed when yolo.py batches several sources",
+    )
+    export.add_argument("--int8", action="store_true", help="Also write an int8 model calibrated on --calib-source")
+    export.add_argument("--calib-source", help="Video file or image folder with representative frames")
+    export.add_argument("--calib-frames", type=int, default=300, help="Calibration frames to use")
+
+    compare = subparsers.add_parser("compare", help="Compare FPS and detections against the PyTorch baseline")
+    compare.add_argument("--baseline", default="fire_test.pt", help="Baseline model (usually the .pt)")
+    compare.add_argument("--candidate", required=True, help=".onnx file or *_openvino_model directory")
+    compare.add_argument("--video", required=True, help="Sample video file or image folder")
+    compare.add_argument("--frames", type=int, default=300, help="Frames to evaluate")
+    compare.add_argument("--imgsz", type=int, default=640, help="Inference resolution")
+    compare.add_argument("--threads", type=int, default=0, help="Runtime threads (0 = runtime default)")
+    compare.add_argument("--conf", type=float, default=0.5, help="Confidence threshold")
+    compare.add_argument("--match-iou", type=float, default=0.5, help="IoU for a box to count as the same detection")
+    compare.add_argument("--target", default="Fire", help="Class name to compare")
+    return parser.parse_args()
+
+
+def iter_frames(source, limit):
+    # Evenly spread `limit` frames over a video file or a folder of images.
+    path = Path(source)
+    if path.is_dir():
+        files = sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        stride = max(1, len(files) // max(1, limit))
+        for file_path in files[::stride][:limit]:
+            frame = cv2.imread(str(file_path))
+            if frame is not None:
+                yield frame
+        return
+
+    cap = cv2.VideoCapture(str(source))
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open {source}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    stride = max(1, total // max(1, limit)) if total > 0 else 1
+    index = 0
+    yielded = 0
+    try:
+        while yielded < limit:
+            success, frame = cap.read()
+            if not success:
+                break
+            if index % stride == 0:
+                yielded += 1
+                yield frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def letterbox_tensor(frame, imgsz):
+    # Same preprocessing as ultralytics' LetterBox: keep aspect, pad with 114,
+    # RGB, CHW, 0-1 float, batch of one.
+    height, width = frame.shape[:2]
+    scale = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top : top + new_h, left : left + new_w] = resized
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(tensor[None])
+
+
+def load_calibration(source, limit, imgsz):
+    if not source:
+        raise SystemExit("--int8 needs --calib-source (video file or image folder from the target sites)")
+    tensors = [letterbox_tensor(frame, imgsz) for frame in iter_frames(source, limit)]
+    if not tensors:
+        raise SystemExit(f"No calibration frames read from {source}")
+    print(f"Calibration: {len(tensors)} frames from {source}")
+    return tensors
+
+
+def quantize_onnx(fp32_path, tensors):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self._items = iter([{input_name: tensor} for tensor in tensors])
+
+        def get_next(self):
+            return next(self._items, None)
+
+    fp32_model = onnx.load(str(fp32_path))
+    int8_path = fp32_path.with_name(f"{fp32_path.stem}_int8.onnx")
+    quantize_static(
+        str(fp32_path),
+        str(int8_path),
+        FrameReader(fp32_model.graph.input[0].name),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        # Only convolutions: quantizing the box-decoding head costs far more
+        # accuracy than it saves time.
+        op_types_to_quantize=["Conv"],
+    )
+
+    # Keep the ultralytics metadata (class names, stride, imgsz) so YOLO() can load it.
+    int8_model = onnx.load(str(int8_path))
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, str(int8_path))
+    return int8_path
+
+
+def quantize_openvino(fp32_dir, tensors):
+    import nncf
+    import openvino as ov
+
+    xml_path = sorted(fp32_dir.glob("*.xml"))[0]
+    core = ov.Core()
+    quantized = nncf.quantize(
+        core.read_model(xml_path),
+        nncf.Dataset(tensors),
+        preset=nncf.QuantizationPreset.MIXED,
+        subset_size=len(tensors),
+        # Same exclusions ultralytics uses: keep the box-decoding math in fp32.
+        ignored_scope=nncf.IgnoredScope(types=["Multiply", "Subtract", "Sigmoid"]),
+    )
+
+    int8_dir = fp32_dir.with_name(fp32_dir.name.replace("_openvino_model", "_int8_openvino_model"))
+    if int8_dir.exists():
+        shutil.rmtree(int8_dir)
+    int8_dir.mkdir(parents=True)
+    ov.save_model(quantized, str(int8_dir / xml_path.name), compress_to_fp16=False)
+    for extra in fp32_dir.glob("*.yaml"):
+        shutil.copy2(extra, int8_dir / extra.name)
+    return int8_dir
+
+
+def run_export(args):
+    model = YOLO(args.weights)
+    export_kwargs = {"format": args.format, "imgsz": args.imgsz, "dynamic": args.dynamic}
+    if args.format == "onnx":
+        export_kwargs["simplify"] = True
+    exported = Path(model.export(**export_kwargs))
+    print(f"Exported {args.format} fp32: {exported}")
+
+    if args.int8:
+        tensors = load_calibration(args.calib_source, args.calib_frames, args.imgsz)
+        if args.format == "onnx":
+            quantized = quantize_onnx(exported, tensors)
+        else:
+            quantized = quantize_openvino(exported, tensors)
+        print(f"Exported {args.format} int8: {quantized}")
+
+
+def target_boxes(result, target):
+    names = result.names
+    classes = result.boxes.cls.cpu().numpy()
+    boxes = result.boxes.xyxy.cpu().numpy()
+    return [boxes[i].tolist() for i, cls_id in enumerate(classes) if names[int(cls_id)] == target]
+
+
+def benchmark(model, frames, args):
+    # One warm-up pass, then per-frame (batch 1) latency as a single camera sees it.
+    model(frames[0], imgsz=args.imgsz, conf=args.conf, verbose=False)
+    detections = []
+    started = time.perf_counter()
+    for frame in frames:
+        result = model(frame, imgsz=args.imgsz, conf=args.conf, verbose=False)[0]
+        detections.append(target_boxes(result, args.target))
+    elapsed = time.perf_counter() - started
+    return detections, len(frames) / elapsed, elapsed / len(frames) * 1000
+
+
+def run_compare(args):
+    frames = list(iter_frames(args.video, args.frames))
+    if not frames:
+        raise SystemExit(f"No frames read from {args.video}")
+
+    rows = []
+    outputs = {}
+    for label, path in (("baseline", args.baseline), ("candidate", args.candidate)):
+        model, kind = load_model(path, threads=args.threads, imgsz=args.imgsz)
+        detections, fps, ms = benchmark(model, frames, args)
+        outputs[label] = detections
+        rows.append((label, kind, path, fps, ms))
+
+    print(f"Frames: {len(frames)} from {args.video} (imgsz {args.imgsz}, threads {args.threads or 'default'})")
+    for label, kind, path, fps, ms in rows:
+        print(f"  {label:<9} {kind:<8} {fps:7.2f} FPS  {ms:7.1f} ms/frame  {path}")
+    print(f"  speedup: {rows[1][3] / rows[0][3]:.2f}x")
+
+    verdict_agree = 0
+    base_total = cand_total = matched_total = 0
+    matched_ious = []
+    for base_boxes, cand_boxes in zip(outputs["baseline"], outputs["candidate"]):
+        verdict_agree += bool(base_boxes) == bool(cand_boxes)
+        base_total += len(base_boxes)
+        cand_total += len(cand_boxes)
+        if base_boxes and cand_boxes:
+            matches, _, _ = match_boxes(base_boxes, cand_boxes, args.match_iou)
+            iou = iou_matrix(base_boxes, cand_boxes)
+            matched_total += len(matches)
+            matched_ious.extend(float(iou[a, b]) for a, b in matches)
+
+    recall = matched_total / base_total if base_total else 1.0
+    precision = matched_total / cand_total if cand_total else 1.0
+    mean_iou = sum(matched_ious) / len(matched_ious) if matched_ious else 0.0
+    print(f"Agreement vs baseline ({args.target}, match IoU {args.match_iou}):")
+    print(f"  frame verdict agreement: {verdict_agree}/{len(frames)} ({verdict_agree / len(frames):.1%})")
+    print(f"  box recall {recall:.1%}  precision {precision:.1%}  mean IoU {mean_iou:.3f}")
+    print(f"  boxes: baseline {base_total}, candidate {cand_total}, matched {matched_total}")
+
+
+def main():
+    args = parse_args()
+    if args.command == "export":
+        run_export(args)
+    else:
+        if backend_name(args.candidate) == "pytorch":
+            print("Note: --candidate is a PyTorch model; expected an .onnx file or *_openvino_model directory")
+        run_compare(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import itertools
+import json
+import os
+import socket
+import struct
+import time
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Callable
+
+# Wire format per frame: ">II" (header length, payload length), a UTF-8 JSON
+# header (filename, mime_type, metadata) and the encoded image bytes.
+_PREFIX = struct.Struct(">II")
+MAX_HEADER_BYTES = 64 * 1024
+MAX_FRAME_BYTES = 32 * 1024 * 1024
+
+_frame_ids = itertools.count(1)
+
+
+class InMemoryFrame:
+    def __init__(self, filename: str, data: bytes, mime_type: str = "image/jpeg", metadata: dict | None = None):
+        self.frame_id = next(_frame_ids)
+        self.filename = filename
+        self.data = data
+        self.mime_type = mime_type
+        self.metadata = metadata or {}
+
+
+def parse_address(address: str) -> tuple[int, str | tuple[str, int]]:
+    # "unix:/tmp/fire_frames.sock" or "tcp:127.0.0.1:8765"
+    scheme, _, rest = address.partition(":")
+    if scheme == "unix" and rest:
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("Unix-domain sockets are not supported on this platform; use tcp:host:port")
+        return socket.AF_UNIX, rest
+    if scheme == "tcp" and rest:
+        host, _, port = rest.rpartition(":")
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    raise ValueError(f"Unsupported frame socket address: {address}")
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytes | None:
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = conn.recv(min(size - len(chunks), 1024 * 1024))
+        if not chunk:
+            return None
+        chunks.extend(chunk)
+    return bytes(chunks)
+
+
+class FrameSender:
+    def __init__(self, address: str, timeout: float = 1.0, reconnect_interval: float = 2.0):
+        self.family, self.target = parse_address(address)
+        self.timeout = timeout
+        self.reconnect_interval = reconnect_interval
+        self._sock: socket.socket | None = None
+        self._next_connect_at = 0.0
+
+    def _connect(self) -> socket.socket | None:
+        if self._sock is not None:
+            return self._sock
+        now = time.monotonic()
+        if now < self._next_connect_at:
+            return None
+        try:
+            sock = socket.socket(self.family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.target)
+        except OSError:
+            # Uploader not listening; callers fall back to disk until it is.
+            self._next_connect_at = now + self.reconnect_interval
+            return None
+        self._sock = sock
+        return sock
+
+    def send(self, frame: InMemoryFrame) -> bool:
+        sock = self._connect()
+        if sock is None:
+            return False
+        header = json.dumps(
+            {"filename": frame.filename, "mime_type": frame.mime_type, "metadata": frame.metadata},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        try:
+            sock.sendall(_PREFIX.pack(len(header), len(frame.data)) + header + frame.data)
+        except OSError:
+            self.close()
+            self._next_connect_at = time.monotonic() + self.reconnect_interval
+            return False
+        return True
+
+    def close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+
+class FrameReceiver:
+    def __init__(self, address: str, on_frame: Callable[[InMemoryFrame], None]):
+        self.address = address
+        self.family, self.target = parse_address(address)
+        self.on_frame = on_frame
+        self._server: socket.socket | None = None
+        self._lock = Lock()
+        self._stopped = False
+
+    def start(self) -> None:
+        if self.family == getattr(socket, "AF_UNIX", None):
+            try:
+                os.unlink(self.target)
+            except FileNotFoundError:
+                pass
+            Path(self.target).parent.mkdir(parents=True, exist_ok=True)
+        server = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_INET:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(self.target)
+        server.listen()
+        self._server = server
+        Thread(target=self._accept_loop, name="frame-receiver", daemon=True).start()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopped = True
+            server, self._server = self._server, None
+        if server is not None:
+            server.close()
+        if self.family == getattr(socket, "AF_UNIX", None):
+            try:
+                os.unlink(self.target)
+            except OSError:
+                pass
+
+    def _accept_loop(self) -> None:
+        while True:
+            server = self._server
+            if server is None:
+                return
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                if self._stopped:
+                    return
+                continue
+            Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _serve_connection(self, conn: socket.socket) -> None:
+        with conn:
+            while not self._stopped:
+                try:
+                    prefix = _recv_exact(conn, _PREFIX.size)
+                    if prefix is None:
+                        return
+                    header_len, payload_len = _PREFIX.unpack(prefix)
+                    if header_len > MAX_HEADER_BYTES or payload_len > MAX_FRAME_BYTES:
+                        print(f"Frame socket: oversized frame ({header_len}/{payload_len} bytes), closing")
+                        return
+                    header_bytes = _recv_exact(conn, header_len)
+                    payload = _recv_exact(conn, payload_len)
+                    if header_bytes is None or payload is None:
+                        return
+                except OSError:
+                    return
+
+                try:
+                    header = json.loads(header_bytes.decode("utf-8"))
+                    frame = InMemoryFrame(
+                        filename=str(header.get("filename") or f"frame_{int(time.time() * 1000)}.jpg"),
+                        data=payload,
+                        mime_type=str(header.get("mime_type") or "image/jpeg"),
+                        metadata=header.get("metadata") or {},
+                    )
+                    self.on_frame(frame)
+                except Exception as exc:
+                    print(f"Frame socket: dropped malformed frame: {exc}")
@@ -0,0 +1,87 @@
+import os
+from pathlib import Path
+
+from ultralytics import YOLO
+
+# yolo.py loads .pt weights (PyTorch), .onnx files (onnxruntime) and
+# "*_openvino_model" directories (OpenVINO) through the same YOLO() front end,
+# so preprocessing, NMS and result.plot() are identical across backends.
+# Artifacts are produced by export_model.py.
+
+
+def backend_name(model_path):
+    path = Path(str(model_path))
+    if path.suffix == ".onnx":
+        return "onnx"
+    if path.is_dir() and (path.name.endswith("_openvino_model") or any(path.glob("*.xml"))):
+        return "openvino"
+    return "pytorch"
+
+
+def _set_torch_threads(threads):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def _set_onnx_threads(backend, model_path, threads):
+    session = getattr(backend, "session", None)
+    if session is None:
+        return False
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # Ultralytics creates the session without options; rebuild it in place.
+    backend.session = onnxruntime.InferenceSession(
+        str(model_path),
+        sess_options=options,
+        providers=session.get_providers(),
+    )
+    return True
+
+
+def _set_openvino_threads(backend, model_path, threads):
+    if getattr(backend, "ov_compiled_model", None) is None:
+        return False
+    import openvino as ov
+
+    xml_files = sorted(Path(model_path).glob("*.xml"))
+    if not xml_files:
+        return False
+    core = ov.Core()
+    backend.ov_compiled_model = core.compile_model(
+        core.read_model(xml_files[0]),
+        device_name="CPU",
+        config={"INFERENCE_NUM_THREADS": threads, "PERFORMANCE_HINT": "LATENCY"},
+    )
+    return True
+
+
+def load_model(model_path, threads=0, imgsz=640):
+    # threads=0 keeps each runtime's default (usually all physical cores).
+    kind = backend_name(model_path)
+    if threads > 0:
+        os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+        if kind == "pytorch":
+            _set_torch_threads(threads)
+
+    model = YOLO(str(model_path), task="detect")
+    if threads > 0 and kind != "pytorch":
+        # Runtime sessions only exist after the first predict, so warm up once
+        # and then re-create them with the requested thread count.
+        import numpy as np
+
+        model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, verbose=False)
+        backend = getattr(getattr(model, "predictor", None), "model", None)
+        if kind == "onnx":
+            applied = backend is not None and _set_onnx_threads(backend, model_path, threads)
+        else:
+            applied = backend is not None and _set_openvino_threads(backend, model_path, threads)
+        if not applied:
+            print(f"Warning: could not apply --threads {threads} to the {kind} backend; using runtime default")
+    return model, kind
@@ -1,9 +1,10 @@
 import argparse
 import time
 from pathlib import Path
-from threading import Lock
 
-from upload_image import FireUploadClient
+from frame_transport import FrameReceiver
+from upload_engine import UploadEngine
+from upload_image import FireUploadClient, add_rate_control_args
 from watchdog.events import FileSystemEvent, FileSystemEventHandler
 from watchdog.observers import Observer
 
@@ -36,8 +37,38 @@ def parse_args() -> argparse.Namespace:
         "--min-upload-interval",
         type=float,
         default=1.0,
-        help="Minimum interval between two uploads in seconds",
+        help="Minimum interval between two uploads in seconds (floor for adaptive pacing)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="Number of concurrent upload workers",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=100,
+        help="Maximum pending uploads; the oldest pending file is dropped when full",
+    )
+    parser.add_argument(
+        "--latest-only",
+        action="store_true",
+        help="Keep only the newest pending file and drop stale frames",
+    )
+    parser.add_argument(
+        "--max-tracked-files",
+        type=int,
+        default=4096,
+        help="How many uploaded files to remember for duplicate suppression",
+    )
+    parser.add_argument(
+        "--frame-socket",
+        default="",
+        help="Also accept frames pushed by yolo.py over a socket, e.g. unix:/tmp/fire_frames.sock "
+        "or tcp:127.0.0.1:8765 (the folder watch stays active as a fallback)",
+    )
+    add_rate_control_args(parser)
     return parser.parse_args()
 
 
@@ -55,17 +86,9 @@ def get_latest_image_path(watch_dir: Path) -> Path | None:
 
 
 class UploadOnImageEventHandler(FileSystemEventHandler):
-    def __init__(
-        self,
-        watch_dir: Path,
-        client: FireUploadClient,
-        settle_delay: float,
-    ) -> None:
+    def __init__(self, watch_dir: Path, engine: UploadEngine) -> None:
         self.watch_dir = watch_dir
-        self.client = client
-        self.settle_delay = max(0.0, settle_delay)
-        self._uploaded_mtime_by_path: dict[Path, float] = {}
-        self._lock = Lock()
+        self.engine = engine
 
     def _is_supported_image(self, file_path: Path) -> bool:
         return file_path.suffix.lower() in IMAGE_EXTS
@@ -73,46 +96,22 @@ class UploadOnImageEventHandler(FileSystemEventHandler):
     def _normalize_path(self, src_path: str) -> Path:
         return Path(src_path).resolve()
 
-    def _try_upload(self, file_path: Path) -> None:
+    def _try_enqueue(self, file_path: Path) -> None:
         if file_path.parent != self.watch_dir:
             return
         if not self._is_supported_image(file_path):
             return
-
-        if self.settle_delay > 0:
-            time.sleep(self.settle_delay)
-
-        if not file_path.exists() or not file_path.is_file():
-            return
-
-        file_mtime = file_path.stat().st_mtime
-        with self._lock:
-            last_mtime = self._uploaded_mtime_by_path.get(file_path, -1.0)
-            if file_mtime <= last_mtime:
-                return
-
-        payload = self.client.upload_image(file_path)
-        print(f"Uploaded: {file_path}")
-        print(payload)
-
-        with self._lock:
-            self._uploaded_mtime_by_path[file_path] = file_mtime
+        self.engine.submit(file_path)
 
     def on_created(self, event: FileSystemEvent) -> None:
         if event.is_directory:
             return
-        try:
-            self._try_upload(self._normalize_path(event.src_path))
-        except Exception as exc:
-            print(f"Upload failed: {exc}")
+        self._try_enqueue(self._normalize_path(event.src_path))
 
     def on_modified(self, event: FileSystemEvent) -> None:
         if event.is_directory:
             return
-        try:
-            self._try_upload(self._normalize_path(event.src_path))
-        except Exception as exc:
-            print(f"Upload failed: {exc}")
+        self._try_enqueue(self._normalize_path(event.src_path))
 
 
 def main() -> None:
@@ -124,26 +123,43 @@ def main() -> None:
         endpoint=args.endpoint,
         timeout=args.timeout,
         min_interval=args.min_upload_interval,
+        max_connections=args.workers,
+        adaptive=args.adaptive,
+        target_latency=args.target_latency,
+        max_interval=args.max_interval,
+    )
+    engine = UploadEngine(
+        client,
+        workers=args.workers,
+        queue_size=args.queue_size,
+        settle_delay=args.poll_interval,
+        latest_only=args.latest_only,
+        max_tracked_files=args.max_tracked_files,
     )
 
     print(f"Watching: {watch_dir.resolve()}")
     print(f"Endpoint: {args.endpoint}")
     print("Mode: filesystem events (watchdog)")
+    print(f"Workers: {engine.workers}, queue size: {engine.queue_size}, latest only: {engine.latest_only}")
+    print(f"Rate control: adaptive={args.adaptive} {client.controller.describe()}")
 
-    handler = UploadOnImageEventHandler(
-        watch_dir=watch_dir.resolve(),
-        client=client,
-        settle_delay=args.poll_interval,
-    )
+    engine.start()
+    handler = UploadOnImageEventHandler(watch_dir=watch_dir.resolve(), engine=engine)
     observer = Observer()
     observer.schedule(handler, path=str(watch_dir.resolve()), recursive=False)
     observer.start()
 
+    frame_receiver: FrameReceiver | None = None
+    if args.frame_socket:
+        frame_receiver = FrameReceiver(args.frame_socket, on_frame=engine.submit_frame)
+        frame_receiver.start()
+        print(f"Frame socket: {args.frame_socket}")
+
     # Optional one-time catch-up for the latest existing image.
     try:
         latest_image = get_latest_image_path(watch_dir)
         if latest_image is not None:
-            handler._try_upload(latest_image.resolve())
+            handler._try_enqueue(latest_image.resolve())
     except Exception as exc:
         print(f"Initial upload failed: {exc}")
 
@@ -153,8 +169,13 @@ def main() -> None:
     except KeyboardInterrupt:
         print("Stopped.")
     finally:
+        if frame_receiver is not None:
+            frame_receiver.stop()
         observer.stop()
         observer.join()
+        engine.stop()
+        client.close()
+        print(f"Upload stats: {engine.stats()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+import sys
+import types
+
+import numpy as np
+import pytest
+
+# yolo imports the model loader at module level, which needs ultralytics;
+# handle_result never touches it.
+sys.modules.setdefault("inference_backend", types.SimpleNamespace(load_model=None))
+
+import yolo  # noqa: E402
+
+
+class _Tensor:
+    def __init__(self, values):
+        self._values = np.asarray(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._values
+
+
+class _Result:
+    names = {0: yolo.TARGET_OBJECT}
+
+    def __init__(self, boxes):
+        self.boxes = types.SimpleNamespace(
+            cls=_Tensor([0] * len(boxes)),
+            xyxy=_Tensor(boxes),
+            conf=_Tensor([0.9] * len(boxes)),
+        )
+
+    def plot(self):
+        return None
+
+
+class _Saver:
+    def __init__(self, accept):
+        self.accept = accept
+        self.submitted = 0
+
+    def submit(self, frame, source_id, label, metadata):
+        self.submitted += 1
+        return self.accept
+
+
+@pytest.fixture(autouse=True)
+def _save_frames(monkeypatch):
+    monkeypatch.setattr(yolo, "SAVE_DETECTED_FRAME", True)
+    monkeypatch.setattr(yolo, "SAVE_ANNOTATED_FRAME", False)
+
+
+def test_full_save_queue_keeps_track_pending():
+    state = yolo.SourceState("cam0")
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    result = _Result([[10, 10, 100, 100]])
+    now = 1000.0
+
+    yolo.handle_result(state, frame, result, _Saver(accept=False), now)
+
+    assert state.decisions["save_queue_full"] == 1
+    assert state.tracker.pending_save()
+    assert state.last_detect_saved_time != now
+
+    saver = _Saver(accept=True)
+    yolo.handle_result(state, frame, result, saver, now + 0.1)
+
+    assert saver.submitted == 1
+    assert state.decisions["saved_target"] == 1
+    assert not state.tracker.pending_save()
+
+
+def test_full_save_queue_retries_no_object_frame():
+    state = yolo.SourceState("cam0")
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    now = 1000.0
+
+    yolo.handle_result(state, frame, _Result([]), _Saver(accept=False), now)
+    assert state.last_no_object_saved_time != now
+
+    saver = _Saver(accept=True)
+    yolo.handle_result(state, frame, _Result([]), saver, now + 0.1)
+    assert saver.submitted == 1
@@ -0,0 +1,34 @@
+import json
+import time
+
+import httpx
+
+from upload_image import FireUploadClient
+
+
+def test_batch_latency_excludes_time_spent_by_the_consumer(tmp_path, monkeypatch):
+    images = []
+    for index in range(2):
+        path = tmp_path / f"{index}.jpg"
+        path.write_bytes(b"jpeg")
+        images.append(path)
+
+    def handler(request):
+        lines = [json.dumps({"type": "result", "index": index}) for index in range(2)]
+        lines.append(json.dumps({"type": "summary"}))
+        return httpx.Response(200, text="\n".join(lines) + "\n")
+
+    client = FireUploadClient(min_interval=0.0, batch_size=2)
+    client._client = httpx.Client(transport=httpx.MockTransport(handler))
+    released = []
+    release = client.controller.release
+    monkeypatch.setattr(
+        client.controller, "release", lambda **kwargs: released.append(kwargs) or release(**kwargs)
+    )
+
+    with client:
+        for _ in client.iter_upload_results(images):
+            time.sleep(0.2)
+
+    assert released[0]["status_code"] == 200
+    assert released[0]["latency"] < 0.05
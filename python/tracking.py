@@ -0,0 +1,154 @@
+import itertools
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy ships with ultralytics; fall back to greedy matching without it.
+    linear_sum_assignment = None
+
+
+def _as_boxes(boxes):
+    array = np.asarray(boxes, dtype=np.float64)
+    return array.reshape(-1, 4)
+
+
+def iou_matrix(boxes_a, boxes_b):
+    a = _as_boxes(boxes_a)
+    b = _as_boxes(boxes_b)
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)), dtype=np.float64)
+
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0.0, None) * np.clip(y2 - y1, 0.0, None)
+
+    area_a = np.clip(a[:, 2] - a[:, 0], 0.0, None) * np.clip(a[:, 3] - a[:, 1], 0.0, None)
+    area_b = np.clip(b[:, 2] - b[:, 0], 0.0, None) * np.clip(b[:, 3] - b[:, 1], 0.0, None)
+    union = area_a[:, None] + area_b[None, :] - inter
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou = np.where((union > 0) & (inter > 0), inter / union, 0.0)
+    return iou
+
+
+def _greedy_assignment(iou):
+    rows, cols = [], []
+    used_rows, used_cols = set(), set()
+    for flat_index in np.argsort(-iou, axis=None):
+        row, col = np.unravel_index(flat_index, iou.shape)
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        rows.append(row)
+        cols.append(col)
+    return np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)
+
+
+def assign(iou):
+    # Maximum total-IoU one-to-one assignment (Hungarian algorithm).
+    if iou.size == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    if linear_sum_assignment is None:
+        return _greedy_assignment(iou)
+    return linear_sum_assignment(-iou)
+
+
+def match_boxes(boxes_a, boxes_b, iou_threshold):
+    iou = iou_matrix(boxes_a, boxes_b)
+    rows, cols = assign(iou)
+    keep = iou[rows, cols] >= iou_threshold
+    matches = list(zip(rows[keep].tolist(), cols[keep].tolist()))
+    unmatched_a = sorted(set(range(iou.shape[0])) - {row for row, _ in matches})
+    unmatched_b = sorted(set(range(iou.shape[1])) - {col for _, col in matches})
+    return matches, unmatched_a, unmatched_b
+
+
+def is_same_target_set(current_boxes, saved_boxes, iou_threshold):
+    if not len(current_boxes) or not len(saved_boxes):
+        return False
+    if len(current_boxes) != len(saved_boxes):
+        return False
+
+    iou = iou_matrix(current_boxes, saved_boxes)
+    rows, cols = assign(iou)
+    return len(rows) == len(current_boxes) and bool(np.all(iou[rows, cols] >= iou_threshold))
+
+
+_track_ids = itertools.count(1)
+
+
+class Track:
+    def __init__(self, box, now):
+        self.track_id = next(_track_ids)
+        self.box = np.asarray(box, dtype=np.float64)
+        self.velocity = np.zeros(4, dtype=np.float64)
+        self.hits = 1
+        self.last_seen = now
+        self.saved_box = None
+
+    def predict(self, now):
+        return self.box + self.velocity * max(0.0, now - self.last_seen)
+
+    def update(self, box, now):
+        box = np.asarray(box, dtype=np.float64)
+        dt = now - self.last_seen
+        if dt > 0:
+            # Smoothed constant-velocity model (per box coordinate, px/s).
+            self.velocity = 0.5 * self.velocity + 0.5 * (box - self.box) / dt
+        self.box = box
+        self.hits += 1
+        self.last_seen = now
+
+
+class BoxTracker:
+    # SORT-style tracker: boxes are associated to predicted track positions by
+    # optimal IoU assignment, and tracks survive short gaps (max_age seconds) so
+    # a flickering detection keeps its identity instead of looking new.
+    def __init__(self, match_iou=0.3, change_iou=0.7, max_age=2.0, min_hits=1):
+        self.match_iou = match_iou
+        self.change_iou = change_iou
+        self.max_age = max_age
+        self.min_hits = max(1, min_hits)
+        self.tracks = []
+        self._visible = []
+
+    def update(self, boxes, now):
+        boxes = _as_boxes(boxes)
+        predicted = [track.predict(now) for track in self.tracks]
+        matches, unmatched_boxes, _ = match_boxes(boxes, predicted, self.match_iou)
+
+        visible = []
+        for box_index, track_index in matches:
+            track = self.tracks[track_index]
+            track.update(boxes[box_index], now)
+            visible.append(track)
+        for box_index in unmatched_boxes:
+            track = Track(boxes[box_index], now)
+            self.tracks.append(track)
+            visible.append(track)
+
+        self.tracks = [track for track in self.tracks if now - track.last_seen <= self.max_age]
+        self._visible = visible
+        return visible
+
+    def _needs_save(self, track):
+        if track.hits < self.min_hits:
+            return False
+        if track.saved_box is None:
+            return True
+        return iou_matrix(track.box, track.saved_box)[0, 0] < self.change_iou
+
+    def pending_save(self):
+        # A new confirmed track, or a visible track that moved/grew materially
+        # since it was last saved.
+        return any(self._needs_save(track) for track in self._visible)
+
+    def mark_saved(self):
+        for track in self._visible:
+            track.saved_box = track.box.copy()
+
+    def visible_track_ids(self):
+        return [track.track_id for track in self._visible]
@@ -0,0 +1,193 @@
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Condition, Lock, Thread
+
+from frame_transport import InMemoryFrame
+from upload_image import FireUploadClient
+
+
+def source_id_from_filename(file_path: Path) -> str | None:
+    # yolo.py names frames "<source_id>__<label>_<timestamp>.jpg".
+    source_id, separator, _ = file_path.name.partition("__")
+    if not separator or not source_id:
+        return None
+    return source_id
+
+
+def read_frame_metadata(file_path: Path) -> dict:
+    # yolo.py writes boxes/confidences to "<name>.json" next to a saved frame.
+    sidecar_path = file_path.with_suffix(".json")
+    try:
+        metadata = json.loads(sidecar_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return metadata if isinstance(metadata, dict) else {}
+
+
+# Bounded (LRU) path -> mtime memory used to skip re-uploading the same file.
+class RecentUploads:
+    def __init__(self, max_entries: int = 4096) -> None:
+        self.max_entries = max(1, max_entries)
+        self._mtime_by_path: OrderedDict[Path, float] = OrderedDict()
+        self._lock = Lock()
+
+    def is_uploaded(self, file_path: Path, mtime: float) -> bool:
+        with self._lock:
+            last_mtime = self._mtime_by_path.get(file_path)
+            if last_mtime is None:
+                return False
+            self._mtime_by_path.move_to_end(file_path)
+            return mtime <= last_mtime
+
+    def mark_uploaded(self, file_path: Path, mtime: float) -> None:
+        with self._lock:
+            self._mtime_by_path[file_path] = mtime
+            self._mtime_by_path.move_to_end(file_path)
+            while len(self._mtime_by_path) > self.max_entries:
+                self._mtime_by_path.popitem(last=False)
+
+
+# Bounded upload queue drained by a pool of worker threads. File events and
+# socket frames only enqueue work; the settle delay and the upload run on the
+# workers, so a slow backend never blocks the watchdog observer or the detector.
+class UploadEngine:
+    def __init__(
+        self,
+        client: FireUploadClient,
+        *,
+        workers: int = 2,
+        queue_size: int = 100,
+        settle_delay: float = 0.5,
+        latest_only: bool = False,
+        max_tracked_files: int = 4096,
+    ) -> None:
+        self.client = client
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.settle_delay = max(0.0, settle_delay)
+        self.latest_only = latest_only
+        self.recent_uploads = RecentUploads(max_tracked_files)
+        # key -> (ready_at, path or in-memory frame); insertion order is upload order.
+        self._pending: OrderedDict[object, tuple[float, Path | InMemoryFrame]] = OrderedDict()
+        self._cond = Condition()
+        self._threads: list[Thread] = []
+        self._stopped = False
+        self.uploaded_count = 0
+        self.failed_count = 0
+        self.dropped_count = 0
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            thread = Thread(target=self._worker_loop, name=f"upload-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads.clear()
+
+    def submit(self, file_path: Path) -> None:
+        self._enqueue(file_path, file_path, time.monotonic() + self.settle_delay)
+
+    def submit_frame(self, frame: InMemoryFrame) -> None:
+        # Socket frames are complete on arrival: no settle delay.
+        self._enqueue(("frame", frame.frame_id), frame, time.monotonic())
+
+    def _enqueue(self, key: object, job: Path | InMemoryFrame, ready_at: float) -> None:
+        with self._cond:
+            if self._stopped:
+                return
+            if self.latest_only:
+                self.dropped_count += sum(1 for pending_key in self._pending if pending_key != key)
+                self._pending.clear()
+            elif key in self._pending:
+                # Still being written: push it back and restart its settle delay.
+                self._pending.move_to_end(key)
+            else:
+                while len(self._pending) >= self.queue_size:
+                    self._pending.popitem(last=False)
+                    self.dropped_count += 1
+            self._pending[key] = (ready_at, job)
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "uploaded": self.uploaded_count,
+                "failed": self.failed_count,
+                "dropped": self.dropped_count,
+            }
+
+    def _next_job(self) -> Path | InMemoryFrame | None:
+        with self._cond:
+            while not self._stopped:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                key, (ready_at, job) = next(iter(self._pending.items()))
+                wait_seconds = ready_at - time.monotonic()
+                if wait_seconds > 0:
+                    self._cond.wait(wait_seconds)
+                    continue
+                del self._pending[key]
+                return job
+            return None
+
+    def _worker_loop(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                if isinstance(job, InMemoryFrame):
+                    self._upload_frame(job)
+                else:
+                    self._upload(job)
+            except Exception as exc:
+                with self._cond:
+                    self.failed_count += 1
+                name = job.filename if isinstance(job, InMemoryFrame) else job
+                print(f"Upload failed: {name}: {exc}")
+
+    def _upload_frame(self, frame: InMemoryFrame) -> None:
+        # The backend schedules and records detections per source_id.
+        metadata = dict(frame.metadata or {})
+        source_id = source_id_from_filename(Path(frame.filename))
+        if source_id:
+            metadata.setdefault("source_id", source_id)
+        payload = self.client.upload_bytes(
+            frame.filename,
+            frame.data,
+            mime_type=frame.mime_type,
+            metadata=metadata or None,
+        )
+        with self._cond:
+            self.uploaded_count += 1
+        print(f"Uploaded frame: {frame.filename} [{self.client.controller.describe()}]")
+        print(payload)
+
+    def _upload(self, file_path: Path) -> None:
+        if not file_path.exists() or not file_path.is_file():
+            return
+
+        file_mtime = file_path.stat().st_mtime
+        if self.recent_uploads.is_uploaded(file_path, file_mtime):
+            return
+
+        metadata = read_frame_metadata(file_path)
+        source_id = source_id_from_filename(file_path)
+        if source_id:
+            metadata.setdefault("source_id", source_id)
+        payload = self.client.upload_image(file_path, metadata=metadata or None)
+        self.recent_uploads.mark_uploaded(file_path, file_mtime)
+        with self._cond:
+            self.uploaded_count += 1
+        print(f"Uploaded: {file_path} [{self.client.controller.describe()}]")
+        print(payload)
@@ -2,8 +2,11 @@ import argparse
 import json
 import mimetypes
 import time
+from contextlib import ExitStack
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Iterable
+from threading import Condition, Lock
+from typing import Callable, Iterable, Iterator
 
 import httpx
 
@@ -12,7 +15,7 @@ DEFAULT_ENDPOINT = "http://127.0.0.1:8000/api/script/detect-fire"
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
-        description="Upload images to script module sequentially and print results."
+        description="Upload images to script module (in batches) and print results."
     )
     parser.add_argument("images", nargs="+", help="One or more image file paths")
     parser.add_argument(
@@ -25,60 +28,408 @@ def parse_args() -> argparse.Namespace:
         "--min-interval",
         type=float,
         default=1.0,
-        help="Minimum interval between two uploads in seconds",
+        help="Minimum interval between two uploads in seconds (floor for adaptive pacing)",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=20,
+        help="Images per request to the batch endpoint (1 uploads one image per request)",
+    )
+    add_rate_control_args(parser)
     return parser.parse_args()
 
 
+def add_rate_control_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--adaptive",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Adapt upload rate and concurrency to server latency and 429/503 responses",
+    )
+    parser.add_argument(
+        "--target-latency",
+        type=float,
+        default=2.0,
+        help="Responses slower than this (seconds) make the adaptive controller back off",
+    )
+    parser.add_argument(
+        "--max-interval",
+        type=float,
+        default=30.0,
+        help="Upper bound for the adaptive upload interval in seconds",
+    )
+
+
 def _to_path(image_path: str | Path) -> Path:
     return Path(image_path).expanduser()
 
 
-def _upload_one(client: httpx.Client, endpoint: str, image_path: Path) -> dict:
-    if not image_path.is_file():
-        raise FileNotFoundError(f"Image not found: {image_path}")
+def _metadata_form(metadata: dict | None) -> dict | None:
+    if not metadata:
+        return None
+    return {"metadata": json.dumps(metadata, ensure_ascii=False)}
+
+
+def _batch_metadata_form(metadata: list[dict | None] | None) -> dict | None:
+    # Parallel to the "files" parts; "" keeps the positions of images without metadata.
+    if not metadata or not any(metadata):
+        return None
+    return {
+        "metadata": [json.dumps(item, ensure_ascii=False) if item else "" for item in metadata]
+    }
 
+
+def _post_image(
+    client: httpx.Client, endpoint: str, image_path: Path, metadata: dict | None = None
+) -> httpx.Response:
     mime_type = mimetypes.guess_type(image_path.name)[0] or "application/octet-stream"
 
     with image_path.open("rb") as file_obj:
         files = {"file": (image_path.name, file_obj, mime_type)}
-        response = client.post(endpoint, files=files)
+        return client.post(endpoint, files=files, data=_metadata_form(metadata))
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value.strip()))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value.strip())
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+OVERLOAD_STATUS_CODES = {429, 502, 503, 504}
+
+
+class AdaptiveRateController:
+    # AIMD pacing: every healthy response (fast, non-overload) additively raises
+    # the upload rate and the concurrency window; a slow response, a 429/5xx
+    # overload answer or a transport error halves both. min_interval stays the
+    # floor, and Retry-After holds every upload back until it expires.
+    def __init__(
+        self,
+        *,
+        min_interval: float = 1.0,
+        max_interval: float = 30.0,
+        max_concurrency: int = 4,
+        target_latency: float = 2.0,
+        rate_step: float = 0.5,
+        enabled: bool = True,
+    ) -> None:
+        self.min_interval = max(0.0, min_interval)
+        self.max_interval = max(self.min_interval, max_interval)
+        self.max_concurrency = max(1, max_concurrency)
+        self.target_latency = max(0.001, target_latency)
+        self.rate_step = max(0.0, rate_step)
+        self.enabled = enabled
+        self.interval = self.min_interval
+        self.concurrency = 1.0 if enabled else float(self.max_concurrency)
+        self.latency_ewma: float | None = None
+        self.backoff_count = 0
+        self._in_flight = 0
+        self._next_start_at = 0.0
+        self._hold_until = 0.0
+        self._last_backoff_at = 0.0
+        self._cond = Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while True:
+                if self._in_flight >= int(self.concurrency):
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                wait_seconds = max(self._next_start_at, self._hold_until) - now
+                if wait_seconds > 0:
+                    self._cond.wait(wait_seconds)
+                    continue
+                self._in_flight += 1
+                self._next_start_at = now + self.interval
+                return
+
+    def cancel(self) -> None:
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._cond.notify_all()
+
+    def release(
+        self,
+        *,
+        latency: float | None,
+        status_code: int | None,
+        retry_after: float | None = None,
+    ) -> None:
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            now = time.monotonic()
+            if retry_after is not None:
+                self._hold_until = max(self._hold_until, now + retry_after)
+            if latency is not None:
+                if self.latency_ewma is None:
+                    self.latency_ewma = latency
+                else:
+                    self.latency_ewma += 0.3 * (latency - self.latency_ewma)
+
+            if self.enabled:
+                if status_code is None:
+                    self._back_off(now, "transport error")
+                elif status_code in OVERLOAD_STATUS_CODES:
+                    self._back_off(now, f"HTTP {status_code}")
+                elif latency is not None and latency > self.target_latency:
+                    self._back_off(now, f"latency {latency:.2f}s > target {self.target_latency:.2f}s")
+                elif status_code < 400:
+                    self._increase()
+            self._cond.notify_all()
 
-    response.raise_for_status()
-    return response.json()
+    def _increase(self) -> None:
+        rate = 1.0 / self.interval if self.interval > 0 else float("inf")
+        rate += self.rate_step
+        self.interval = max(self.min_interval, 1.0 / rate)
+        self.concurrency = min(float(self.max_concurrency), self.concurrency + 1.0 / self.concurrency)
+
+    def _back_off(self, now: float, reason: str) -> None:
+        # Responses already in flight reflect the same congestion; only react
+        # once per target_latency window.
+        if now - self._last_backoff_at < self.target_latency:
+            return
+        self._last_backoff_at = now
+        self.backoff_count += 1
+        self.interval = min(self.max_interval, max(self.interval, self.min_interval, 0.1) * 2.0)
+        self.concurrency = max(1.0, self.concurrency / 2.0)
+        print(f"Rate control: back off ({reason}) -> {self._describe()}")
+
+    def _describe(self) -> str:
+        latency = f"{self.latency_ewma:.2f}s" if self.latency_ewma is not None else "n/a"
+        hold = max(0.0, self._hold_until - time.monotonic())
+        return (
+            f"interval={self.interval:.2f}s concurrency={int(self.concurrency)}/{self.max_concurrency} "
+            f"in_flight={self._in_flight} latency_ewma={latency} backoffs={self.backoff_count}"
+            + (f" hold={hold:.1f}s" if hold > 0 else "")
+        )
+
+    def describe(self) -> str:
+        with self._cond:
+            return self._describe()
 
 
 class FireUploadClient:
-    def __init__(self, endpoint: str = DEFAULT_ENDPOINT, timeout: float = 30.0, min_interval: float = 1.0):
+    def __init__(
+        self,
+        endpoint: str = DEFAULT_ENDPOINT,
+        timeout: float = 30.0,
+        min_interval: float = 1.0,
+        max_connections: int = 4,
+        adaptive: bool = True,
+        target_latency: float = 2.0,
+        max_interval: float = 30.0,
+        max_retries: int = 2,
+        batch_size: int = 1,
+        batch_endpoint: str | None = None,
+    ):
         self.endpoint = endpoint
+        self.batch_endpoint = batch_endpoint or f"{endpoint.rstrip('/')}/batch"
+        self.batch_size = max(1, batch_size)
         self.timeout = timeout
         self.min_interval = max(0.0, min_interval)
-        self._last_upload_started_at: float | None = None
+        self.max_connections = max(1, max_connections)
+        self.max_retries = max(0, max_retries)
+        self.controller = AdaptiveRateController(
+            min_interval=self.min_interval,
+            max_interval=max_interval,
+            max_concurrency=self.max_connections,
+            target_latency=target_latency,
+            enabled=adaptive,
+        )
+        self._client_lock = Lock()
+        self._client: httpx.Client | None = None
 
-    def _wait_for_rate_limit(self) -> None:
-        if self._last_upload_started_at is None:
-            return
-        elapsed = time.monotonic() - self._last_upload_started_at
-        wait_seconds = self.min_interval - elapsed
-        if wait_seconds > 0:
-            time.sleep(wait_seconds)
+    def __enter__(self) -> "FireUploadClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _get_client(self) -> httpx.Client:
+        # One keep-alive connection pool shared by every upload (and thread).
+        with self._client_lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                    ),
+                )
+            return self._client
+
+    def close(self) -> None:
+        with self._client_lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def _send(self, post: Callable[[httpx.Client], httpx.Response]) -> dict:
+        client = self._get_client()
+        attempt = 0
+        while True:
+            self.controller.acquire()
+            started_at = time.monotonic()
+            try:
+                response = post(client)
+            except httpx.TransportError:
+                self.controller.release(latency=None, status_code=None)
+                raise
+            except BaseException:
+                self.controller.cancel()
+                raise
+
+            self.controller.release(
+                latency=time.monotonic() - started_at,
+                status_code=response.status_code,
+                retry_after=_parse_retry_after(response.headers.get("Retry-After")),
+            )
+            if response.status_code in OVERLOAD_STATUS_CODES and attempt < self.max_retries:
+                attempt += 1
+                continue
+
+            response.raise_for_status()
+            return response.json()
 
-    def upload_image(self, image_path: str | Path) -> dict:
+    def upload_image(self, image_path: str | Path, metadata: dict | None = None) -> dict:
         image_file = _to_path(image_path)
-        with httpx.Client(timeout=self.timeout) as client:
-            self._wait_for_rate_limit()
-            self._last_upload_started_at = time.monotonic()
-            return _upload_one(client=client, endpoint=self.endpoint, image_path=image_file)
-
-    def upload_images(self, image_paths: Iterable[str | Path]) -> list[dict]:
-        results: list[dict] = []
-        with httpx.Client(timeout=self.timeout) as client:
-            for image_path in image_paths:
-                image_file = _to_path(image_path)
-                self._wait_for_rate_limit()
-                self._last_upload_started_at = time.monotonic()
-                result = _upload_one(client=client, endpoint=self.endpoint, image_path=image_file)
-                results.append(result)
+        if not image_file.is_file():
+            raise FileNotFoundError(f"Image not found: {image_file}")
+        return self._send(
+            lambda client: _post_image(
+                client=client, endpoint=self.endpoint, image_path=image_file, metadata=metadata
+            )
+        )
+
+    def upload_bytes(
+        self,
+        filename: str,
+        data: bytes,
+        mime_type: str = "image/jpeg",
+        metadata: dict | None = None,
+    ) -> dict:
+        return self._send(
+            lambda client: client.post(
+                self.endpoint,
+                files={"file": (filename, data, mime_type)},
+                data=_metadata_form(metadata),
+            )
+        )
+
+    def _upload_batch(
+        self, image_files: list[Path], metadata: list[dict | None] | None = None
+    ) -> Iterator[tuple[int, dict]]:
+        for image_file in image_files:
+            if not image_file.is_file():
+                raise FileNotFoundError(f"Image not found: {image_file}")
+
+        client = self._get_client()
+        attempt = 0
+        while True:
+            self.controller.acquire()
+            started_at = time.monotonic()
+            # Time spent in the consumer between yields is not server latency.
+            paused = 0.0
+            status_code: int | None = None
+            retry_after: float | None = None
+            try:
+                with ExitStack() as stack:
+                    files = [
+                        (
+                            "files",
+                            (
+                                image_file.name,
+                                stack.enter_context(image_file.open("rb")),
+                                mimetypes.guess_type(image_file.name)[0] or "application/octet-stream",
+                            ),
+                        )
+                        for image_file in image_files
+                    ]
+                    with client.stream(
+                        "POST", self.batch_endpoint, files=files, data=_batch_metadata_form(metadata)
+                    ) as response:
+                        status_code = response.status_code
+                        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+                        if status_code >= 400:
+                            response.read()
+                        retrying = status_code in OVERLOAD_STATUS_CODES and attempt < self.max_retries
+                        if not retrying:
+                            response.raise_for_status()
+                            # NDJSON, one line per image in completion order.
+                            for line in response.iter_lines():
+                                if not line.strip():
+                                    continue
+                                payload = json.loads(line)
+                                if payload.get("type") == "summary" or payload.get("index") is None:
+                                    continue
+                                yielded_at = time.monotonic()
+                                yield int(payload["index"]), payload
+                                paused += time.monotonic() - yielded_at
+                    finished_at = time.monotonic()
+            except httpx.TransportError:
+                self.controller.release(latency=None, status_code=None)
+                raise
+            except httpx.HTTPStatusError:
+                self.controller.release(
+                    latency=time.monotonic() - started_at,
+                    status_code=status_code,
+                    retry_after=retry_after,
+                )
+                raise
+            except BaseException:
+                self.controller.cancel()
+                raise
+
+            # The controller reasons about per-image latency.
+            self.controller.release(
+                latency=(finished_at - started_at - paused) / len(image_files),
+                status_code=status_code,
+                retry_after=retry_after,
+            )
+            if status_code in OVERLOAD_STATUS_CODES and attempt < self.max_retries:
+                attempt += 1
+                continue
+            return
+
+    def iter_upload_results(
+        self,
+        image_paths: Iterable[str | Path],
+        metadata: list[dict | None] | None = None,
+    ) -> Iterator[tuple[int, Path, dict]]:
+        # metadata: optional, parallel to image_paths (boxes, confidences, source_id).
+        image_files = [_to_path(image_path) for image_path in image_paths]
+        metadata = list(metadata or [])
+        metadata += [None] * (len(image_files) - len(metadata))
+        if self.batch_size <= 1:
+            for index, image_file in enumerate(image_files):
+                yield index, image_file, self.upload_image(image_file, metadata=metadata[index])
+            return
+
+        for offset in range(0, len(image_files), self.batch_size):
+            chunk = image_files[offset:offset + self.batch_size]
+            chunk_metadata = metadata[offset:offset + self.batch_size]
+            for index, payload in self._upload_batch(chunk, chunk_metadata):
+                yield offset + index, chunk[index], payload
+
+    def upload_images(
+        self,
+        image_paths: Iterable[str | Path],
+        metadata: list[dict | None] | None = None,
+    ) -> list[dict]:
+        image_files = [_to_path(image_path) for image_path in image_paths]
+        results: list[dict] = [{} for _ in image_files]
+        for index, _, payload in self.iter_upload_results(image_files, metadata):
+            results[index] = payload
         return results
 
 
@@ -88,8 +439,8 @@ def upload_image(
         timeout: float = 30.0,
         min_interval: float = 1.0,
 ) -> dict:
-    client = FireUploadClient(endpoint=endpoint, timeout=timeout, min_interval=min_interval)
-    return client.upload_image(image_path)
+    with FireUploadClient(endpoint=endpoint, timeout=timeout, min_interval=min_interval) as client:
+        return client.upload_image(image_path)
 
 
 def upload_images(
@@ -97,24 +448,32 @@ def upload_images(
         endpoint: str = DEFAULT_ENDPOINT,
         timeout: float = 30.0,
         min_interval: float = 1.0,
+        batch_size: int = 1,
 ) -> list[dict]:
-    client = FireUploadClient(endpoint=endpoint, timeout=timeout, min_interval=min_interval)
-    return client.upload_images(image_paths)
+    with FireUploadClient(
+        endpoint=endpoint,
+        timeout=timeout,
+        min_interval=min_interval,
+        batch_size=batch_size,
+    ) as client:
+        return client.upload_images(image_paths)
 
 
 def main() -> None:
     args = parse_args()
     image_paths = [_to_path(item) for item in args.images]
-    client = FireUploadClient(
+    with FireUploadClient(
         endpoint=args.endpoint,
         timeout=args.timeout,
         min_interval=args.min_interval,
-    )
-    results = client.upload_images(image_paths)
-
-    for index, (image_path, payload) in enumerate(zip(image_paths, results), start=1):
-        print(f"[{index}/{len(image_paths)}] {image_path}")
-        print(json.dumps(payload, ensure_ascii=False, indent=2))
+        adaptive=args.adaptive,
+        target_latency=args.target_latency,
+        max_interval=args.max_interval,
+        batch_size=args.batch_size,
+    ) as client:
+        for index, image_path, payload in client.iter_upload_results(image_paths):
+            print(f"[{index + 1}/{len(image_paths)}] {image_path}")
+            print(json.dumps(payload, ensure_ascii=False, indent=2))
 
 
 if __name__ == "__main__":
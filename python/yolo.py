@@ -1,12 +1,35 @@
+import argparse
+import json
 import os
+import queue
+import re
+import threading
 import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pathlib import Path
 
 import cv2
-from ultralytics import YOLO
+
+from inference_backend import load_model
+from tracking import BoxTracker
 
 # ================= Config =================
 TARGET_OBJECT = "Fire"
+# .pt (PyTorch), .onnx or a "*_openvino_model" directory; see export_model.py
+# for producing CPU-optimized (optionally int8) artifacts.
+MODEL_PATH = "fire_test.pt"
+# Inference input size; exported models must be used at their export size.
+INFERENCE_IMGSZ = 640
+# Runtime CPU threads (0 = runtime default, usually all physical cores).
+INFERENCE_THREADS = 0
+
+# Video sources: camera indexes, RTSP URLs or video files. Prefix a source
+# with "<id>=" to name it (e.g. "gate=rtsp://..."); the id is carried into the
+# saved filenames and the upload metadata. --source on the command line
+# overrides this list.
+SOURCES = [0]
 
 # Confidence threshold (0.0 - 1.0)
 CONF_THRESHOLD = 0.5
@@ -15,128 +38,819 @@ CONF_THRESHOLD = 0.5
 SAVE_DETECTED_FRAME = True
 SAVE_DIR = "../fire_detection/backend/detected_frames"
 MAX_SAVE_INTERVAL_SEC = 5.0
+# Dedup: detections are tracked across frames (SORT-style). A frame is saved
+# only when a new track appears or a tracked box has moved/grown so that its
+# IoU with the box at the last save drops below DEDUP_IOU_THRESHOLD. Tracks
+# survive TRACK_MAX_AGE_SEC without detections, so flicker does not re-trigger.
 DEDUP_IOU_THRESHOLD = 0.7
+TRACK_MATCH_IOU = 0.3
+TRACK_MAX_AGE_SEC = 2.0
 NO_OBJECT_SAVE_INTERVAL_SEC = 10.0
+# Target frames are saved unannotated, with boxes and confidences in the
+# metadata; the backend crops those regions for the vision model and keeps the
+# clean full frame. True restores the old result.plot() images.
+SAVE_ANNOTATED_FRAME = False
+
+# Frame hand-off to the uploader (python/main.py):
+#   "file"   - write JPEGs into SAVE_DIR for the folder watcher
+#   "socket" - push JPEG bytes + box metadata to main.py --frame-socket;
+#              falls back to "file" whenever the uploader is not listening
+FRAME_TRANSPORT = "file"
+FRAME_SOCKET_ADDRESS = "tcp:127.0.0.1:8765"
+
+# Pipeline settings
+JPEG_QUALITY = 90
+SAVE_WORKERS = 2
+MAX_PENDING_SAVES = 64
+STATS_INTERVAL_SEC = 5.0
+
+# Motion gate: skip inference while a source's scene is static. A frame is
+# "changed" when at least MOTION_THRESHOLD of the downscaled grayscale pixels
+# differ by more than MOTION_PIXEL_DELTA from the last inferred frame.
+# FORCE_INFERENCE_INTERVAL_SEC still forces a periodic inference so slowly
+# developing smoke is not missed.
+MOTION_GATE = False
+MOTION_THRESHOLD = 0.01
+MOTION_PIXEL_DELTA = 12
+MOTION_DOWNSCALE_WIDTH = 160
+FORCE_INFERENCE_INTERVAL_SEC = 5.0
+
+# Replay (--replay): offline benchmark on a video file or image folder.
+# Frames are saved into REPLAY_SAVE_DIR, never into SAVE_DIR or the socket,
+# so a replay does not feed the live uploader.
+REPLAY_SAVE_DIR = "replay_frames"
+REPLAY_IMAGE_FPS = 25.0
+REPLAY_QUEUE_SIZE = 8
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
 # ==========================================
 
 
-def box_iou(box_a, box_b):
-    x1 = max(box_a[0], box_b[0])
-    y1 = max(box_a[1], box_b[1])
-    x2 = min(box_a[2], box_b[2])
-    y2 = min(box_a[3], box_b[3])
-
-    inter_w = max(0.0, x2 - x1)
-    inter_h = max(0.0, y2 - y1)
-    inter_area = inter_w * inter_h
-    if inter_area <= 0:
-        return 0.0
-
-    area_a = max(0.0, box_a[2] - box_a[0]) * max(0.0, box_a[3] - box_a[1])
-    area_b = max(0.0, box_b[2] - box_b[0]) * max(0.0, box_b[3] - box_b[1])
-    union = area_a + area_b - inter_area
-    if union <= 0:
-        return 0.0
-    return inter_area / union
-
-
-def is_same_target_set(current_boxes, saved_boxes, iou_threshold):
-    if not current_boxes or not saved_boxes:
-        return False
-    if len(current_boxes) != len(saved_boxes):
-        return False
-
-    matched = [False] * len(saved_boxes)
-    for cur in current_boxes:
-        best_iou = 0.0
-        best_idx = -1
-        for idx, old in enumerate(saved_boxes):
-            if matched[idx]:
-                continue
-            iou = box_iou(cur, old)
-            if iou > best_iou:
-                best_iou = iou
-                best_idx = idx
-        if best_idx < 0 or best_iou < iou_threshold:
+def create_frame_sender():
+    if FRAME_TRANSPORT != "socket":
+        return None
+    # Imported lazily so the default file mode keeps yolo.py self-contained.
+    from frame_transport import FrameSender
+
+    return FrameSender(FRAME_SOCKET_ADDRESS)
+
+
+class StageMeter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+        self._started_at = time.monotonic()
+
+    def tick(self, count=1):
+        with self._lock:
+            self._count += count
+
+    def rate_and_reset(self):
+        with self._lock:
+            now = time.monotonic()
+            elapsed = max(1e-6, now - self._started_at)
+            rate = self._count / elapsed
+            self._count = 0
+            self._started_at = now
+            return rate
+
+
+class StageTimings:
+    # Per-stage durations: exact count/total plus a bounded sample window for
+    # percentiles, so it can stay enabled on a long-running live process.
+    def __init__(self, max_samples=100000):
+        self._lock = threading.Lock()
+        self._count = Counter()
+        self._total = Counter()
+        self._max = {}
+        self._samples = {}
+        self.max_samples = max_samples
+
+    def record(self, stage, seconds, count=1):
+        with self._lock:
+            self._count[stage] += count
+            self._total[stage] += seconds
+            self._max[stage] = max(self._max.get(stage, 0.0), seconds)
+            self._samples.setdefault(stage, deque(maxlen=self.max_samples)).append(seconds)
+
+    def summary(self):
+        with self._lock:
+            stages = {}
+            for stage, samples in self._samples.items():
+                ordered = sorted(samples)
+                count = self._count[stage]
+                stages[stage] = {
+                    "count": count,
+                    "total_s": round(self._total[stage], 4),
+                    "mean_ms": round(self._total[stage] / max(1, count) * 1000, 3),
+                    "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+                    "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+                    "max_ms": round(self._max[stage] * 1000, 3),
+                }
+            return stages
+
+
+class FrameSaver:
+    # Background JPEG encode + hand-off pool, so plotting, encoding and disk or
+    # socket writes never stall inference.
+    def __init__(self, frame_sender, jpeg_quality=JPEG_QUALITY, workers=SAVE_WORKERS, save_dir=SAVE_DIR, timings=None):
+        self.frame_sender = frame_sender
+        self.jpeg_quality = int(jpeg_quality)
+        self.save_dir = save_dir
+        self.timings = timings or StageTimings()
+        self.meter = StageMeter()
+        self.dropped = 0
+        self.saved_count = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="frame-saver")
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._pending = 0
+
+    def submit(self, image_or_render, source_id, prefix, metadata):
+        with self._lock:
+            if self._pending >= MAX_PENDING_SAVES:
+                self.dropped += 1
+                return False
+            self._pending += 1
+        self._executor.submit(self._save, image_or_render, source_id, prefix, metadata)
+        return True
+
+    def _save(self, image_or_render, source_id, prefix, metadata):
+        try:
+            started = time.perf_counter()
+            image = image_or_render() if callable(image_or_render) else image_or_render
+            save_frame(self, image, source_id, prefix, metadata)
+            self.timings.record("save", time.perf_counter() - started)
+            self.meter.tick()
+            with self._lock:
+                self.saved_count += 1
+        except Exception as exc:
+            print(f"Save failed ({source_id}): {exc}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def send(self, frame):
+        if self.frame_sender is None:
             return False
-        matched[best_idx] = True
-    return True
+        with self._send_lock:
+            return self.frame_sender.send(frame)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self.frame_sender is not None:
+            self.frame_sender.close()
+
+
+def save_frame(saver, image, source_id, prefix, metadata):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    # "<source_id>__" lets the folder watcher recover the source for the upload.
+    filename = f"{source_id}__{prefix}_{timestamp}.jpg"
+    metadata = {**metadata, "source_id": source_id}
+    encoded_ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, saver.jpeg_quality])
+    if not encoded_ok:
+        raise RuntimeError("JPEG encode failed")
+    data = encoded.tobytes()
+
+    if saver.frame_sender is not None:
+        from frame_transport import InMemoryFrame
+
+        if saver.send(InMemoryFrame(filename, data, metadata=metadata)):
+            return
+    if metadata.get("boxes"):
+        # Sidecar "<name>.json" carries the boxes to the folder watcher. Written
+        # before the image so it is in place when the image event fires.
+        sidecar_path = os.path.join(saver.save_dir, os.path.splitext(filename)[0] + ".json")
+        with open(sidecar_path, "w", encoding="utf-8") as file_obj:
+            json.dump(metadata, file_obj, ensure_ascii=False)
+    with open(os.path.join(saver.save_dir, filename), "wb") as file_obj:
+        file_obj.write(data)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run YOLO fire detection on one or more video sources with one shared model."
+    )
+    parser.add_argument(
+        "--source",
+        action="append",
+        dest="sources",
+        help="Camera index, RTSP URL or video file; repeat for several sources. "
+        "Use id=source to name a source (default: SOURCES in yolo.py)",
+    )
+    parser.add_argument("--model", default=MODEL_PATH, help="Model path: .pt, .onnx or *_openvino_model directory")
+    parser.add_argument("--imgsz", type=int, default=INFERENCE_IMGSZ, help="Inference input size")
+    parser.add_argument("--threads", type=int, default=INFERENCE_THREADS, help="Runtime CPU threads (0 = default)")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Do not open preview windows (no imshow/waitKey); stop with Ctrl+C",
+    )
+    parser.add_argument("--jpeg-quality", type=int, default=JPEG_QUALITY, help="Saved JPEG quality (1-100)")
+    parser.add_argument("--save-workers", type=int, default=SAVE_WORKERS, help="Background encode/save threads")
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        default=STATS_INTERVAL_SEC,
+        help="Seconds between per-stage FPS reports (0 disables)",
+    )
+    parser.add_argument(
+        "--motion-gate",
+        action=argparse.BooleanOptionalAction,
+        default=MOTION_GATE,
+        help="Skip inference on frames that barely changed since the last inferred frame",
+    )
+    parser.add_argument(
+        "--motion-threshold",
+        type=float,
+        default=MOTION_THRESHOLD,
+        help="Fraction of changed pixels (0-1) that triggers inference",
+    )
+    parser.add_argument(
+        "--force-inference-interval",
+        type=float,
+        default=FORCE_INFERENCE_INTERVAL_SEC,
+        help="Run inference at least this often per source even on a static scene (seconds)",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="Offline benchmark: treat --source as video files or image folders and print a report at the end",
+    )
+    parser.add_argument(
+        "--pace",
+        choices=["fast", "realtime"],
+        default="fast",
+        help="Replay every frame as fast as possible, or at the source FPS dropping frames like a live camera",
+    )
+    parser.add_argument("--replay-fps", type=float, default=REPLAY_IMAGE_FPS, help="Frame rate assumed for image folders")
+    parser.add_argument("--save-dir", default=None, help=f"Replay output folder (default {REPLAY_SAVE_DIR})")
+    parser.add_argument("--report", default=None, help="Write the replay report as JSON to this path")
+    return parser.parse_args()
+
+
+def parse_source(spec, index):
+    if isinstance(spec, int):
+        return f"cam{spec}", spec
+
+    text = str(spec).strip()
+    named = re.fullmatch(r"([A-Za-z0-9_-]+)=(.+)", text)
+    if named:
+        source_id, text = named.group(1), named.group(2)
+    else:
+        source_id = None
+
+    source = int(text) if text.isdigit() else text
+    if source_id is None:
+        source_id = f"cam{source}" if isinstance(source, int) else f"src{index}"
+    return source_id, source
+
+
+class CaptureThread(threading.Thread):
+    # Keeps only the newest frame of one source; the inference loop picks it up
+    # when it is ready, so a slow model never works through a stale backlog.
+    def __init__(self, source_id, source, timings=None):
+        super().__init__(name=f"capture-{source_id}", daemon=True)
+        self.source_id = source_id
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        self.finished = False
+        self.meter = StageMeter()
+        self.timings = timings or StageTimings()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._frame = None
+        self._timestamp = 0.0
+        self._seq = 0
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            started = time.perf_counter()
+            success, frame = self.cap.read()
+            if not success:
+                break
+            self.timings.record("capture", time.perf_counter() - started)
+            with self._lock:
+                self._frame = frame
+                self._timestamp = time.monotonic()
+                self._seq += 1
+            self.meter.tick()
+        self.finished = True
+        self.cap.release()
+
+    def latest(self, after_seq):
+        # (seq, frame, timestamp); the timestamp drives save intervals, dedup
+        # and the motion gate, so a replay follows media time, not wall time.
+        with self._lock:
+            if self._frame is None or self._seq <= after_seq:
+                return None
+            return self._seq, self._frame, self._timestamp
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class ReplayCapture(threading.Thread):
+    # Replays a video file or image folder. "fast" hands over every frame and
+    # blocks while inference catches up; "realtime" releases frames at the
+    # source FPS and keeps only the newest one, dropping frames like a camera.
+    def __init__(self, source_id, source, pace="fast", image_fps=REPLAY_IMAGE_FPS, timings=None):
+        super().__init__(name=f"replay-{source_id}", daemon=True)
+        self.source_id = source_id
+        self.source = source
+        self.pace = pace
+        self.meter = StageMeter()
+        self.timings = timings or StageTimings()
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._queue = queue.Queue(maxsize=REPLAY_QUEUE_SIZE)
+        self._newest = None
+        self._reader_done = False
+
+        path = Path(str(source))
+        if path.is_dir():
+            self.files = sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+            self.cap = None
+            self.fps = image_fps
+        else:
+            self.files = None
+            self.cap = cv2.VideoCapture(source)
+            self.fps = self.cap.get(cv2.CAP_PROP_FPS) or image_fps
+        self._file_index = 0
+
+    def is_opened(self):
+        if self.files is not None:
+            return bool(self.files)
+        return self.cap.isOpened()
+
+    @property
+    def finished(self):
+        with self._lock:
+            return self._reader_done and self._newest is None and self._queue.empty()
+
+    def _read(self):
+        if self.files is None:
+            success, frame = self.cap.read()
+            return frame if success else None
+        while self._file_index < len(self.files):
+            frame = cv2.imread(str(self.files[self._file_index]))
+            self._file_index += 1
+            if frame is not None:
+                return frame
+        return None
+
+    def run(self):
+        started_at = time.monotonic()
+        try:
+            while not self._stop_event.is_set():
+                started = time.perf_counter()
+                frame = self._read()
+                if frame is None:
+                    break
+                self.timings.record("capture", time.perf_counter() - started)
+                media_time = self.frames_read / self.fps
+                self.frames_read += 1
+                self.meter.tick()
+                item = (self.frames_read, frame, media_time)
+
+                if self.pace == "realtime":
+                    delay = started_at + media_time - time.monotonic()
+                    if delay > 0:
+                        self._stop_event.wait(delay)
+                    with self._lock:
+                        if self._newest is not None:
+                            self.frames_dropped += 1
+                        self._newest = item
+                    continue
+
+                while not self._stop_event.is_set():
+                    try:
+                        self._queue.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        finally:
+            with self._lock:
+                self._reader_done = True
+            if self.cap is not None:
+                self.cap.release()
+
+    def latest(self, after_seq):
+        if self.pace == "realtime":
+            with self._lock:
+                item, self._newest = self._newest, None
+            return item
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class MotionGate:
+    def __init__(self, threshold=MOTION_THRESHOLD, force_interval=FORCE_INFERENCE_INTERVAL_SEC):
+        self.threshold = threshold
+        self.force_interval = force_interval
+        self.checked = 0
+        self.skipped = 0
+        self.gate_seconds = 0.0
+        self._reference = None
+        self._candidate = None
+        self._last_inferred_at = 0.0
+
+    def _fingerprint(self, frame):
+        height, width = frame.shape[:2]
+        target_width = min(MOTION_DOWNSCALE_WIDTH, width)
+        target_height = max(1, int(height * target_width / width))
+        small = cv2.resize(frame, (target_width, target_height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_infer(self, frame, now, force=False):
+        started = time.perf_counter()
+        self._candidate = self._fingerprint(frame)
+        self.checked += 1
+
+        reference = self._reference
+        if (
+            force
+            or reference is None
+            or reference.shape != self._candidate.shape
+            or now - self._last_inferred_at >= self.force_interval
+        ):
+            changed = True
+        else:
+            diff = cv2.absdiff(self._candidate, reference)
+            _, mask = cv2.threshold(diff, MOTION_PIXEL_DELTA, 255, cv2.THRESH_BINARY)
+            changed = cv2.countNonZero(mask) / mask.size >= self.threshold
+
+        if not changed:
+            self.skipped += 1
+        self.gate_seconds += time.perf_counter() - started
+        return changed
+
+    def mark_inferred(self, now):
+        self._reference = self._candidate
+        self._last_inferred_at = now
+
+
+class SourceState:
+    def __init__(self, source_id, motion_gate=None):
+        self.source_id = source_id
+        self.motion_gate = motion_gate
+        self.last_object_found = False
+        self.last_seq = 0
+        self.last_detect_saved_time = float("-inf")
+        self.tracker = BoxTracker(
+            match_iou=TRACK_MATCH_IOU,
+            change_iou=DEDUP_IOU_THRESHOLD,
+            max_age=TRACK_MAX_AGE_SEC,
+        )
+        self.last_no_object_saved_time = float("-inf")
+        self.inferred = 0
+        # Save/dedup decision counters, reported by --replay.
+        self.decisions = Counter()
+
+
+def handle_result(state, frame, result, saver, now):
+    object_found = False
+    current_target_boxes = []
+    current_target_confs = []
+
+    classes_detected = result.boxes.cls.cpu().numpy()
+    boxes_xyxy = result.boxes.xyxy.cpu().numpy()
+    confidences = result.boxes.conf.cpu().numpy()
+
+    for idx, cls_id in enumerate(classes_detected):
+        class_name = result.names[int(cls_id)]
+        if class_name == TARGET_OBJECT:
+            object_found = True
+            current_target_boxes.append([float(v) for v in boxes_xyxy[idx]])
+            current_target_confs.append(float(confidences[idx]))
+
+    state.tracker.update(current_target_boxes, now)
+    decisions = state.decisions
+
+    if object_found:
+        decisions["target_frames"] += 1
+        if SAVE_DETECTED_FRAME:
+            if (now - state.last_detect_saved_time) < MAX_SAVE_INTERVAL_SEC:
+                decisions["skipped_interval"] += 1
+            elif not state.tracker.pending_save():
+                decisions["skipped_duplicate"] += 1
+            else:
+                # Annotated images are plotted on the saver pool, not here.
+                submitted = saver.submit(
+                    result.plot if SAVE_ANNOTATED_FRAME else frame,
+                    state.source_id,
+                    TARGET_OBJECT,
+                    {
+                        "label": TARGET_OBJECT,
+                        "boxes": current_target_boxes,
+                        "confidences": current_target_confs,
+                        "track_ids": state.tracker.visible_track_ids(),
+                        "image_size": [int(frame.shape[1]), int(frame.shape[0])],
+                    },
+                )
+                decisions["saved_target" if submitted else "save_queue_full"] += 1
+                # A dropped frame is not a save: keep the track pending so the
+                # next frame retries instead of being suppressed as a duplicate.
+                if submitted:
+                    state.last_detect_saved_time = now
+                    state.tracker.mark_saved()
+    else:
+        decisions["empty_frames"] += 1
+        if SAVE_DETECTED_FRAME:
+            if (now - state.last_no_object_saved_time) >= NO_OBJECT_SAVE_INTERVAL_SEC:
+                submitted = saver.submit(frame, state.source_id, "no_object", {"label": None, "boxes": []})
+                decisions["saved_no_object" if submitted else "save_queue_full"] += 1
+                if submitted:
+                    state.last_no_object_saved_time = now
+    return object_found
+
+
+class InferenceStage(threading.Thread):
+    def __init__(self, model, captures, states, saver, imgsz=INFERENCE_IMGSZ, timings=None):
+        super().__init__(name="inference", daemon=True)
+        self.model = model
+        self.imgsz = imgsz
+        self.timings = timings or StageTimings()
+        self.captures = captures
+        self.states = states
+        self.saver = saver
+        self.frame_meter = StageMeter()
+        self.batch_meter = StageMeter()
+        self.inferred_frames = 0
+        self.inference_seconds = 0.0
+        self._stop_event = threading.Event()
+        self._display_lock = threading.Lock()
+        self._display_frames = {}
+
+    def run(self):
+        while not self._stop_event.is_set():
+            batch_states = []
+            batch_frames = []
+            batch_times = []
+            grabbed = {}
+            for capture in self.captures:
+                state = self.states[capture.source_id]
+                latest = capture.latest(state.last_seq)
+                if latest is None:
+                    continue
+                state.last_seq, frame, frame_time = latest
+                grabbed[state.source_id] = frame
+                # Never gate while a target is on screen: dedup needs every frame.
+                gate = state.motion_gate
+                if gate is not None:
+                    started = time.perf_counter()
+                    infer = gate.should_infer(frame, frame_time, force=state.last_object_found)
+                    self.timings.record("motion_gate", time.perf_counter() - started)
+                    if not infer:
+                        continue
+                batch_states.append(state)
+                batch_frames.append(frame)
+                batch_times.append(frame_time)
+
+            if batch_frames:
+                # One forward pass over the newest frame of every source.
+                started = time.perf_counter()
+                results = self.model(batch_frames, verbose=False, conf=CONF_THRESHOLD, imgsz=self.imgsz)
+                elapsed = time.perf_counter() - started
+                self.inference_seconds += elapsed
+                self.inferred_frames += len(batch_frames)
+                self.timings.record("inference_batch", elapsed)
+                for state, frame, frame_time, result in zip(batch_states, batch_frames, batch_times, results):
+                    started = time.perf_counter()
+                    state.last_object_found = handle_result(state, frame, result, self.saver, frame_time)
+                    self.timings.record("postprocess", time.perf_counter() - started)
+                    state.inferred += 1
+                    if state.motion_gate is not None:
+                        state.motion_gate.mark_inferred(frame_time)
+                self.frame_meter.tick(len(batch_frames))
+                self.batch_meter.tick()
+            elif not grabbed:
+                if all(capture.finished for capture in self.captures):
+                    return
+                time.sleep(0.005)
+                continue
+
+            with self._display_lock:
+                self._display_frames.update(grabbed)
+
+    def take_display_frames(self):
+        with self._display_lock:
+            frames, self._display_frames = self._display_frames, {}
+        return frames
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def report_stage_fps(captures, inference, saver, display_meter, headless):
+    capture_fps = " ".join(f"{c.source_id}={c.meter.rate_and_reset():.1f}" for c in captures)
+    frames_fps = inference.frame_meter.rate_and_reset()
+    batches_fps = inference.batch_meter.rate_and_reset()
+    avg_batch = frames_fps / batches_fps if batches_fps > 0 else 0.0
+    parts = [
+        f"capture[{capture_fps}]",
+        f"inference={frames_fps:.1f} frames/s (avg batch {avg_batch:.1f})",
+        f"save={saver.meter.rate_and_reset():.2f}/s (dropped {saver.dropped})",
+    ]
+    if not headless:
+        parts.append(f"display={display_meter.rate_and_reset():.1f}")
+    print("FPS " + " | ".join(parts))
+
+    gates = [state.motion_gate for state in inference.states.values() if state.motion_gate is not None]
+    if gates:
+        checked = sum(gate.checked for gate in gates)
+        skipped = sum(gate.skipped for gate in gates)
+        gate_cost = sum(gate.gate_seconds for gate in gates)
+        # Process-wide CPU counters also include capture decoding, so the saving
+        # is estimated from the measured inference time per frame.
+        per_frame = inference.inference_seconds / max(1, inference.inferred_frames)
+        saved = skipped * per_frame - gate_cost
+        skip_ratio = skipped / checked if checked else 0.0
+        print(
+            f"Motion gate: skipped {skipped}/{checked} frames ({skip_ratio:.0%}), "
+            f"est. inference time saved {saved:.1f}s (gate cost {gate_cost:.2f}s)"
+        )
+
+
+def build_replay_report(args, backend, captures, inference, saver, timings, wall_seconds):
+    sources = {}
+    for capture in captures:
+        state = inference.states[capture.source_id]
+        gate = state.motion_gate
+        sources[capture.source_id] = {
+            "source": str(capture.source),
+            "source_fps": round(capture.fps, 3),
+            "frames_read": capture.frames_read,
+            "frames_dropped": capture.frames_dropped,
+            "frames_inferred": state.inferred,
+            "motion_gate_skipped": gate.skipped if gate is not None else 0,
+            "decisions": dict(state.decisions),
+        }
+
+    frames_read = sum(item["frames_read"] for item in sources.values())
+    decisions = Counter()
+    for item in sources.values():
+        decisions.update(item["decisions"])
+    return {
+        "pace": args.pace,
+        "config": {
+            "model": str(args.model),
+            "backend": backend,
+            "imgsz": args.imgsz,
+            "threads": args.threads,
+            "conf_threshold": CONF_THRESHOLD,
+            "target_object": TARGET_OBJECT,
+            "save_interval_sec": MAX_SAVE_INTERVAL_SEC,
+            "no_object_save_interval_sec": NO_OBJECT_SAVE_INTERVAL_SEC,
+            "dedup_iou_threshold": DEDUP_IOU_THRESHOLD,
+            "track_match_iou": TRACK_MATCH_IOU,
+            "track_max_age_sec": TRACK_MAX_AGE_SEC,
+            "motion_gate": args.motion_gate,
+            "motion_threshold": args.motion_threshold,
+            "force_inference_interval_sec": args.force_inference_interval,
+        },
+        "wall_seconds": round(wall_seconds, 3),
+        "frames_read": frames_read,
+        "frames_inferred": inference.inferred_frames,
+        "read_fps": round(frames_read / max(1e-6, wall_seconds), 2),
+        "inference_fps": round(inference.inferred_frames / max(1e-6, wall_seconds), 2),
+        "frames_saved": saver.saved_count,
+        "saves_dropped": saver.dropped,
+        "save_dir": os.path.abspath(saver.save_dir),
+        "decisions": dict(decisions),
+        "sources": sources,
+        "stages": timings.summary(),
+    }
+
+
+def print_replay_report(report):
+    print(
+        f"Replay ({report['pace']}): {report['frames_read']} frames read, {report['frames_inferred']} inferred "
+        f"in {report['wall_seconds']:.1f}s ({report['inference_fps']:.1f} inferred FPS)"
+    )
+    for source_id, item in report["sources"].items():
+        print(
+            f"  {source_id}: read {item['frames_read']} @ {item['source_fps']:.1f} FPS, "
+            f"dropped {item['frames_dropped']}, inferred {item['frames_inferred']}, "
+            f"gate skipped {item['motion_gate_skipped']}"
+        )
+    decisions = report["decisions"]
+    print(
+        f"Saves: {report['frames_saved']} written to {report['save_dir']} "
+        f"(target {decisions.get('saved_target', 0)}, no_object {decisions.get('saved_no_object', 0)}, "
+        f"queue full {decisions.get('save_queue_full', 0)})"
+    )
+    print(
+        f"Dedup: {decisions.get('target_frames', 0)} frames with {TARGET_OBJECT}, "
+        f"skipped by interval {decisions.get('skipped_interval', 0)}, "
+        f"skipped as duplicate {decisions.get('skipped_duplicate', 0)}"
+    )
+    print(f"{'stage':<16}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for stage, item in report["stages"].items():
+        print(
+            f"{stage:<16}{item['count']:>8}{item['mean_ms']:>10.2f}{item['p50_ms']:>10.2f}"
+            f"{item['p95_ms']:>10.2f}{item['max_ms']:>10.2f}"
+        )
 
 
 def main():
+    args = parse_args()
+    if args.replay and not args.sources:
+        print("--replay needs at least one --source (video file or image folder)")
+        return
+    source_specs = args.sources or SOURCES
+
     print(f"Loading model and searching for {TARGET_OBJECT} ...")
-    model = YOLO("fire_test.pt")
+    model, backend = load_model(args.model, threads=args.threads, imgsz=args.imgsz)
+    print(f"Model backend: {backend} (imgsz {args.imgsz}, threads {args.threads or 'default'})")
 
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
+    timings = StageTimings()
+    captures = []
+    for index, spec in enumerate(source_specs):
+        source_id, source = parse_source(spec, index)
+        if args.replay:
+            capture = ReplayCapture(source_id, source, args.pace, args.replay_fps, timings=timings)
+        else:
+            capture = CaptureThread(source_id, source, timings=timings)
+        if not capture.is_opened():
+            print(f"Cannot open source {source_id}: {source}")
+            continue
+        captures.append(capture)
+    if not captures:
         print("Cannot open camera")
         return
 
-    print("Running")
+    print(f"Running on {len(captures)} source(s): {', '.join(c.source_id for c in captures)}")
 
+    save_dir = (args.save_dir or REPLAY_SAVE_DIR) if args.replay else SAVE_DIR
     if SAVE_DETECTED_FRAME:
-        os.makedirs(SAVE_DIR, exist_ok=True)
-
-    last_detect_saved_time = 0.0
-    last_saved_target_boxes = []
-    last_no_object_saved_time = 0.0
-
-    while True:
-        success, frame = cap.read()
-        if not success:
-            break
-
-        results = model(frame, stream=True, verbose=False, conf=CONF_THRESHOLD)
-
-        object_found = False
-        frame_to_save = None
-        current_target_boxes = []
-
-        for result in results:
-            classes_detected = result.boxes.cls.cpu().numpy()
-            boxes_xyxy = result.boxes.xyxy.cpu().numpy()
-
-            for idx, cls_id in enumerate(classes_detected):
-                class_name = result.names[int(cls_id)]
-                if class_name == TARGET_OBJECT:
-                    object_found = True
-                    current_target_boxes.append([float(v) for v in boxes_xyxy[idx]])
-
-            if object_found:
-                # Save annotated image when target exists.
-                frame_to_save = result.plot()
-
-        if object_found:
-            if SAVE_DETECTED_FRAME and frame_to_save is not None:
-                now = time.time()
-                interval_ok = (now - last_detect_saved_time) >= MAX_SAVE_INTERVAL_SEC
-                duplicated = is_same_target_set(
-                    current_target_boxes,
-                    last_saved_target_boxes,
-                    DEDUP_IOU_THRESHOLD,
-                )
-                if interval_ok and not duplicated:
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-                    save_path = os.path.join(SAVE_DIR, f"{TARGET_OBJECT}_{timestamp}.jpg")
-                    cv2.imwrite(save_path, frame_to_save)
-                    last_detect_saved_time = now
-                    last_saved_target_boxes = current_target_boxes
-        else:
-            last_saved_target_boxes = []
-            if SAVE_DETECTED_FRAME:
-                now = time.time()
-                if (now - last_no_object_saved_time) >= NO_OBJECT_SAVE_INTERVAL_SEC:
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-                    save_path = os.path.join(SAVE_DIR, f"no_object_{timestamp}.jpg")
-                    cv2.imwrite(save_path, frame)
-                    last_no_object_saved_time = now
-
-        cv2.imshow("YOLO Detection", frame)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
+        os.makedirs(save_dir, exist_ok=True)
+    saver = FrameSaver(
+        None if args.replay else create_frame_sender(),
+        jpeg_quality=args.jpeg_quality,
+        workers=args.save_workers,
+        save_dir=save_dir,
+        timings=timings,
+    )
+    states = {
+        capture.source_id: SourceState(
+            capture.source_id,
+            MotionGate(args.motion_threshold, args.force_inference_interval) if args.motion_gate else None,
+        )
+        for capture in captures
+    }
+    inference = InferenceStage(model, captures, states, saver, imgsz=args.imgsz, timings=timings)
+    display_meter = StageMeter()
+    started_at = time.monotonic()
+    for capture in captures:
+        capture.start()
+    inference.start()
+
+    next_report_at = time.monotonic() + args.stats_interval
+    try:
+        while inference.is_alive():
+            if args.headless:
+                time.sleep(0.05)
+            else:
+                for source_id, frame in inference.take_display_frames().items():
+                    cv2.imshow(f"YOLO Detection - {source_id}", frame)
+                    display_meter.tick()
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
+
+            if args.stats_interval > 0 and time.monotonic() >= next_report_at:
+                report_stage_fps(captures, inference, saver, display_meter, args.headless)
+                next_report_at = time.monotonic() + args.stats_interval
+    except KeyboardInterrupt:
+        print("Stopped.")
+    finally:
+        for capture in captures:
+            capture.stop()
+        inference.stop()
+        inference.join(timeout=5.0)
+        for capture in captures:
+            capture.join(timeout=2.0)
+        saver.close()
+        if not args.headless:
+            cv2.destroyAllWindows()
+
+    if args.replay:
+        report = build_replay_report(args, backend, captures, inference, saver, timings, time.monotonic() - started_at)
+        print_replay_report(report)
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as file_obj:
+                json.dump(report, file_obj, ensure_ascii=False, indent=2)
+            print(f"Report written to {args.report}")
 
 
 if __name__ == "__main__":